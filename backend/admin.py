@@ -0,0 +1,30 @@
+"""
+Shared-secret check for admin-only endpoints and headers.
+
+Admin features are off unless ADMIN_TOKEN is set; clients send the token in the
+X-Admin-Token header.
+"""
+
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+
+from config import settings
+
+ADMIN_TOKEN = settings.admin_token
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """True if token matches ADMIN_TOKEN. Always False when no token is configured."""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """FastAPI dependency for admin endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,267 @@
+"""
+Admission control for report uploads (POST /api/reports).
+
+Each upload buffers its images in memory, writes them to storage and waits on
+Gemini, so an unchecked burst of uploads times out all at once. AdmissionMiddleware
+turns the excess away quickly, before the body is read:
+
+- At most ADMISSION_MAX_CONCURRENT uploads run at once per worker. Up to
+  ADMISSION_MAX_QUEUE more wait for a slot in arrival order, each for at most
+  ADMISSION_QUEUE_TIMEOUT. Past that, the response is 503.
+- Each admitted upload takes a token from a token bucket shared by all of the
+  worker's uploads (AI_RATE_LIMIT analyses per second, bursts of AI_BURST).
+  When the wait for a token would exceed AI_MAX_WAIT, the response is 429. The
+  bucket is skipped when Gemini isn't configured (ai_configured), since the
+  mock tags cost nothing.
+
+Rejections carry Retry-After, estimated from recent upload durations and the
+queue ahead. Limits are per worker, so size them as the total divided by the
+number of workers. They can be changed without a restart at /api/admin/limits.
+"""
+
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from config import settings
+from rate_limit import TokenBucket
+from ai_service import ai_configured
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED, ADMISSION_LIMIT
+from structured_log import get_logger
+
+logger = get_logger("admission")
+
+ADMISSION_PATH = "/api/reports"
+DURATION_SMOOTHING = 0.2  # Weight of the latest upload in the moving average of upload time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class LimitsUpdate(BaseModel):
+    """Body of PUT /api/admin/limits; omitted fields keep their current value"""
+    max_concurrent: Optional[int] = None
+    max_queue: Optional[int] = None
+    queue_timeout: Optional[float] = None
+    ai_rate_limit: Optional[float] = None
+    ai_burst: Optional[float] = None
+    ai_max_wait: Optional[float] = None
+
+
+class AdmissionController:
+    """Concurrency slots with a bounded FIFO queue, plus the AI token bucket"""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 ai_rate_limit: float, ai_burst: float, ai_max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.ai_bucket = TokenBucket(ai_rate_limit, ai_burst)
+        self.ai_max_wait = ai_max_wait
+        self.active = 0
+        self._waiters = deque()
+        self._average_seconds = 1.0
+        self._publish_limits()
+
+    def limits(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "ai_rate_limit": self.ai_bucket.rate,
+            "ai_burst": self.ai_bucket.capacity,
+            "ai_max_wait": self.ai_max_wait,
+        }
+
+    def status(self) -> dict:
+        return {
+            "limits": self.limits(),
+            "in_flight": self.active,
+            "queued": len(self._waiters),
+            "average_upload_seconds": round(self._average_seconds, 3),
+        }
+
+    def update(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None,
+               queue_timeout: Optional[float] = None, ai_rate_limit: Optional[float] = None,
+               ai_burst: Optional[float] = None, ai_max_wait: Optional[float] = None):
+        """Change limits in place. Raises ValueError (and changes nothing) if a value is out of range."""
+        if max_concurrent is not None and max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        if queue_timeout is not None and queue_timeout < 0:
+            raise ValueError("queue_timeout must not be negative")
+        if ai_rate_limit is not None and ai_rate_limit <= 0:
+            raise ValueError("ai_rate_limit must be positive")
+        if ai_burst is not None and ai_burst < 1:
+            raise ValueError("ai_burst must be at least 1")
+        if ai_max_wait is not None and ai_max_wait < 0:
+            raise ValueError("ai_max_wait must not be negative")
+
+        if max_concurrent is not None:
+            self.max_concurrent = max_concurrent
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if queue_timeout is not None:
+            self.queue_timeout = queue_timeout
+        if ai_rate_limit is not None or ai_burst is not None:
+            self.ai_bucket.set_rate(
+                ai_rate_limit if ai_rate_limit is not None else self.ai_bucket.rate,
+                ai_burst if ai_burst is not None else self.ai_bucket.capacity
+            )
+        if ai_max_wait is not None:
+            self.ai_max_wait = ai_max_wait
+        self._publish_limits()
+        # A higher limit frees slots for whoever is queued; a lower one takes effect as uploads finish
+        self._wake()
+        logger.info("🎚️ Admission limits updated", extra={"fields": self.limits()})
+
+    def _publish_limits(self):
+        for name, value in self.limits().items():
+            ADMISSION_LIMIT.set(value, limit=name)
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.set(self.active)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _retry_after(self, ahead: int) -> int:
+        """Seconds until roughly `ahead` more uploads have finished"""
+        return max(1, math.ceil(self._average_seconds * (ahead + 1) / self.max_concurrent))
+
+    def _wake(self):
+        while self._waiters and self.active < self.max_concurrent:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+        self._update_gauges()
+
+    async def _acquire_slot(self):
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(
+                503, "queue_full", self._retry_after(len(self._waiters) + self.active),
+                "Too many uploads in progress, try again shortly"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.active -= 1
+                self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise AdmissionRejected(
+                503, "queue_timeout", self._retry_after(len(self._waiters) + self.active),
+                "Upload queue is backed up, try again shortly"
+            )
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._update_gauges()
+
+    async def _take_ai_token(self):
+        bucket = self.ai_bucket
+        wait = bucket.time_until_available()
+        if wait <= self.ai_max_wait:
+            try:
+                await asyncio.wait_for(bucket.acquire(), self.ai_max_wait)
+                return
+            except asyncio.TimeoutError:
+                # Other uploads got to the bucket first
+                wait = bucket.time_until_available() + 1 / bucket.rate
+        raise AdmissionRejected(429, "ai_rate", max(1, math.ceil(wait)), "Image analysis rate limit reached, try again shortly")
+
+    async def admit(self, needs_ai: bool):
+        """Wait for a slot (and an AI token if needs_ai). Raises AdmissionRejected; on success, call release() when done."""
+        if needs_ai and self.ai_bucket.time_until_available() > self.ai_max_wait:
+            # Don't queue for a slot only to be refused a token afterwards
+            raise AdmissionRejected(
+                429, "ai_rate", max(1, math.ceil(self.ai_bucket.time_until_available())),
+                "Image analysis rate limit reached, try again shortly"
+            )
+        await self._acquire_slot()
+        if needs_ai:
+            try:
+                await self._take_ai_token()
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self, elapsed: Optional[float] = None):
+        """Free the slot. Pass elapsed only for uploads that completed, so failures don't skew Retry-After."""
+        if elapsed is not None:
+            self._average_seconds += DURATION_SMOOTHING * (elapsed - self._average_seconds)
+        self.active -= 1
+        self._wake()
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying the admission controller to POST /api/reports"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != ADMISSION_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.controller.admit(needs_ai=ai_configured())
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED.inc(reason=e.reason)
+            logger.debug("Upload rejected", extra={"fields": {"reason": e.reason, "retry_after": e.retry_after}})
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        admitted = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(admitted - started)
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        completed = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+            completed = status is not None and 200 <= status < 300
+        finally:
+            # Fast 4xx (validation) and 5xx failures say nothing about how long an upload takes
+            self.controller.release(time.perf_counter() - admitted if completed else None)
+
+
+admission = AdmissionController(
+    settings.admission_max_concurrent,
+    settings.admission_max_queue,
+    settings.admission_queue_timeout,
+    settings.ai_rate_limit,
+    settings.ai_burst,
+    settings.ai_max_wait,
+)
@@ -1,33 +1,63 @@
-import os
-from dotenv import load_dotenv
 import json
 import re
 import base64
-import httpx
-import time
+from config import settings
+from structured_log import get_logger
+from metrics import AI_ATTEMPTS, AI_FAILURES, AI_REQUEST_SECONDS
 
-load_dotenv()
+logger = get_logger("ai_service")
 
-# Get API key from environment variable
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
+# Get API key from environment variable; checked when an image is analyzed, not at import
+api_key = settings.gemini_api_key
 
 # Use correct Gemini API endpoint format
 # The endpoint should be: https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_BASE_URL = settings.gemini_base_url
 
-# #region agent log
-_DEBUG_LOG_PATH = "/home/necharkc/cruzhack/.cursor/debug.log"
-def _log_debug(payload):
+PLACEHOLDER_API_KEY = "your_gemini_api_key_here"
+
+_http_client = None
+
+def ai_configured() -> bool:
+    """True when a real-looking Gemini key is set; otherwise uploads use mock tags"""
+    return bool(api_key) and api_key != PLACEHOLDER_API_KEY and len(api_key) >= 10
+
+def get_http_client():
+    """
+    The shared Gemini HTTP client, built on first use so requests reuse its
+    connection pool instead of opening a new TLS connection per image.
+    """
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=settings.gemini_timeout)
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def ping_ai():
+    """List one model, a cheap authenticated round trip; raises unless the API answers 200"""
+    # Key in a header, not the query string, so it can't end up in an error message or log line
+    response = await get_http_client().get(
+        f"{GEMINI_BASE_URL}/models", params={"pageSize": 1}, headers={"x-goog-api-key": api_key}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Gemini returned HTTP {response.status_code}")
+
+async def warm_ai_client():
+    """Open a connection to the Gemini host ahead of the first analysis"""
+    if not api_key:
+        logger.warning("⚠️ GEMINI_API_KEY is not set; image analysis will fail")
+        return
     try:
-        os.makedirs(os.path.dirname(_DEBUG_LOG_PATH), exist_ok=True)
-        with open(_DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload) + "\n")
+        await ping_ai()
+        logger.info("✅ Gemini connection warmed")
     except Exception as e:
-        # Fallback visibility if file write fails
-        print(f"DEBUG_LOG_WRITE_FAILED path={_DEBUG_LOG_PATH} error={type(e).__name__}:{str(e)[:120]}")
-# #endregion agent log
+        logger.warning(f"⚠️ Could not warm Gemini connection: {str(e)}")
 
 async def analyze_pet_image(image_bytes: bytes, mime_type: str = "image/jpeg"):
     """
@@ -40,24 +70,13 @@ async def analyze_pet_image(image_bytes: bytes, mime_type: str = "image/jpeg"):
     Returns:
         dict with species, breed, primary_color, age_group, marks, and size
     """
-    # #region agent log
-    _log_debug({
-        "sessionId": "debug-session",
-        "runId": "pre-fix",
-        "hypothesisId": "H1",
-        "location": "ai_service.py:analyze_pet_image:entry",
-        "message": "Analyze image entry",
-        "data": {"image_bytes_len": len(image_bytes) if image_bytes else 0, "mime_type": mime_type},
-        "timestamp": int(time.time() * 1000)
-    })
-    # #endregion agent log
+    logger.debug("Analyze image entry", extra={"fields": {"image_bytes_len": len(image_bytes) if image_bytes else 0, "mime_type": mime_type}})
     if not api_key:
         raise ValueError("GEMINI_API_KEY is not configured. Cannot analyze image.")
     
     if not image_bytes or len(image_bytes) == 0:
         raise ValueError("Image bytes are empty. Cannot analyze image.")
     
-    print(f"🤖 Starting Gemini AI analysis... Image size: {len(image_bytes)} bytes, MIME type: {mime_type}")
     
     try:
         # Try different valid model names (without models/ prefix)
@@ -103,101 +122,61 @@ Important: Look at the image carefully. If it's a cat, return "Cat" for species.
         last_error = None
         used_model = None
         
-        print("📤 Sending request to Gemini API...")
-        # #region agent log
-        _log_debug({
-            "sessionId": "debug-session",
-            "runId": "pre-fix",
-            "hypothesisId": "H2",
-            "location": "ai_service.py:analyze_pet_image:before_request",
-            "message": "Prepared Gemini request",
-            "data": {"models_to_try": models_to_try, "base_url": GEMINI_BASE_URL},
-            "timestamp": int(time.time() * 1000)
-        })
-        # #endregion agent log
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            for model_name in models_to_try:
-                try:
-                    print(f"   Trying model: {model_name}...")
-                    # Use correct endpoint format: /models/{model}:generateContent
-                    url = f"{GEMINI_BASE_URL}/models/{model_name}:generateContent?key={api_key}"
-                    
+        logger.debug("Prepared Gemini request", extra={"fields": {"models_to_try": models_to_try, "base_url": GEMINI_BASE_URL}})
+        client = get_http_client()
+        for model_name in models_to_try:
+            try:
+                # Use correct endpoint format: /models/{model}:generateContent
+                url = f"{GEMINI_BASE_URL}/models/{model_name}:generateContent?key={api_key}"
+                
+                with AI_REQUEST_SECONDS.time(model=model_name):
                     response = await client.post(url, json=payload)
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    
+                    # Extract text from response
+                    if not result or "candidates" not in result or len(result["candidates"]) == 0:
+                        logger.warning(f"❌ {model_name}: Empty response structure")
+                        last_error = "Empty response structure"
+                        AI_ATTEMPTS.inc(model=model_name, outcome="bad_response")
+                        continue
                     
-                    if response.status_code == 200:
-                        result = response.json()
-                        
-                        # Extract text from response
-                        if not result or "candidates" not in result or len(result["candidates"]) == 0:
-                            print(f"   ❌ {model_name}: Empty response structure")
-                            last_error = "Empty response structure"
-                            continue
-                        
-                        candidate = result["candidates"][0]
-                        if "content" not in candidate or "parts" not in candidate["content"]:
-                            print(f"   ❌ {model_name}: Missing content parts")
-                            last_error = "Missing content parts"
-                            continue
-                        
-                        parts = candidate["content"]["parts"]
-                        if not parts or "text" not in parts[0]:
-                            print(f"   ❌ {model_name}: Missing text")
-                            last_error = "Missing text in response"
-                            continue
-                        
-                        response_text = parts[0]["text"].strip()
-                        # #region agent log
-                        _log_debug({
-                            "sessionId": "debug-session",
-                            "runId": "pre-fix",
-                            "hypothesisId": "H3",
-                            "location": "ai_service.py:analyze_pet_image:model_success",
-                            "message": "Gemini model success",
-                            "data": {"model_name": model_name, "response_text_preview": response_text[:120]},
-                            "timestamp": int(time.time() * 1000)
-                        })
-                        # #endregion agent log
-                        used_model = model_name
-                        print(f"✅ Successfully used model: {model_name}")
-                        break
-                    else:
-                        error_text = response.text[:200] if response.text else "No error text"
-                        print(f"   ❌ {model_name} failed: {response.status_code} - {error_text}")
-                        last_error = f"HTTP {response.status_code}: {error_text}"
-                        # #region agent log
-                        _log_debug({
-                            "sessionId": "debug-session",
-                            "runId": "pre-fix",
-                            "hypothesisId": "H1",
-                            "location": "ai_service.py:analyze_pet_image:model_http_error",
-                            "message": "Gemini model HTTP error",
-                            "data": {"model_name": model_name, "status_code": response.status_code, "error_text_preview": error_text[:120]},
-                            "timestamp": int(time.time() * 1000)
-                        })
-                        # #endregion agent log
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    last_error = f"{type(e).__name__}: {error_msg[:150]}"
-                    print(f"   ❌ {model_name} error: {error_msg[:100]}")
-                    # #region agent log
-                    _log_debug({
-                        "sessionId": "debug-session",
-                        "runId": "pre-fix",
-                        "hypothesisId": "H4",
-                        "location": "ai_service.py:analyze_pet_image:model_exception",
-                        "message": "Gemini model exception",
-                        "data": {"model_name": model_name, "error_type": type(e).__name__, "error_msg_preview": error_msg[:120]},
-                        "timestamp": int(time.time() * 1000)
-                    })
-                    # #endregion agent log
-                    continue
+                    candidate = result["candidates"][0]
+                    if "content" not in candidate or "parts" not in candidate["content"]:
+                        logger.warning(f"❌ {model_name}: Missing content parts")
+                        last_error = "Missing content parts"
+                        AI_ATTEMPTS.inc(model=model_name, outcome="bad_response")
+                        continue
+                    
+                    parts = candidate["content"]["parts"]
+                    if not parts or "text" not in parts[0]:
+                        logger.warning(f"❌ {model_name}: Missing text")
+                        last_error = "Missing text in response"
+                        AI_ATTEMPTS.inc(model=model_name, outcome="bad_response")
+                        continue
+                    
+                    response_text = parts[0]["text"].strip()
+                    logger.debug("Gemini model success", extra={"fields": {"model_name": model_name, "response_text_preview": response_text[:120]}})
+                    used_model = model_name
+                    AI_ATTEMPTS.inc(model=model_name, outcome="success")
+                    break
+                else:
+                    error_text = response.text[:200] if response.text else "No error text"
+                    last_error = f"HTTP {response.status_code}: {error_text}"
+                    AI_ATTEMPTS.inc(model=model_name, outcome="http_error")
+                    logger.warning("❌ Gemini model HTTP error", extra={"fields": {"model_name": model_name, "status_code": response.status_code, "error_text_preview": error_text[:120]}})
+                    
+            except Exception as e:
+                error_msg = str(e)
+                last_error = f"{type(e).__name__}: {error_msg[:150]}"
+                AI_ATTEMPTS.inc(model=model_name, outcome="exception")
+                logger.warning("❌ Gemini model exception", extra={"fields": {"model_name": model_name, "error_type": type(e).__name__, "error_msg_preview": error_msg[:120]}})
+                continue
         
         if response_text is None:
             raise Exception(f"All models failed. Last error: {last_error}")
         
-        print(f"📥 Received Gemini response: {response_text[:200]}...")
-        
         # Remove markdown code blocks if present
         if response_text.startswith("```"):
             response_text = re.sub(r'^```(?:json)?\s*', '', response_text)
@@ -228,12 +207,10 @@ Important: Look at the image carefully. If it's a cat, return "Cat" for species.
                     "marks": result.get("marks", []) if isinstance(result.get("marks"), list) else [],
                     "size": str(result.get("size", "Unknown")).strip()
                 }
-                print(f"✅ Successfully parsed AI result: Species={parsed_result['species']}, Breed={parsed_result['breed']}")
+                logger.info("✅ Parsed AI result", extra={"fields": {"model": used_model, "species": parsed_result["species"], "breed": parsed_result["breed"]}})
                 return parsed_result
             except json.JSONDecodeError as json_err:
-                print(f"❌ JSON decode error: {json_err}")
-                print(f"   Attempted to parse: {json_str[:300]}")
-                print(f"   Full response was: {response_text[:500]}")
+                logger.warning(f"❌ JSON decode error: {json_err}", extra={"fields": {"json_preview": json_str[:300], "response_preview": response_text[:500]}})
                 # Try to extract fields manually as last resort
                 try:
                     # Manual extraction as fallback
@@ -250,22 +227,21 @@ Important: Look at the image carefully. If it's a cat, return "Cat" for species.
                             "marks": [],
                             "size": "Unknown"
                         }
-                        print(f"✅ Extracted fields manually: {parsed_result}")
+                        logger.info("✅ Extracted fields manually", extra={"fields": parsed_result})
                         return parsed_result
                 except:
                     pass
                 raise Exception(f"Failed to parse JSON from AI response: {str(json_err)}")
         else:
-            print(f"❌ No JSON found in response.")
-            print(f"   Full response (first 500 chars): {response_text[:500]}")
+            logger.warning("❌ No JSON found in response", extra={"fields": {"response_preview": response_text[:500]}})
             raise Exception(f"AI did not return valid JSON. Response: {response_text[:300]}")
             
     except ValueError as ve:
-        print(f"❌ Configuration error: {str(ve)}")
+        logger.error(f"❌ Configuration error: {str(ve)}")
         raise
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Gemini API error: {error_msg}")
-        print(f"   Error type: {type(e).__name__}")
+        AI_FAILURES.inc()
+        logger.error(f"❌ Gemini API error: {error_msg}", extra={"fields": {"error_type": type(e).__name__}})
         # Don't suppress the error - let it propagate so we know what went wrong
         raise Exception(f"Gemini AI analysis failed: {error_msg}")
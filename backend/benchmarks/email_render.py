@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark email template rendering throughput.
+
+Renders synthetic outbox messages (single matches and digests) with the
+precompiled templates and reports messages/sec, both on the calling thread and
+through the batched worker-thread path the outbox sender uses.
+
+Usage:
+    python benchmarks/email_render.py --count 5000 --digest-ratio 0.2 --batch-size 20
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import load_templates, render_messages, render_messages_async
+
+SAMPLE_TAGS = ["species", "breed", "primary_color"]
+SAMPLE_LOCATIONS = ["Brooklyn, NY", "Santa Cruz, CA", "Jersey City, NJ", "Hoboken, NJ"]
+
+
+def make_item(index: int) -> dict:
+    return {
+        "pet_name": f"Pet <{index}> & friends",  # Exercises escaping
+        "found_pet_image_url": f"https://example-bucket.s3.us-east-1.amazonaws.com/pet-reports/{index}/photo.jpg",
+        "match_details": {
+            "matched_tags": SAMPLE_TAGS,
+            "location": random.choice(SAMPLE_LOCATIONS)
+        }
+    }
+
+
+def make_messages(count: int, digest_ratio: float, digest_size: int) -> list:
+    messages = []
+    for i in range(count):
+        item_count = digest_size if random.random() < digest_ratio else 1
+        messages.append({
+            "recipient_email": f"owner{i}@example.com",
+            "recipient_name": f"Owner {i}",
+            "items": [make_item(i * digest_size + j) for j in range(item_count)]
+        })
+    return messages
+
+
+def report(label: str, count: int, elapsed: float):
+    print(f"{label:<28} {count:>7} msgs  {elapsed:8.3f}s  {count / elapsed:10.1f} msgs/sec")
+
+
+async def run_batched(messages: list, batch_size: int, sender: str):
+    for start in range(0, len(messages), batch_size):
+        await render_messages_async(messages[start:start + batch_size], sender)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email template rendering")
+    parser.add_argument("--count", type=int, default=5000, help="Messages to render")
+    parser.add_argument("--digest-ratio", type=float, default=0.2, help="Fraction of messages that are digests")
+    parser.add_argument("--digest-size", type=int, default=5, help="Matches per digest")
+    parser.add_argument("--batch-size", type=int, default=20, help="Messages per worker-thread render call")
+    args = parser.parse_args()
+
+    random.seed(42)
+    sender = "petfinder@example.com"
+    messages = make_messages(args.count, args.digest_ratio, args.digest_size)
+
+    start = time.perf_counter()
+    load_templates()
+    print(f"Template load + compile: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    rendered = render_messages(messages, sender)
+    report("Inline render", len(messages), time.perf_counter() - start)
+    failures = [r for r in rendered if isinstance(r, Exception)]
+    if failures:
+        print(f"❌ {len(failures)} messages failed to render: {failures[0]}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    asyncio.run(run_batched(messages, args.batch_size, sender))
+    report(f"Worker thread (batch {args.batch_size})", len(messages), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measure how long `import main` takes, and keep it from creeping back up.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters (so nothing
+is cached in sys.modules), parses the per-module timings, and prints the
+slowest packages and the total. Run it a few times with --runs and the median
+is used.
+
+It also checks that the modules startup defers really are deferred: boto3,
+httpx, jinja2 and pyinstrument should only be imported when first used. With
+--max-ms it exits 1 when the median total is over budget. The same check is
+tracked as a test in benchmarks/test_import_time.py, run with pytest.
+
+Usage:
+    python benchmarks/import_time.py --runs 5 --top 15 --max-ms 1500
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use (see s3_config, ai_service, email_templates, profiling)
+DEFERRED_MODULES = ["boto3", "botocore", "httpx", "jinja2", "pyinstrument"]
+
+
+def measure_once(python: str) -> dict:
+    """Per-module cumulative import time in microseconds, for one fresh interpreter"""
+    env = {**os.environ, "LOG_LEVEL": "OFF"}
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        tail = result.stderr.strip().splitlines()[-5:]
+        raise RuntimeError("import main failed:\n" + "\n".join(tail))
+
+    # Lines look like "import time:   self_us | cumulative_us |   name", nested imports indented two more spaces
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        cumulative_us = int(cumulative_us)
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += cumulative_us
+        # A package's first import includes its submodules, so the largest entry is its cost
+        package = name.strip().split(".")[0]
+        modules[package] = max(modules.get(package, 0), cumulative_us)
+    return {"total_us": total_us, "modules": modules}
+
+
+def measure(runs: int, python: str = sys.executable):
+    """Median total ms, median ms per package (slowest first) and the deferred modules that were imported anyway"""
+    results = [measure_once(python) for _ in range(runs)]
+    total_ms = statistics.median(run["total_us"] for run in results) / 1000
+    packages = {}
+    for run in results:
+        for package, us in run["modules"].items():
+            packages.setdefault(package, []).append(us)
+    slowest = sorted(((statistics.median(us) / 1000, package) for package, us in packages.items()), reverse=True)
+    eager = [module for module in DEFERRED_MODULES if module in packages]
+    return total_ms, slowest, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the API")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail when the median total is above this")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    total_ms, slowest, eager = measure(args.runs, args.python)
+
+    print(f"import main: {total_ms:.1f} ms (median of {args.runs})\n")
+    print(f"{'package':<28}{'cumulative ms':>14}")
+    for ms, package in slowest[:args.top]:
+        print(f"{package:<28}{ms:>14.1f}")
+
+    failed = False
+    if eager:
+        print(f"\n❌ Imported at startup but should be deferred: {', '.join(eager)}")
+        failed = True
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\n❌ Import time {total_ms:.1f} ms is over the {args.max_ms:.0f} ms budget")
+        failed = True
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "total_ms": round(total_ms, 1),
+                "runs": args.runs,
+                "slowest": [{"package": package, "ms": round(ms, 1)} for ms, package in slowest[:args.top]],
+                "eager_deferred_modules": eager,
+            }, f, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API against local stand-ins.
+
+Starts a fake S3, a fake Gemini (configurable latency and error rate), an SMTP
+sink and, with --start-mongod, a throwaway mongod. The app itself runs under
+uvicorn on a background thread of this process. The driver then runs a weighted
+mix of requests at each concurrency level and writes JSON with throughput and
+p50/p95/p99 latency per endpoint, so runs can be compared across commits.
+
+Without --start-mongod, --mongo-uri must point at a MongoDB you can write to;
+the benchmark database (--mongo-db) is dropped before and after the run.
+
+Usage:
+    python benchmarks/loadtest.py --start-mongod --concurrency 1,8,32 --duration 20 \\
+        --mix create=1,list=6,detail=3,matches=2,decision=1 --gemini-latency-ms 800 --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from standins import FakeS3Server, FakeGeminiServer, SMTPSink, MongodProcess, free_port
+
+OPERATIONS = ["create", "list", "detail", "matches", "decision"]
+DEFAULT_MIX = "create=1,list=6,detail=3,matches=2,decision=1"
+BUCKET = "petfinder-loadtest"
+
+# Small valid-looking JPEG payload; the fake Gemini never decodes it
+SAMPLE_IMAGE = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + os.urandom(20 * 1024) + b"\xff\xd9"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+class Recorder:
+    """Latencies and outcomes per operation for one concurrency level"""
+
+    def __init__(self):
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+        self.statuses = {name: {} for name in OPERATIONS}
+
+    def record(self, operation: str, seconds: float, status: int):
+        self.latencies[operation].append(seconds)
+        self.statuses[operation][str(status)] = self.statuses[operation].get(str(status), 0) + 1
+        if status == 0 or status >= 500:
+            self.errors[operation] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, values in self.latencies.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            endpoints[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "statuses": self.statuses[name],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class LoadDriver:
+    """Issues the request mix against the app and keeps ids seen in responses for follow-up requests"""
+
+    def __init__(self, client: httpx.AsyncClient, weights: dict):
+        self.client = client
+        self.operations = list(weights)
+        self.weights = [weights[name] for name in self.operations]
+        self.report_ids = []
+        self.pending_match_ids = []
+        self.counter = 0
+
+    async def create(self):
+        self.counter += 1
+        report_type = "Lost" if self.counter % 2 else "Found"
+        response = await self.client.post(
+            "/api/reports",
+            files=[("files", (f"pet{self.counter}.jpg", SAMPLE_IMAGE, "image/jpeg"))],
+            data={
+                "report_type": report_type,
+                "pet_name": f"Pet {self.counter}",
+                "pet_type": "Dog",
+                "user_name": "Load Test",
+                "user_email": f"owner{self.counter % 50}@example.com",
+                "user_phone": "555-0100",
+                "user_location": "Santa Cruz, CA",
+                "description": "Load test report",
+            },
+        )
+        if response.status_code == 200:
+            self.report_ids.append(response.json()["report_id"])
+        return response
+
+    async def list(self):
+        params = random.choice([
+            {},
+            {"report_type": "Found"},
+            {"report_type": "Lost", "pet_type": "Dog"},
+            {"search": random.choice(["retriever", "tabby", "black"])},
+            {"skip": random.randint(0, 100), "limit": 20},
+        ])
+        return await self.client.get("/api/reports", params=params)
+
+    async def detail(self):
+        if not self.report_ids:
+            return await self.list()
+        return await self.client.get(f"/api/reports/{random.choice(self.report_ids)}")
+
+    async def matches(self):
+        response = await self.client.get("/api/matches", params={"limit": 20})
+        if response.status_code == 200:
+            for match in response.json().get("matches", []):
+                self.pending_match_ids.append(match["match_id"])
+            # Keep the pool small so decisions mostly hit still-pending matches
+            del self.pending_match_ids[:-200]
+        return response
+
+    async def decision(self):
+        if not self.pending_match_ids:
+            return await self.matches()
+        match_id = self.pending_match_ids.pop(random.randrange(len(self.pending_match_ids)))
+        return await self.client.post(
+            f"/api/matches/{match_id}/decision",
+            params={"decision": random.choice(["accept", "reject", "reject"])}
+        )
+
+    async def worker(self, recorder: Recorder, deadline: float):
+        while time.monotonic() < deadline:
+            operation = random.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(self, operation)()
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            recorder.record(operation, time.perf_counter() - started, status)
+
+    async def run_level(self, concurrency: int, duration: float, warmup: float) -> dict:
+        if warmup > 0:
+            await asyncio.gather(*[self.worker(Recorder(), time.monotonic() + warmup) for _ in range(concurrency)])
+        recorder = Recorder()
+        started = time.monotonic()
+        await asyncio.gather(*[self.worker(recorder, started + duration) for _ in range(concurrency)])
+        return {"concurrency": concurrency, **recorder.summary(time.monotonic() - started)}
+
+
+def configure_environment(args, mongo_uri: str, s3: FakeS3Server, gemini: FakeGeminiServer, smtp: SMTPSink):
+    """Point the app at the stand-ins. Must run before main is imported, since settings are read at import."""
+    os.environ.update({
+        "MONGO_URI": mongo_uri,
+        "MONGO_DB": args.mongo_db,
+        "S3_ENDPOINT_URL": s3.url,
+        "S3_BUCKET_NAME": BUCKET,
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "AWS_REGION": "us-east-1",
+        "GEMINI_API_KEY": "loadtest-fake-gemini-key",
+        "GEMINI_BASE_URL": f"{gemini.url}/v1beta",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_STARTTLS": "false",
+        "EMAIL_FROM": "petfinder@localhost",
+        "OUTBOX_POLL_INTERVAL": "1",
+        "LOG_LEVEL": args.log_level,
+    })
+    os.environ.pop("EMAIL_USERNAME", None)
+    os.environ.pop("EMAIL_PASSWORD", None)
+
+
+def start_app(port: int):
+    """Run the app under uvicorn on a background thread; returns the server handle"""
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    # Signals belong to the benchmark process, not the server thread
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become ready in time")
+
+
+async def drop_database(mongo_uri: str, name: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(mongo_uri)
+    await client.drop_database(name)
+    client.close()
+
+
+async def run(args, base_url: str) -> list:
+    weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=max(args.levels) * 2, max_keepalive_connections=max(args.levels) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        driver = LoadDriver(client, weights)
+        if args.seed_reports:
+            print(f"🌱 Seeding {args.seed_reports} reports...", file=sys.stderr)
+            for start in range(0, args.seed_reports, 16):
+                await asyncio.gather(*[driver.create() for _ in range(min(16, args.seed_reports - start))])
+        results = []
+        for concurrency in args.levels:
+            print(f"🚀 Concurrency {concurrency} for {args.duration}s...", file=sys.stderr)
+            result = await driver.run_level(concurrency, args.duration, args.warmup)
+            print(f"   {result['throughput_rps']} req/s over {result['requests']} requests", file=sys.stderr)
+            results.append(result)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against local stand-ins")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, e.g. create=1,list=6")
+    parser.add_argument("--seed-reports", type=int, default=200, help="Reports created before measuring")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request, seconds")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0, help="Mean fake Gemini latency")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="Fraction of Gemini calls that return 503")
+    parser.add_argument("--start-mongod", action="store_true", help="Start a throwaway mongod")
+    parser.add_argument("--mongod-path", default="mongod", help="mongod binary for --start-mongod")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--mongo-db", default="petfinder_loadtest", help="Database to use; dropped before and after")
+    parser.add_argument("--log-level", default="WARNING", help="App LOG_LEVEL during the run")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the request mix")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.concurrency.split(",")]
+    random.seed(args.seed)
+
+    mongod = MongodProcess(args.mongod_path).start() if args.start_mongod else None
+    mongo_uri = mongod.uri if mongod else args.mongo_uri
+    s3 = FakeS3Server().start()
+    gemini = FakeGeminiServer(latency_ms=args.gemini_latency_ms, error_rate=args.gemini_error_rate).start()
+    smtp = SMTPSink().start()
+    configure_environment(args, mongo_uri, s3, gemini, smtp)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = None
+    try:
+        asyncio.run(drop_database(mongo_uri, args.mongo_db))
+        server, thread = start_app(port)
+        asyncio.run(wait_until_ready(base_url))
+        levels = asyncio.run(run(args, base_url))
+        server.should_exit = True
+        thread.join(timeout=30)
+        server = None
+
+        output = {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "mix": parse_mix(args.mix),
+                "duration_s": args.duration,
+                "warmup_s": args.warmup,
+                "seed_reports": args.seed_reports,
+                "gemini_latency_ms": args.gemini_latency_ms,
+                "gemini_error_rate": args.gemini_error_rate,
+                "python": sys.version.split()[0],
+            },
+            "levels": levels,
+            "standins": {
+                "s3_puts": s3.puts,
+                "gemini_requests": gemini.requests,
+                "gemini_errors": gemini.errors,
+                "emails_received": smtp.messages,
+            },
+        }
+        text = json.dumps(output, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+            print(f"✅ Results written to {args.output}", file=sys.stderr)
+        else:
+            print(text)
+    finally:
+        if server is not None:
+            server.should_exit = True
+        try:
+            asyncio.run(drop_database(mongo_uri, args.mongo_db))
+        except Exception:
+            pass
+        smtp.stop()
+        gemini.stop()
+        s3.stop()
+        if mongod:
+            mongod.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmark matching as the reports collection grows.
+
+Loads synthetic reports with skewed tag distributions into a benchmark database
+(a handful of common dog and cat breeds dominate; colors follow a Zipf-like
+curve; tag casing varies the way user-entered and AI tags do), growing the same
+collection through each size. At each size, a batch of new reports is matched
+the way find_matches_bulk does it, and each phase is measured on its own:
+
+    fetch     candidate retrieval (fetch_candidates per report type / pet type group)
+    pair      scoring (the hash join in pair_matches)
+    persist   existing-match check and insert_many (persist_matches)
+    legacy    optional: the old per-report approach of loading every opposite-type
+              report and scoring each one with calculate_match_score
+
+For each phase it reports wall time, peak Python heap (tracemalloc, measured on a
+separate pass so it doesn't distort timings) and MongoDB round trips (commands
+seen by a pymongo CommandListener).
+
+Needs a MongoDB: pass --start-mongod for a throwaway local mongod, or --mongo-uri.
+
+Usage:
+    python benchmarks/matching_bench.py --start-mongod --sizes 10000,100000,1000000 --new-reports 200 --output matching.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from collections import Counter as CountBy
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from bson import ObjectId
+from pymongo import monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+
+from standins import MongodProcess
+from models import PetReport, PetMatch, PetTags, EmailOutbox
+from matching import (
+    calculate_match_score, match_key, fetch_candidates, pair_matches, persist_matches
+)
+
+# (breed, weight) per species; a few breeds dominate, as in shelter intake data
+BREEDS = {
+    "Dog": [("Mixed", 30), ("Labrador Retriever", 14), ("Golden Retriever", 9), ("German Shepherd", 8),
+            ("Pit Bull", 8), ("Chihuahua", 7), ("Beagle", 5), ("Poodle", 4), ("Husky", 4),
+            ("Dachshund", 3), ("Boxer", 3), ("Corgi", 2), ("Shih Tzu", 2), ("Unknown", 1)],
+    "Cat": [("Domestic Shorthair", 45), ("Tabby", 18), ("Domestic Longhair", 10), ("Siamese", 8),
+            ("Maine Coon", 6), ("Persian", 4), ("Bengal", 3), ("Ragdoll", 3), ("Unknown", 3)],
+    "Bird": [("Parakeet", 40), ("Cockatiel", 30), ("Parrot", 20), ("Unknown", 10)],
+    "Rabbit": [("Mixed", 60), ("Lop", 25), ("Unknown", 15)],
+}
+SPECIES = [("Dog", 58), ("Cat", 36), ("Bird", 3), ("Rabbit", 3)]
+COLORS = ["Black", "White", "Brown", "Golden", "Gray", "Orange", "Cream", "Tan", "Brindle", "Calico", "Tricolor", "Blue"]
+# Zipf-like: weight 1/rank
+COLOR_WEIGHTS = [1 / rank for rank in range(1, len(COLORS) + 1)]
+PET_TYPES = {"Dog": "Dog", "Cat": "Cat", "Bird": "Other", "Rabbit": "Other"}
+LOAD_BATCH = 5000
+
+
+def _vary_case(value: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.08:
+        return value.lower()
+    if roll < 0.10:
+        return value.upper()
+    return value
+
+
+def _weighted(rng: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+
+def make_report(rng: random.Random, index: int, now: datetime) -> dict:
+    """One synthetic pet_reports document"""
+    species = _weighted(rng, SPECIES)
+    breed = _weighted(rng, BREEDS[species])
+    color = rng.choices(COLORS, COLOR_WEIGHTS)[0]
+    return {
+        "_id": ObjectId(),
+        "user_id": "benchmark",
+        "report_type": "Lost" if rng.random() < 0.5 else "Found",
+        "pet_name": f"Pet {index}",
+        "pet_type": PET_TYPES[species],
+        "user_info": {"name": f"Owner {index}", "email": f"owner{index}@example.com",
+                      "phone": "555-0100", "location": "Santa Cruz, CA"},
+        "image_urls": [f"https://bench.example.com/{index}.jpg"],
+        "tags": {"species": _vary_case(species, rng), "breed": _vary_case(breed, rng),
+                 "primary_color": _vary_case(color, rng), "age_group": "Adult", "marks": [], "size": "Medium"},
+        "description": None,
+        "location": {"type": "Point", "coordinates": [0.0, 0.0]},
+        "status": "active" if rng.random() < 0.9 else "found",
+        "import_key": None,
+        "created_at": now - timedelta(minutes=index),
+        "updated_at": now - timedelta(minutes=index),
+    }
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts commands sent to MongoDB, by command name"""
+
+    def __init__(self):
+        self.commands = CountBy()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = CountBy()
+
+
+async def load_reports(collection, start: int, stop: int, rng: random.Random):
+    """Insert reports start..stop-1 in batches"""
+    now = datetime.utcnow()
+    for batch_start in range(start, stop, LOAD_BATCH):
+        batch = [make_report(rng, index, now) for index in range(batch_start, min(stop, batch_start + LOAD_BATCH))]
+        await collection.insert_many(batch, ordered=False)
+
+
+def group_new_reports(new_reports: list) -> dict:
+    """Same grouping as find_matches_bulk: (opposite report type, pet type) -> reports"""
+    groups = {}
+    for report in new_reports:
+        search_type = "Lost" if report["report_type"] == "Found" else "Found"
+        groups.setdefault((search_type, report["pet_type"]), []).append(report)
+    return groups
+
+
+async def fetch_phase(groups: dict) -> dict:
+    candidates = {}
+    for (search_type, pet_type), reports in groups.items():
+        candidates[(search_type, pet_type)] = await fetch_candidates(
+            search_type, pet_type, {match_key(report["tags"]) for report in reports}
+        )
+    return candidates
+
+
+def pair_phase(groups: dict, candidates: dict) -> list:
+    pairs = []
+    for group, reports in groups.items():
+        pairs.extend(pair_matches(reports, candidates[group]))
+    return pairs
+
+
+async def legacy_phase(groups: dict) -> int:
+    """Load every active opposite-type report per group and score each pair one by one"""
+    collection = PetReport.get_motor_collection()
+    matches = 0
+    for (search_type, pet_type), reports in groups.items():
+        docs = await collection.find(
+            {"report_type": search_type, "status": "active", "pet_type": pet_type}, {"tags": 1}
+        ).to_list(length=None)
+        candidate_tags = [PetTags(**doc["tags"]) for doc in docs]
+        for report in reports:
+            tags = PetTags(**report["tags"])
+            for other in candidate_tags:
+                score, _ = calculate_match_score(tags, other)
+                if score >= 3:
+                    matches += 1
+    return matches
+
+
+async def measure(name: str, phase, listener: RoundTripCounter, track_memory: bool, before_memory_pass=None):
+    """Time phase() once with tracemalloc off, then (optionally) again for peak memory"""
+    listener.reset()
+    started = time.perf_counter()
+    result = phase()
+    if asyncio.iscoroutine(result):
+        result = await result
+    elapsed = time.perf_counter() - started
+    round_trips = dict(listener.commands)
+
+    peak = None
+    if track_memory:
+        if before_memory_pass:
+            await before_memory_pass()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        repeat = phase()
+        if asyncio.iscoroutine(repeat):
+            await repeat
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, {
+        "phase": name,
+        "seconds": round(elapsed, 4),
+        "peak_mib": round(peak / (1024 * 1024), 2) if peak is not None else None,
+        "round_trips": sum(round_trips.values()),
+        "commands": round_trips,
+    }
+
+
+async def run(args, mongo_uri: str) -> dict:
+    listener = RoundTripCounter()
+    client = AsyncIOMotorClient(mongo_uri, event_listeners=[listener])
+    await client.drop_database(args.mongo_db)
+    await init_beanie(database=client[args.mongo_db], document_models=[PetReport, PetMatch, EmailOutbox])
+    reports = PetReport.get_motor_collection()
+    matches = PetMatch.get_motor_collection()
+
+    rng = random.Random(args.seed)
+    results = []
+    loaded = 0
+    try:
+        for size in args.sizes:
+            load_started = time.perf_counter()
+            await load_reports(reports, loaded, size, rng)
+            loaded = size
+            load_seconds = time.perf_counter() - load_started
+            print(f"📦 {size:,} reports loaded ({load_seconds:.1f}s)", file=sys.stderr)
+
+            new_rng = random.Random(args.seed + size)
+            now = datetime.utcnow()
+            new_reports = [make_report(new_rng, size + i, now) for i in range(args.new_reports)]
+            for report in new_reports:
+                report["status"] = "active"
+            groups = group_new_reports(new_reports)
+
+            candidates, fetch = await measure("fetch", lambda: fetch_phase(groups), listener, args.memory)
+            pairs, pair = await measure("pair", lambda: pair_phase(groups, candidates), listener, args.memory)
+
+            async def clear_matches():
+                await matches.delete_many({})
+
+            created, persist = await measure(
+                "persist", lambda: persist_matches(pairs), listener, args.memory, before_memory_pass=clear_matches
+            )
+            await clear_matches()
+
+            phases = [fetch, pair, persist]
+            if args.legacy and size <= args.legacy_max_size:
+                _, legacy = await measure("legacy", lambda: legacy_phase(groups), listener, args.memory)
+                phases.append(legacy)
+
+            candidate_count = sum(len(group) for group in candidates.values())
+            results.append({
+                "size": size,
+                "new_reports": len(new_reports),
+                "candidates": candidate_count,
+                "pairs": len(pairs),
+                "matches_created": len(created),
+                "load_seconds": round(load_seconds, 2),
+                "phases": phases,
+            })
+            for phase in phases:
+                peak = f"{phase['peak_mib']:8.2f} MiB" if phase["peak_mib"] is not None else "       -    "
+                print(f"   {phase['phase']:<8} {phase['seconds'] * 1000:10.1f} ms  {peak}  {phase['round_trips']:>6} round trips",
+                      file=sys.stderr)
+    finally:
+        if not args.keep_db:
+            await client.drop_database(args.mongo_db)
+        client.close()
+    return {"levels": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark matching at growing collection sizes")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated collection sizes")
+    parser.add_argument("--new-reports", type=int, default=200, help="New reports matched at each size")
+    parser.add_argument("--legacy", action="store_true", help="Also time the old load-everything-and-score approach")
+    parser.add_argument("--legacy-max-size", type=int, default=100000, help="Skip the legacy phase above this size")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc passes")
+    parser.add_argument("--start-mongod", action="store_true", help="Start a throwaway mongod")
+    parser.add_argument("--mongod-path", default="mongod", help="mongod binary for --start-mongod")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--mongo-db", default="petfinder_matching_bench", help="Database to use; dropped before the run")
+    parser.add_argument("--keep-db", action="store_true", help="Leave the benchmark database in place")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic data")
+    parser.add_argument("--output", help="Write JSON results here")
+    args = parser.parse_args()
+    args.sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    mongod = MongodProcess(args.mongod_path).start() if args.start_mongod else None
+    try:
+        output = asyncio.run(run(args, mongod.uri if mongod else args.mongo_uri))
+    finally:
+        if mongod:
+            mongod.stop()
+
+    output["config"] = {"new_reports": args.new_reports, "seed": args.seed, "python": sys.version.split()[0]}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
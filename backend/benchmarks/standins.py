@@ -0,0 +1,286 @@
+"""
+Local stand-ins for the services the API talks to, for benchmarks.
+
+- FakeS3Server: path-style PUT/GET/HEAD/DELETE of objects, kept in memory
+- FakeGeminiServer: generateContent with configurable latency and error injection,
+  and a model listing for connection warm-up and readiness checks
+- SMTPSink: accepts and counts messages, discarding them
+- MongodProcess: a throwaway mongod on a temporary data directory
+
+Each server runs on its own thread and binds to an ephemeral localhost port.
+"""
+
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import hashlib
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlsplit
+
+# Tag combinations the fake Gemini answers with; few enough that Lost and Found reports match
+DEFAULT_TAG_POOL = [
+    {"species": "Dog", "breed": "Golden Retriever", "primary_color": "Golden"},
+    {"species": "Dog", "breed": "Labrador", "primary_color": "Black"},
+    {"species": "Dog", "breed": "Beagle", "primary_color": "Brown"},
+    {"species": "Cat", "breed": "Tabby", "primary_color": "Orange"},
+    {"species": "Cat", "breed": "Siamese", "primary_color": "White"},
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _read_body(handler: BaseHTTPRequestHandler) -> bytes:
+    """Request body, decoding chunked and aws-chunked uploads as sent by recent botocore"""
+    if handler.headers.get("Transfer-Encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int(handler.rfile.readline().split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while handler.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            body += handler.rfile.read(size)
+            handler.rfile.readline()
+        raw = bytes(body)
+    else:
+        raw = handler.rfile.read(int(handler.headers.get("Content-Length", "0")))
+
+    if "aws-chunked" in handler.headers.get("Content-Encoding", ""):
+        decoded = bytearray()
+        position = 0
+        while position < len(raw):
+            line_end = raw.index(b"\r\n", position)
+            size = int(raw[position:line_end].split(b";")[0], 16)
+            if size == 0:
+                break
+            decoded += raw[line_end + 2:line_end + 2 + size]
+            position = line_end + 2 + size + 2
+        raw = bytes(decoded)
+    return raw
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, body: bytes = b"", content_type: str = "application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class _ThreadedServer:
+    """Runs a ThreadingHTTPServer on a background thread"""
+
+    def __init__(self, handler_class):
+        self.port = free_port()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _S3Handler(_QuietHandler):
+    def _key(self) -> str:
+        return urlsplit(self.path).path.lstrip("/")
+
+    def do_PUT(self):
+        body = _read_body(self)
+        s3 = self.server.standin
+        with s3.lock:
+            s3.objects[self._key()] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+            s3.puts += 1
+        self._respond(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def do_GET(self):
+        if "/" not in self._key():
+            # Bucket-level request (HeadBucket); every bucket exists
+            self._respond(200)
+            return
+        stored = self.server.standin.objects.get(self._key())
+        if stored is None:
+            self._respond(404, b"<Error><Code>NoSuchKey</Code></Error>", "application/xml")
+            return
+        body, content_type = stored
+        self._respond(200, body, content_type)
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        with self.server.standin.lock:
+            self.server.standin.objects.pop(self._key(), None)
+        self._respond(204)
+
+
+class FakeS3Server(_ThreadedServer):
+    """In-memory S3 for path-style requests (set S3_ENDPOINT_URL to .url). No multipart or listing."""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+        self.lock = threading.Lock()
+        super().__init__(_S3Handler)
+
+
+class _GeminiHandler(_QuietHandler):
+    def do_GET(self):
+        body = {"models": [{"name": "models/gemini-3-flash-preview"}]}
+        self._respond(200, json.dumps(body).encode(), "application/json")
+
+    def do_POST(self):
+        gemini = self.server.standin
+        _read_body(self)
+        if gemini.latency_ms:
+            time.sleep(max(0.0, random.gauss(gemini.latency_ms, gemini.latency_ms * gemini.jitter)) / 1000)
+        with gemini.lock:
+            gemini.requests += 1
+            fail = random.random() < gemini.error_rate
+            if fail:
+                gemini.errors += 1
+        if fail:
+            self._respond(503, b'{"error": {"code": 503, "message": "injected failure"}}', "application/json")
+            return
+        tags = {**random.choice(gemini.tag_pool), "age_group": "Adult", "marks": ["Floppy ears"], "size": "Medium"}
+        body = {"candidates": [{"content": {"parts": [{"text": json.dumps(tags)}]}}]}
+        self._respond(200, json.dumps(body).encode(), "application/json")
+
+
+class FakeGeminiServer(_ThreadedServer):
+    """
+    Answers generateContent with tags from tag_pool (set GEMINI_BASE_URL to .url + "/v1beta").
+    latency_ms is the mean response delay; error_rate of requests get a 503.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.2, error_rate: float = 0.0, tag_pool=None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tag_pool = tag_pool or DEFAULT_TAG_POOL
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        super().__init__(_GeminiHandler)
+
+
+class SMTPSink:
+    """Minimal SMTP server that accepts every message and counts it"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.messages = 0
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 localhost sink ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("latin-1").strip().upper()
+                if command.startswith("EHLO"):
+                    await reply("250-localhost\r\n250 8BITMIME")
+                elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    self.messages += 1
+                    await reply("250 OK: queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+    def start(self):
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._session, "127.0.0.1", self.port), self._loop
+        )
+        self._server = future.result()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class MongodProcess:
+    """A standalone mongod on a temporary dbpath, removed on stop"""
+
+    def __init__(self, mongod_path: str = "mongod"):
+        self.mongod_path = mongod_path
+        self.port = free_port()
+        self.dbpath = tempfile.mkdtemp(prefix="petfinder-bench-mongo-")
+        self._process: Optional[subprocess.Popen] = None
+
+    @property
+    def uri(self) -> str:
+        return f"mongodb://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0):
+        self._process = subprocess.Popen(
+            [self.mongod_path, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"mongod exited with code {self._process.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError("mongod did not start in time")
+
+    def stop(self):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        shutil.rmtree(self.dbpath, ignore_errors=True)
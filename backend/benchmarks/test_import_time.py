@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Import-time budget for the API, run with pytest (or directly).
+
+Fails when the median time of `import main` goes over IMPORT_TIME_BUDGET_MS
+(default 1500), or when a module startup is meant to defer (boto3, httpx,
+jinja2, pyinstrument) gets imported eagerly. See import_time.py for the
+per-package breakdown.
+
+Usage:
+    python -m pytest benchmarks/test_import_time.py
+    IMPORT_TIME_BUDGET_MS=1000 python benchmarks/test_import_time.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from import_time import measure
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+IMPORT_TIME_RUNS = int(os.getenv("IMPORT_TIME_RUNS", "3"))
+
+
+def test_import_time():
+    """import main stays under budget and leaves the deferred modules unimported"""
+    total_ms, slowest, eager = measure(IMPORT_TIME_RUNS)
+    assert not eager, f"Imported at startup but should be deferred: {', '.join(eager)}"
+    assert total_ms <= IMPORT_TIME_BUDGET_MS, (
+        f"import main took {total_ms:.1f} ms (budget {IMPORT_TIME_BUDGET_MS:.0f} ms); slowest: "
+        + ", ".join(f"{package} {ms:.0f} ms" for ms, package in slowest[:5])
+    )
+
+
+if __name__ == "__main__":
+    test_import_time()
+    print("✅ Import time within budget")
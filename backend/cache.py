@@ -0,0 +1,261 @@
+"""
+Response cache for read-heavy API endpoints.
+
+Serialized responses are stored together with a strong ETag so repeat reads skip
+MongoDB, Beanie hydration and response building, and clients that send
+If-None-Match can skip the body entirely.
+
+Report detail entries are invalidated per report id. Listing entries are keyed by
+a collection-level version counter that writers bump, so a bump makes every
+cached listing unreachable and old entries simply age out of the LRU.
+
+The backend is selected with CACHE_BACKEND:
+    memory  - in-process LRU with TTL (default, per worker)
+    redis   - shared between workers, requires the optional 'redis' package and REDIS_URL
+
+With the memory backend, invalidation only reaches the worker that made the
+write: other workers keep serving their cached copy of a changed report, or a
+listing from before the version bump, until its TTL runs out. Use redis when
+running more than one worker and stale reads matter. The same goes for admin
+scripts (cleanup_matches, import_reports, populate_gallery): they run in their
+own process, so they can only invalidate the API's cache through redis. With
+the memory backend they skip invalidation and print STALE_CACHE_WARNING.
+"""
+
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional, List
+from config import settings
+from metrics import CACHE_REQUESTS
+from structured_log import get_logger
+
+logger = get_logger("cache")
+
+REPORT_CACHE_SIZE = settings.report_cache_size
+REPORT_CACHE_TTL = settings.report_cache_ttl
+LISTING_CACHE_TTL = settings.listing_cache_ttl
+
+REPORTS_VERSION_KEY = "version:reports"
+
+STALE_CACHE_WARNING = (
+    f"⚠️ CACHE_BACKEND={settings.cache_backend} is per process, so this script can't invalidate the API's cache. "
+    f"It may serve stale listings for up to {LISTING_CACHE_TTL:g}s and stale reports for up to {REPORT_CACHE_TTL:g}s; "
+    "restart the API to see the changes now."
+)
+
+
+class CacheBackend:
+    """Interface for response cache storage. Values are JSON-serializable dicts."""
+
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}  # Counters never expire or get evicted
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-backed cache shared by all workers. Size is bounded by the server's maxmemory policy."""
+
+    def __init__(self, url: str, prefix: str = "petfinder:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: dict, ttl: float) -> None:
+        await self._redis.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def delete(self, keys: List[str]) -> None:
+        if keys:
+            await self._redis.delete(*[self.prefix + key for key in keys])
+
+    async def get_counter(self, key: str) -> int:
+        raw = await self._redis.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(self.prefix + key)
+
+
+def build_cache_backend() -> CacheBackend:
+    """Create the cache backend configured by CACHE_BACKEND"""
+    backend = settings.cache_backend
+    if backend == "redis":
+        return RedisCacheBackend(settings.redis_url)
+    if settings.web_concurrency > 1:
+        logger.warning(
+            f"⚠️ CACHE_BACKEND=memory with {settings.web_concurrency} workers: invalidation only reaches the "
+            "worker that made the change, so others may serve stale reports until the TTL expires. "
+            "Set CACHE_BACKEND=redis to share the cache."
+        )
+    return MemoryCacheBackend(max_entries=REPORT_CACHE_SIZE)
+
+
+cache_backend = build_cache_backend()
+
+
+def cache_is_shared() -> bool:
+    """True when the cache lives outside the process (redis), so another process such as an admin script can invalidate it"""
+    return isinstance(cache_backend, RedisCacheBackend)
+
+
+def make_etag(payload: dict) -> str:
+    """Strong ETag derived from the canonical JSON encoding of a response body"""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def _report_key(report_id: str) -> str:
+    return f"report:{report_id}"
+
+
+async def _get_entry(key: str) -> Optional[dict]:
+    try:
+        return await cache_backend.get(key)
+    except Exception as e:
+        # A broken cache must never take down reads
+        logger.warning(f"⚠️ Cache read failed: {str(e)}")
+        return None
+
+
+async def _store_entry(key: str, payload: dict, ttl: float) -> dict:
+    entry = {"etag": make_etag(payload), "body": payload}
+    try:
+        await cache_backend.set(key, entry, ttl)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache write failed: {str(e)}")
+    return entry
+
+
+async def get_cached_report(report_id: str) -> Optional[dict]:
+    """Return the cached {"etag", "body"} entry for a report, or None on miss"""
+    entry = await _get_entry(_report_key(report_id))
+    CACHE_REQUESTS.inc(kind="report", result="hit" if entry else "miss")
+    return entry
+
+
+async def cache_report(report_id: str, payload: dict) -> dict:
+    """Store a serialized report response and return its cache entry"""
+    return await _store_entry(_report_key(report_id), payload, REPORT_CACHE_TTL)
+
+
+async def invalidate_reports(*report_ids) -> None:
+    """Drop cached responses for reports that changed"""
+    try:
+        await cache_backend.delete([_report_key(str(report_id)) for report_id in report_ids])
+    except Exception as e:
+        logger.warning(f"⚠️ Cache invalidation failed: {str(e)}")
+
+
+async def get_reports_version() -> Optional[int]:
+    """Current version of the pet_reports collection, or None if the cache is unavailable"""
+    try:
+        return await cache_backend.get_counter(REPORTS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache read failed: {str(e)}")
+        return None
+
+
+async def bump_reports_version() -> None:
+    """Mark every cached report listing as stale. Call after any write to reports or matches."""
+    try:
+        await cache_backend.incr(REPORTS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache invalidation failed: {str(e)}")
+
+
+def listing_cache_key(version: Optional[int], params: dict) -> Optional[str]:
+    """Cache key for a report listing, normalized so equivalent queries share an entry"""
+    if version is None:
+        return None
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name == "search":
+            # Search is case-insensitive
+            value = value.strip().lower()
+        normalized[name] = value
+    return f"reports:v{version}:" + json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+async def get_cached_listing(key: Optional[str]) -> Optional[dict]:
+    """Return the cached {"etag", "body"} entry for a listing key, or None on miss"""
+    if key is None:
+        CACHE_REQUESTS.inc(kind="listing", result="unavailable")
+        return None
+    entry = await _get_entry(key)
+    CACHE_REQUESTS.inc(kind="listing", result="hit" if entry else "miss")
+    return entry
+
+
+async def cache_listing(key: Optional[str], payload: dict) -> dict:
+    """Store a serialized listing response and return its cache entry"""
+    if key is None:
+        return {"etag": make_etag(payload), "body": payload}
+    return await _store_entry(key, payload, LISTING_CACHE_TTL)
@@ -1,67 +1,108 @@
 #!/usr/bin/env python3
 """
-Cleanup script to remove auto-matched reports created by scraper_bot
+Cleanup script to remove auto-matched reports created by scraper_bot (or any other user id).
+
+Works on sets of report ids: each chunk of ids costs one delete_many for the
+matches and one update_many for the status reset, whatever the number of matches.
+
+Usage:
+    python cleanup_matches.py                  # scraper_bot reports
+    python cleanup_matches.py --user-id some_user --dry-run
 """
 
-import os
+import time
 import asyncio
-from bson import ObjectId
-from dotenv import load_dotenv
+import argparse
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
-from models import PetReport, PetMatch
+from config import settings
+from cache import invalidate_reports, bump_reports_version, cache_is_shared, STALE_CACHE_WARNING
+
+
+CHUNK_SIZE = 5000
 
-load_dotenv()
+async def _iter_report_id_chunks(db, user_id: str, chunk_size: int):
+    """Yield the user's report ids in chunks, so huge id sets never sit in one query"""
+    chunk = []
+    async for doc in db.pet_reports.find({"user_id": user_id}, {"_id": 1}):
+        chunk.append(doc["_id"])
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-async def cleanup():
-    """Remove matches and update status for scraper_bot reports"""
+async def cleanup(user_id: str = "scraper_bot", dry_run: bool = False, chunk_size: int = CHUNK_SIZE):
+    """Remove matches and reset 'found' status for a user's reports"""
     try:
-        client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
-        await init_beanie(database=client["SlugHacks"], document_models=[PetReport, PetMatch])
+        started = time.perf_counter()
+        client = AsyncIOMotorClient(settings.mongo_uri)
+        # Raw collections avoid validation errors on malformed scraped reports
+        db = client[settings.mongo_db]
         print("✅ Connected to MongoDB\n")
-        
-        # Find all scraper_bot reports using raw query to avoid validation errors
-        db = client["SlugHacks"]
-        scraper_report_ids = []
-        async for doc in db.pet_reports.find({"user_id": "scraper_bot"}):
-            scraper_report_ids.append(str(doc["_id"]))
-        
-        print(f"Found {len(scraper_report_ids)} scraper_bot reports")
-        
-        # Find and delete matches involving scraper_bot reports
+        if dry_run:
+            print("🔎 Dry run: counting only, nothing will be changed\n")
+
+        report_count = 0
         deleted_matches = 0
-        for report_id in scraper_report_ids:
-            matches = await PetMatch.find({
+        updated = 0
+        chunks = 0
+
+        async for report_ids in _iter_report_id_chunks(db, user_id, chunk_size):
+            chunks += 1
+            report_count += len(report_ids)
+            match_query = {
                 "$or": [
-                    {"lost_report_id": report_id},
-                    {"found_report_id": report_id}
+                    {"lost_report_id": {"$in": report_ids}},
+                    {"found_report_id": {"$in": report_ids}}
                 ]
-            }).to_list()
-            
-            for match in matches:
-                await match.delete()
-                deleted_matches += 1
-                print(f"  Deleted match {match.id}")
-        
-        # Reset status of scraper_bot reports that were set to 'found'
-        updated = 0
-        for report_id in scraper_report_ids:
-            result = await db.pet_reports.update_one(
-                {"_id": ObjectId(report_id), "status": "found"},
-                {"$set": {"status": "active"}}
-            )
-            if result.modified_count > 0:
-                updated += 1
-                print(f"  Reset status for report {report_id}")
-        
-        print(f"\n✅ Cleanup complete!")
-        print(f"   Deleted {deleted_matches} matches")
-        print(f"   Reset {updated} report statuses")
-        
+            }
+            status_query = {"_id": {"$in": report_ids}, "status": "found"}
+
+            # The reports to reset, looked up the same way for a dry run and a real one
+            found_ids = await db.pet_reports.distinct("_id", status_query)
+
+            if dry_run:
+                deleted_matches += await db.pet_matches.count_documents(match_query)
+                updated += len(found_ids)
+            else:
+                result = await db.pet_matches.delete_many(match_query)
+                deleted_matches += result.deleted_count
+
+                if found_ids:
+                    result = await db.pet_reports.update_many(
+                        {"_id": {"$in": found_ids}, "status": "found"},
+                        {"$set": {"status": "active", "updated_at": datetime.utcnow()}}
+                    )
+                    updated += result.modified_count
+                    if cache_is_shared():
+                        # Only the reports being reset need their cached detail dropped
+                        await invalidate_reports(*found_ids)
+            print(f"  Chunk {chunks}: {len(report_ids)} reports {'checked' if dry_run else 'processed'}")
+
+        print(f"Found {report_count} {user_id} reports")
+
+        if not dry_run:
+            if cache_is_shared():
+                # Cached listings include match and status info
+                await bump_reports_version()
+            else:
+                print(STALE_CACHE_WARNING)
+
+        elapsed = time.perf_counter() - started
+        print(f"\n✅ Cleanup {'dry run ' if dry_run else ''}complete in {elapsed:.2f}s!")
+        print(f"   {'Would delete' if dry_run else 'Deleted'} {deleted_matches} matches")
+        print(f"   {'Would reset' if dry_run else 'Reset'} {updated} report statuses")
+
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
-    asyncio.run(cleanup())
+    parser = argparse.ArgumentParser(description="Remove matches involving a user's reports and reset their status")
+    parser.add_argument("--user-id", default="scraper_bot", help="Owner of the reports to clean up")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would change")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Report ids per bulk operation")
+    args = parser.parse_args()
+    asyncio.run(cleanup(user_id=args.user_id, dry_run=args.dry_run, chunk_size=args.chunk_size))
@@ -0,0 +1,213 @@
+"""
+Application settings, read from the environment (and .env) once.
+
+Every module takes its configuration from `settings` instead of calling
+load_dotenv and os.getenv itself, so the environment is parsed in one place
+and importing a module never has side effects beyond reading these values.
+Nothing here validates credentials; services that need a key check for it
+when they're first used.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+
+def _bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def _list(name: str, default: str) -> tuple:
+    return tuple(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    # MongoDB
+    mongo_uri: Optional[str]
+    mongo_db: str
+    mongo_max_pool_size: int
+    mongo_min_pool_size: int
+    mongo_max_idle_ms: int
+    mongo_wait_queue_timeout_ms: int
+    mongo_server_selection_timeout_ms: int
+    mongo_connect_timeout_ms: int
+    mongo_socket_timeout_ms: int  # 0 means no timeout
+    mongo_compressors: tuple
+    mongo_connect_retries: int
+    mongo_retry_backoff: float
+
+    # S3
+    s3_bucket_name: Optional[str]
+    aws_access_key_id: Optional[str]
+    aws_secret_access_key: Optional[str]
+    aws_region: str
+    s3_endpoint_url: Optional[str]  # e.g. a local S3 stand-in such as moto_server or MinIO
+
+    # Image storage
+    storage_backend: str  # auto (S3 when a bucket is set, else local), s3 or local
+    storage_fallback: bool  # Write to local storage when S3 fails
+    local_storage_dir: str
+    public_base_url: str  # Where this API is reachable; locally stored images are served from here
+
+    # Gemini
+    gemini_api_key: Optional[str]
+    gemini_base_url: str
+    gemini_timeout: float
+
+    # SMTP and the notification outbox
+    smtp_server: str
+    smtp_server_configured: bool
+    smtp_port: int
+    smtp_starttls: bool
+    smtp_timeout: float
+    smtp_pool_size: int
+    smtp_idle_timeout: float
+    email_username: Optional[str]
+    email_password: Optional[str]
+    email_from: Optional[str]
+    outbox_poll_interval: float
+    outbox_max_attempts: int
+    outbox_retry_base_seconds: float
+    outbox_retry_max_seconds: float
+    outbox_lease_seconds: float
+    outbox_batch_size: int
+    notify_coalesce_seconds: float
+    notify_max_per_hour: int
+
+    # Response cache
+    cache_backend: str
+    redis_url: str
+    report_cache_size: int
+    report_cache_ttl: float
+    listing_cache_ttl: float
+    web_concurrency: int  # Worker processes (uvicorn reads WEB_CONCURRENCY as its --workers default)
+
+    # Logging
+    log_level: str
+    log_sink: str
+    log_queue_size: int
+    log_batch_size: int
+    log_flush_interval: float
+
+    # Admin and profiling
+    admin_token: Optional[str]
+    profile_sample_rate: float
+    profile_dir: str
+    profile_max_files: int
+    profile_interval_ms: float
+
+    # Server-sent events (/api/stream)
+    event_watch_mode: str  # auto (change streams, polling on a standalone server), change_stream or poll
+    event_poll_interval: float
+    event_queue_size: int
+    event_max_subscribers: int
+    event_heartbeat_seconds: float
+
+    # Admission control for POST /api/reports (per worker, adjustable at /api/admin/limits)
+    admission_max_concurrent: int
+    admission_max_queue: int
+    admission_queue_timeout: float
+    ai_rate_limit: float  # Gemini analyses per second
+    ai_burst: float
+    ai_max_wait: float
+
+    # Readiness probe
+    ready_cache_seconds: float
+    ready_timeout: float
+    ready_required_checks: tuple
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv()
+        email_username = os.getenv("EMAIL_USERNAME")
+        return cls(
+            mongo_uri=os.getenv("MONGO_URI"),
+            mongo_db=os.getenv("MONGO_DB", "SlugHacks"),
+            mongo_max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+            mongo_min_pool_size=int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+            mongo_max_idle_ms=int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+            mongo_wait_queue_timeout_ms=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+            mongo_server_selection_timeout_ms=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            mongo_connect_timeout_ms=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+            mongo_socket_timeout_ms=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")),
+            # Any of zstd, snappy, zlib; the first one the server also supports is used
+            mongo_compressors=_list("MONGO_COMPRESSORS", ""),
+            mongo_connect_retries=int(os.getenv("MONGO_CONNECT_RETRIES", "5")),
+            mongo_retry_backoff=float(os.getenv("MONGO_RETRY_BACKOFF", "0.5")),
+
+            s3_bucket_name=os.getenv("S3_BUCKET_NAME"),
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            aws_region=os.getenv("AWS_REGION", "us-east-1"),
+            s3_endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+
+            storage_backend=os.getenv("STORAGE_BACKEND", "auto").lower(),
+            storage_fallback=_bool("STORAGE_FALLBACK", "true"),
+            local_storage_dir=os.getenv("LOCAL_STORAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage")),
+            public_base_url=os.getenv("PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/"),
+
+            gemini_api_key=os.getenv("GEMINI_API_KEY"),
+            # Overridable so benchmarks can point at a local stand-in
+            gemini_base_url=os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"),
+            gemini_timeout=float(os.getenv("GEMINI_TIMEOUT", "60")),
+
+            smtp_server=os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+            smtp_server_configured="SMTP_SERVER" in os.environ,
+            smtp_port=int(os.getenv("SMTP_PORT", "587")),
+            smtp_starttls=_bool("SMTP_STARTTLS", "true"),
+            smtp_timeout=float(os.getenv("SMTP_TIMEOUT", "30")),
+            smtp_pool_size=int(os.getenv("SMTP_POOL_SIZE", "2")),
+            smtp_idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", "60")),
+            email_username=email_username,
+            email_password=os.getenv("EMAIL_PASSWORD"),
+            email_from=os.getenv("EMAIL_FROM", email_username),
+            outbox_poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL", "5")),
+            outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6")),
+            outbox_retry_base_seconds=float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30")),
+            outbox_retry_max_seconds=float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600")),
+            outbox_lease_seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", "300")),
+            outbox_batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "20")),
+            notify_coalesce_seconds=float(os.getenv("NOTIFY_COALESCE_SECONDS", "120")),
+            notify_max_per_hour=int(os.getenv("NOTIFY_MAX_PER_HOUR", "4")),
+
+            cache_backend=os.getenv("CACHE_BACKEND", "memory").lower(),
+            redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            report_cache_size=int(os.getenv("REPORT_CACHE_SIZE", "2048")),
+            report_cache_ttl=float(os.getenv("REPORT_CACHE_TTL", "300")),
+            listing_cache_ttl=float(os.getenv("LISTING_CACHE_TTL", "60")),
+            web_concurrency=int(os.getenv("WEB_CONCURRENCY", "1")),
+
+            log_level=os.getenv("LOG_LEVEL", "INFO").upper(),
+            log_sink=os.getenv("LOG_SINK", "stdout"),
+            log_queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            log_batch_size=int(os.getenv("LOG_BATCH_SIZE", "200")),
+            log_flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "0.5")),
+
+            admin_token=os.getenv("ADMIN_TOKEN"),
+            profile_sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            profile_dir=os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")),
+            profile_max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+            profile_interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "1")),
+
+            event_watch_mode=os.getenv("EVENT_WATCH_MODE", "auto").lower(),
+            event_poll_interval=float(os.getenv("EVENT_POLL_INTERVAL", "2")),
+            event_queue_size=int(os.getenv("EVENT_QUEUE_SIZE", "100")),
+            event_max_subscribers=int(os.getenv("EVENT_MAX_SUBSCRIBERS", "1000")),
+            event_heartbeat_seconds=float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15")),
+
+            admission_max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "8")),
+            admission_max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "16")),
+            admission_queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5")),
+            ai_rate_limit=float(os.getenv("AI_RATE_LIMIT", "4")),
+            ai_burst=float(os.getenv("AI_BURST", "8")),
+            ai_max_wait=float(os.getenv("AI_MAX_WAIT", "5")),
+
+            ready_cache_seconds=float(os.getenv("READY_CACHE_SECONDS", "5")),
+            ready_timeout=float(os.getenv("READY_TIMEOUT", "2")),
+            ready_required_checks=_list("READY_REQUIRED_CHECKS", "mongo"),
+        )
+
+
+settings = Settings.from_env()
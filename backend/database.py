@@ -0,0 +1,96 @@
+"""
+MongoDB client lifecycle for the API.
+
+The client is created once at startup with the pool, timeout and compression
+settings from config (MONGO_*). Startup pings the server, retrying with
+exponential backoff, and raises if it never answers, so a worker that can't
+reach MongoDB fails to start instead of serving requests against an
+uninitialized Beanie. Shutdown closes the client and its pooled connections.
+"""
+
+import asyncio
+import time
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+
+from config import settings
+from models import PetReport, PetMatch, EmailOutbox
+from structured_log import get_logger
+
+logger = get_logger("database")
+
+DOCUMENT_MODELS = [PetReport, PetMatch, EmailOutbox]
+MAX_RETRY_DELAY = 10.0
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def create_client() -> AsyncIOMotorClient:
+    """A Motor client with the configured pool, timeouts and wire compression"""
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "appname": "petfinder-api",
+    }
+    if settings.mongo_socket_timeout_ms:
+        options["socketTimeoutMS"] = settings.mongo_socket_timeout_ms
+    if settings.mongo_compressors:
+        options["compressors"] = ",".join(settings.mongo_compressors)
+    return AsyncIOMotorClient(settings.mongo_uri, **options)
+
+
+def get_client() -> AsyncIOMotorClient:
+    if _client is None:
+        raise RuntimeError("Database is not initialized")
+    return _client
+
+
+async def ping_database():
+    """One round trip to the server; raises if it doesn't answer"""
+    await get_client().admin.command("ping")
+
+
+async def init_database():
+    """
+    Connect, wait for the server to answer a ping and initialize Beanie.
+    Retries up to MONGO_CONNECT_RETRIES times, then raises.
+    """
+    global _client
+    client = create_client()
+    attempts = settings.mongo_connect_retries + 1
+    for attempt in range(1, attempts + 1):
+        started = time.perf_counter()
+        try:
+            await client.admin.command("ping")
+            break
+        except Exception as e:
+            if attempt == attempts:
+                client.close()
+                logger.error(f"❌ DATABASE ERROR: no answer after {attempts} attempts: {e}")
+                raise RuntimeError(f"Could not connect to MongoDB: {e}") from e
+            delay = min(settings.mongo_retry_backoff * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+            logger.warning(
+                f"⚠️ MongoDB not reachable (attempt {attempt}/{attempts}), retrying in {delay:.1f}s",
+                extra={"fields": {"error": str(e), "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}}
+            )
+            await asyncio.sleep(delay)
+
+    await init_beanie(database=client[settings.mongo_db], document_models=DOCUMENT_MODELS)
+    _client = client
+    logger.info("✅ SUCCESS: Connected to MongoDB Atlas", extra={"fields": {
+        "max_pool_size": settings.mongo_max_pool_size,
+        "min_pool_size": settings.mongo_min_pool_size,
+        "compressors": list(settings.mongo_compressors),
+    }})
+
+
+def close_database():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,18 +1,73 @@
-import os
+"""
+Match notification emails.
+
+send_match_notification only queues a message in the email_outbox collection, so
+no SMTP work happens on the request path. OutboxSender runs in the API process and
+claims due messages in batches, renders them from the precompiled templates in
+email_templates off the event loop, and delivers them over a small pool of
+persistent, authenticated SMTP connections, retrying transient failures with exponential backoff and
+dead-lettering permanent ones.
+
+Notifications for the same recipient are coalesced: a new match is merged into the
+recipient's open message if one is waiting, and a message is only sent once its
+coalescing window has passed. Messages with several matches go out as a digest,
+and each recipient gets at most NOTIFY_MAX_PER_HOUR messages per hour.
+
+For local testing, point it at an SMTP sink, e.g.
+    python -m aiosmtpd -n -l localhost:1025
+with SMTP_SERVER=localhost SMTP_PORT=1025 SMTP_STARTTLS=false EMAIL_FROM=petfinder@localhost
+"""
+
+import random
+import asyncio
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
-from dotenv import load_dotenv
+import time
+from datetime import datetime, timedelta
+from typing import Optional, List
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-load_dotenv()
+from config import settings
+from models import EmailOutbox
+from email_templates import RenderedEmail, load_templates, render_messages_async
+from structured_log import get_logger
+from metrics import EMAIL_NOTIFICATIONS, EMAIL_SEND_SECONDS, EMAIL_BATCH_IN_FLIGHT
+
+logger = get_logger("email_service")
 
 # Email configuration from environment variables
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-EMAIL_FROM = os.getenv("EMAIL_FROM", EMAIL_USERNAME)
+SMTP_SERVER = settings.smtp_server
+SMTP_PORT = settings.smtp_port
+SMTP_STARTTLS = settings.smtp_starttls
+SMTP_TIMEOUT = settings.smtp_timeout
+SMTP_POOL_SIZE = settings.smtp_pool_size
+SMTP_IDLE_TIMEOUT = settings.smtp_idle_timeout  # Servers drop idle connections
+EMAIL_USERNAME = settings.email_username
+EMAIL_PASSWORD = settings.email_password
+EMAIL_FROM = settings.email_from
+
+# Log in only when credentials are set; an explicitly configured server (e.g. a local sink) may not need them
+SMTP_AUTH = bool(EMAIL_USERNAME and EMAIL_PASSWORD)
+EMAIL_ENABLED = bool(EMAIL_FROM) and (SMTP_AUTH or settings.smtp_server_configured)
+
+# Outbox delivery settings
+OUTBOX_POLL_INTERVAL = settings.outbox_poll_interval
+OUTBOX_MAX_ATTEMPTS = settings.outbox_max_attempts
+OUTBOX_RETRY_BASE_SECONDS = settings.outbox_retry_base_seconds
+OUTBOX_RETRY_MAX_SECONDS = settings.outbox_retry_max_seconds
+OUTBOX_LEASE_SECONDS = settings.outbox_lease_seconds
+OUTBOX_BATCH_SIZE = settings.outbox_batch_size  # Messages claimed and rendered together
+
+# Coalescing and per-recipient rate cap
+NOTIFY_COALESCE_SECONDS = settings.notify_coalesce_seconds
+NOTIFY_MAX_PER_HOUR = settings.notify_max_per_hour
+
+NOTIFICATION_EVENTS = ["items_queued", "messages_sent", "messages_saved", "messages_deferred", "messages_dead"]
+
+
+def get_notification_stats() -> dict:
+    """Notification counters for this process; messages_saved counts notifications folded into a digest"""
+    return {event: int(EMAIL_NOTIFICATIONS.value(event=event)) for event in NOTIFICATION_EVENTS}
 
 async def send_match_notification(
     recipient_email: str,
@@ -22,7 +77,7 @@ async def send_match_notification(
     match_details: Optional[dict] = None
 ) -> bool:
     """
-    Send email notification to the owner of a lost pet when a match is found.
+    Queue an email notification to the owner of a lost pet when a match is found.
     
     Args:
         recipient_email: Email of the person who reported the lost pet
@@ -32,89 +87,320 @@ async def send_match_notification(
         match_details: Additional match details (matched tags, location, etc.)
     
     Returns:
-        True if email sent successfully, False otherwise
+        True if the email was queued for delivery, False otherwise
     """
     
     # If email is not configured, log and return False
-    if not EMAIL_USERNAME or not EMAIL_PASSWORD:
-        print("⚠️ Email not configured (EMAIL_USERNAME/EMAIL_PASSWORD missing). Skipping email notification.")
-        print(f"   Would send to: {recipient_email} for pet: {pet_name}")
+    if not EMAIL_ENABLED:
+        logger.warning("⚠️ Email not configured (EMAIL_USERNAME/EMAIL_PASSWORD missing). Skipping email notification.",
+                       extra={"fields": {"recipient": recipient_email, "pet_name": pet_name}})
         return False
     
+    item = {
+        "pet_name": pet_name,
+        "found_pet_image_url": found_pet_image_url,
+        "match_details": match_details or {}
+    }
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🎉 Potential Match Found for {pet_name}!"
-        msg['From'] = EMAIL_FROM
-        msg['To'] = recipient_email
-        
-        # Build email body
-        matched_tags = match_details.get('matched_tags', []) if match_details else []
-        tags_text = ', '.join(matched_tags) if matched_tags else "multiple characteristics"
-        
-        # HTML email body
-        html_body = f"""
-        <html>
-          <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-              <h2 style="color: #4CAF50;">🎉 Great News, {recipient_name}!</h2>
-              
-              <p>We found a potential match for <strong>{pet_name}</strong>!</p>
-              
-              <div style="background-color: #f0f8ff; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                <h3 style="margin-top: 0;">Match Details:</h3>
-                <ul style="margin: 10px 0;">
-                  <li><strong>Matched characteristics:</strong> {tags_text}</li>
-                  {f"<li><strong>Found location:</strong> {match_details.get('location', 'N/A')}</li>" if match_details and match_details.get('location') else ""}
-                </ul>
-              </div>
-              
-              {f'<p><a href="{found_pet_image_url}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 10px 0;">View Found Pet Images</a></p>' if found_pet_image_url else ""}
-              
-              <p>Please log in to your PetFinder account to review the match and contact the finder.</p>
-              
-              <p style="margin-top: 30px; font-size: 12px; color: #666;">
-                Best regards,<br>
-                The PetFinder Team
-              </p>
-            </div>
-          </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_body = f"""
-        Great News, {recipient_name}!
-        
-        We found a potential match for {pet_name}!
-        
-        Match Details:
-        - Matched characteristics: {tags_text}
-        {f"- Found location: {match_details.get('location', 'N/A')}" if match_details and match_details.get('location') else ""}
-        
-        {f"View found pet images: {found_pet_image_url}" if found_pet_image_url else ""}
-        
-        Please log in to your PetFinder account to review the match and contact the finder.
-        
-        Best regards,
-        The PetFinder Team
-        """
-        
-        # Attach parts
-        msg.attach(MIMEText(text_body, 'plain'))
-        msg.attach(MIMEText(html_body, 'html'))
-        
-        # Send email using SMTP
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+        now = datetime.utcnow()
+        # Merge into the recipient's open message, or open a new one that waits out the coalescing window
+        for attempt in range(2):
+            try:
+                await EmailOutbox.get_motor_collection().update_one(
+                    {"recipient_email": recipient_email, "status": "pending", "attempts": 0},
+                    {
+                        "$push": {"items": item},
+                        "$set": {"recipient_name": recipient_name, "updated_at": now},
+                        "$setOnInsert": {
+                            "next_attempt_at": now + timedelta(seconds=NOTIFY_COALESCE_SECONDS),
+                            "locked_until": None,
+                            "last_error": None,
+                            "sent_at": None,
+                            "created_at": now
+                        }
+                    },
+                    upsert=True
+                )
+                break
+            except DuplicateKeyError:
+                # A concurrent request opened the message first; the retry merges into it
+                if attempt == 1:
+                    raise
+        EMAIL_NOTIFICATIONS.inc(event="items_queued")
+        if NOTIFY_COALESCE_SECONDS <= 0:
+            outbox_sender.wake()
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to queue email notification: {str(e)}")
+        return False
+
+
+def _is_permanent_failure(error: Exception) -> bool:
+    """5xx replies mean retrying the same message will not help; bad credentials are a config problem worth retrying"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SMTPConnectionPool:
+    """
+    Pool of persistent SMTP connections. smtplib is blocking, so connects and
+    sends run in worker threads; each connection is used by one sender at a time.
+    """
+
+    def __init__(self, size: int):
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []  # (connection, last_used)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
             server.starttls()
+        if SMTP_AUTH:
             server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    async def _checkout(self) -> Optional[smtplib.SMTP]:
+        while self._idle:
+            server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < SMTP_IDLE_TIMEOUT:
+                return server
+            # QUIT is a network round trip; keep it off the event loop
+            await asyncio.to_thread(self._close, server)
+        return None
+
+    @staticmethod
+    def _send_blocking(server: smtplib.SMTP, email: RenderedEmail):
+        server.sendmail(EMAIL_FROM, [email.recipient_email], email.raw)
+
+    async def send(self, email: RenderedEmail):
+        async with self._slots:
+            with EMAIL_SEND_SECONDS.time():
+                server = await self._checkout()
+                reused = server is not None
+                try:
+                    if server is None:
+                        server = await asyncio.to_thread(self._connect)
+                    try:
+                        await asyncio.to_thread(self._send_blocking, server, email)
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        if not reused:
+                            raise
+                        # The server dropped a pooled connection; retry once on a fresh one
+                        await asyncio.to_thread(self._close, server)
+                        server = await asyncio.to_thread(self._connect)
+                        await asyncio.to_thread(self._send_blocking, server, email)
+                except Exception:
+                    if server is not None:
+                        await asyncio.to_thread(self._close, server)
+                    raise
+                self._idle.append((server, time.monotonic()))
+
+    async def warm(self):
+        """Open one connection ahead of the first send"""
+        if self._idle:
+            return
+        server = await asyncio.to_thread(self._connect)
+        self._idle.append((server, time.monotonic()))
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for server, _ in idle:
+            await asyncio.to_thread(self._close, server)
+
+
+class OutboxSender:
+    """Background task that delivers queued notifications from the email_outbox collection"""
+
+    def __init__(self, concurrency: int = SMTP_POOL_SIZE):
+        self.concurrency = concurrency
+        self._pool: Optional[SMTPConnectionPool] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if not EMAIL_ENABLED:
+            logger.warning("⚠️ Email not configured. Outbox sender not started.")
+            return
+        load_templates()
+        if self._pool is None:
+            self._pool = SMTPConnectionPool(self.concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✅ Outbox sender started ({self.concurrency} SMTP connections)")
+
+    async def warm(self):
+        """Compile the templates and open an SMTP connection ahead of start(), so the first batch doesn't wait on them"""
+        if not EMAIL_ENABLED:
+            return
+        try:
+            await asyncio.to_thread(load_templates)
+            if self._pool is None:
+                self._pool = SMTPConnectionPool(self.concurrency)
+            await self._pool.warm()
+            logger.info("✅ SMTP connection warmed")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not warm SMTP connection: {str(e)}")
+
+    def wake(self):
+        """Deliver newly queued messages now instead of at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pool is not None:
+            await self._pool.close()
+
+    async def _claim(self) -> Optional[dict]:
+        """Lease the next due message. Messages stuck in 'sending' past their lease are picked up again."""
+        now = datetime.utcnow()
+        return await EmailOutbox.get_motor_collection().find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lte": now}}
+            ]},
+            {"$set": {
+                "status": "sending",
+                "locked_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                "updated_at": now
+            }},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _defer_if_rate_limited(self, message: dict) -> bool:
+        """
+        Push a message back if its recipient already hit the hourly cap. It stays open
+        (attempts unchanged), so matches arriving meanwhile are folded into it.
+        """
+        if NOTIFY_MAX_PER_HOUR <= 0:
+            return False
+        outbox = EmailOutbox.get_motor_collection()
+        window_start = datetime.utcnow() - timedelta(hours=1)
+        recent = outbox.find(
+            {"recipient_email": message["recipient_email"], "status": "sent", "sent_at": {"$gte": window_start}},
+            {"sent_at": 1},
+            sort=[("sent_at", 1)],
+            limit=NOTIFY_MAX_PER_HOUR
+        )
+        sent_times = [doc["sent_at"] async for doc in recent]
+        if len(sent_times) < NOTIFY_MAX_PER_HOUR:
+            return False
         
-        print(f"✅ Match notification email sent to {recipient_email} for {pet_name}")
+        next_slot = sent_times[0] + timedelta(hours=1)
+        try:
+            await outbox.update_one(
+                {"_id": message["_id"]},
+                {"$set": {"status": "pending", "next_attempt_at": next_slot, "locked_until": None, "updated_at": datetime.utcnow()}}
+            )
+        except DuplicateKeyError:
+            # A newer open message exists for this recipient; fold this one into it
+            await outbox.update_one(
+                {"recipient_email": message["recipient_email"], "status": "pending", "attempts": 0},
+                {"$push": {"items": {"$each": message["items"]}},
+                 "$max": {"next_attempt_at": next_slot},
+                 "$set": {"updated_at": datetime.utcnow()}}
+            )
+            await outbox.delete_one({"_id": message["_id"]})
+        EMAIL_NOTIFICATIONS.inc(event="messages_deferred")
+        logger.info("⏳ Rate cap reached, deferring notification",
+                    extra={"fields": {"recipient": message["recipient_email"], "until": next_slot.isoformat()}})
         return True
+
+    async def _claim_batch(self) -> List[dict]:
+        """Lease up to OUTBOX_BATCH_SIZE due messages, leaving out any deferred by the rate cap"""
+        batch = []
+        while len(batch) < OUTBOX_BATCH_SIZE:
+            message = await self._claim()
+            if message is None:
+                break
+            if not await self._defer_if_rate_limited(message):
+                batch.append(message)
+        return batch
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                batch = await self._claim_batch()
+                if not batch:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                EMAIL_BATCH_IN_FLIGHT.set(len(batch))
+                try:
+                    rendered = await render_messages_async(batch, EMAIL_FROM)
+                    # The pool bounds how many of these are actually on the wire at once
+                    await asyncio.gather(*[
+                        self._deliver(message, email) for message, email in zip(batch, rendered)
+                    ])
+                finally:
+                    EMAIL_BATCH_IN_FLIGHT.set(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"⚠️ Outbox sender error: {str(e)}", exc_info=True)
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _deliver(self, message: dict, email):
+        outbox = EmailOutbox.get_motor_collection()
+        if isinstance(email, Exception):
+            # Rendering is deterministic, so retrying would fail the same way
+            await self._record_failure(message, email, permanent=True)
+            return
+        try:
+            await self._pool.send(email)
+        except Exception as e:
+            await self._record_failure(message, e)
+            return
         
-    except Exception as e:
-        print(f"❌ Failed to send email notification: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
+        now = datetime.utcnow()
+        await outbox.update_one(
+            {"_id": message["_id"]},
+            {"$set": {"status": "sent", "sent_at": now, "locked_until": None, "updated_at": now},
+             "$inc": {"attempts": 1}}
+        )
+        item_count = len(message["items"])
+        EMAIL_NOTIFICATIONS.inc(event="messages_sent")
+        EMAIL_NOTIFICATIONS.inc(item_count - 1, event="messages_saved")
+        logger.info("✅ Digest sent" if item_count > 1 else "✅ Match notification email sent",
+                    extra={"fields": {"recipient": message["recipient_email"], "items": item_count}})
+
+    async def _record_failure(self, message: dict, error: Exception, permanent: bool = False):
+        attempts = message.get("attempts", 0) + 1
+        now = datetime.utcnow()
+        update = {"attempts": attempts, "last_error": f"{type(error).__name__}: {str(error)[:300]}",
+                  "locked_until": None, "updated_at": now}
+        if permanent or _is_permanent_failure(error) or attempts >= OUTBOX_MAX_ATTEMPTS:
+            update["status"] = "dead"
+            EMAIL_NOTIFICATIONS.inc(event="messages_dead")
+            logger.error(f"❌ Giving up on email after {attempts} attempt(s): {str(error)}",
+                         extra={"fields": {"recipient": message["recipient_email"]}})
+        else:
+            # Exponential backoff with jitter
+            delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            update["status"] = "pending"
+            update["next_attempt_at"] = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+            logger.warning(f"⚠️ Email failed (attempt {attempts}), retrying in {delay:.0f}s: {str(error)}",
+                           extra={"fields": {"recipient": message["recipient_email"]}})
+        await EmailOutbox.get_motor_collection().update_one({"_id": message["_id"]}, {"$set": update})
+
+
+outbox_sender = OutboxSender()
@@ -0,0 +1,104 @@
+"""
+Templates for match notification emails.
+
+The match and digest templates are loaded and compiled once, with autoescaping
+for the HTML parts so user-supplied names and locations cannot inject markup.
+Rendering and MIME encoding run in a worker thread, a batch at a time, so the
+event loop never builds message bodies.
+"""
+
+import os
+import asyncio
+from email.header import Header
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import List, NamedTuple, Optional, Union
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "email")
+TEMPLATE_NAMES = ["match.html", "match.txt", "digest.html", "digest.txt"]
+DIGEST_MAX_ITEMS = 20  # Further matches are summarized as "and N more"
+
+_templates = {}
+
+
+class RenderedEmail(NamedTuple):
+    recipient_email: str
+    raw: bytes  # Fully encoded message, ready for SMTP DATA
+
+
+def load_templates():
+    """Load and compile all email templates. Called once at startup; later calls are no-ops."""
+    if _templates:
+        return
+    # Imported here so the API doesn't pay for jinja2 at import when email is off
+    from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(["html"]),
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    for name in TEMPLATE_NAMES:
+        _templates[name] = environment.get_template(name)
+
+
+def _single_line(value: str) -> str:
+    """Header values must not contain line breaks"""
+    return " ".join(str(value).split())
+
+
+def _item_context(item: dict) -> dict:
+    match_details = item.get("match_details") or {}
+    matched_tags = match_details.get("matched_tags") or []
+    return {
+        "pet_name": item.get("pet_name") or "your pet",
+        "tags_text": ", ".join(matched_tags) if matched_tags else "multiple characteristics",
+        "location": match_details.get("location"),
+        "image_url": item.get("found_pet_image_url"),
+    }
+
+
+def render_message(message: dict, sender: str) -> RenderedEmail:
+    """Render one outbox message (a single match or a digest) into an encoded email"""
+    load_templates()
+    items = [_item_context(item) for item in message["items"]]
+    context = {"recipient_name": message["recipient_name"]}
+
+    if len(items) == 1:
+        context["item"] = items[0]
+        subject = f"🎉 Potential Match Found for {items[0]['pet_name']}!"
+        prefix = "match"
+    else:
+        context.update({
+            "items": items[:DIGEST_MAX_ITEMS],
+            "total": len(items),
+            "remaining": max(0, len(items) - DIGEST_MAX_ITEMS),
+        })
+        subject = f"🎉 {len(items)} Potential Matches Found for Your Lost Pets!"
+        prefix = "digest"
+
+    # The compat32 MIME classes encode about twice as fast as email.message.EmailMessage
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = Header(_single_line(subject), "utf-8")
+    msg["From"] = sender
+    msg["To"] = _single_line(message["recipient_email"])
+    msg.attach(MIMEText(_templates[f"{prefix}.txt"].render(context), "plain", "utf-8"))
+    msg.attach(MIMEText(_templates[f"{prefix}.html"].render(context), "html", "utf-8"))
+    return RenderedEmail(message["recipient_email"], msg.as_bytes())
+
+
+def render_messages(messages: List[dict], sender: str) -> List[Union[RenderedEmail, Exception]]:
+    """Render a batch of outbox messages. A message that fails to render yields its exception."""
+    rendered = []
+    for message in messages:
+        try:
+            rendered.append(render_message(message, sender))
+        except Exception as e:
+            rendered.append(e)
+    return rendered
+
+
+async def render_messages_async(messages: List[dict], sender: Optional[str]) -> List[Union[RenderedEmail, Exception]]:
+    """Render a batch of outbox messages in a worker thread"""
+    return await asyncio.to_thread(render_messages, messages, sender)
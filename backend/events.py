@@ -0,0 +1,337 @@
+"""
+Live match and report events, pushed to clients over server-sent events (/api/stream).
+
+One ChangeWatcher per worker follows pet_matches and pet_reports and publishes:
+
+    new_match        a PetMatch was created
+    match_decision   a match's status changed (accepted, rejected, superseded)
+    report_status    a report's status changed (e.g. marked found)
+
+It reads a MongoDB change stream, resuming from its last token after transient
+errors. On a standalone server, where change streams don't exist, it polls
+updated_at every EVENT_POLL_INTERVAL seconds instead (only while someone is
+subscribed), looking back a few seconds to allow for clock skew between workers.
+
+EventBroker fans events out to subscribers, each with its own bounded queue, so
+a slow client never holds up the others or grows memory. A subscriber whose
+queue fills has its backlog replaced by a single resync event, which tells the
+client to refetch over the REST API. Reconnecting clients (Last-Event-ID) get a
+resync too, since events aren't replayed.
+"""
+
+import json
+import asyncio
+from datetime import datetime, timedelta
+from typing import AsyncIterator, FrozenSet, NamedTuple, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config import settings
+from models import PetMatch, PetReport
+from metrics import EVENT_SUBSCRIBERS, EVENTS_PUBLISHED, EVENT_OVERFLOWS
+from structured_log import get_logger
+
+logger = get_logger("events")
+
+EVENT_WATCH_MODE = settings.event_watch_mode
+EVENT_POLL_INTERVAL = settings.event_poll_interval
+EVENT_QUEUE_SIZE = settings.event_queue_size
+EVENT_MAX_SUBSCRIBERS = settings.event_max_subscribers
+EVENT_HEARTBEAT_SECONDS = settings.event_heartbeat_seconds
+
+EVENT_TYPES = ("new_match", "match_decision", "report_status")
+RESYNC = "resync"  # Always delivered, whatever a subscriber filters on
+RECONNECT_MS = 3000
+POLL_LOOKBACK = timedelta(seconds=5)
+POLL_BATCH_LIMIT = 1000
+WATCH_RETRY_MAX_SECONDS = 30.0
+WATCH_RESTART_SECONDS = 5.0
+
+# Server error codes: change streams need a replica set; resume point no longer in the oplog
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = {280, 286}
+
+MATCH_EVENT_PROJECTION = {
+    "lost_report_id": 1, "found_report_id": 1, "match_score": 1, "matched_tags": 1,
+    "status": 1, "created_at": 1, "updated_at": 1, "decision_made_at": 1,
+}
+REPORT_EVENT_PROJECTION = {"status": 1, "created_at": 1, "updated_at": 1}
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    data: dict
+
+
+def format_sse(event: Event) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, separators=(',', ':'))}\n\n"
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else None
+
+
+def new_match_event(doc: dict) -> dict:
+    return {
+        "match_id": str(doc["_id"]),
+        "lost_report_id": str(doc.get("lost_report_id")),
+        "found_report_id": str(doc.get("found_report_id")),
+        "match_score": doc.get("match_score"),
+        "matched_tags": doc.get("matched_tags", []),
+        "status": doc.get("status"),
+        "created_at": _iso(doc.get("created_at")),
+    }
+
+
+def match_decision_event(match_id, status: str, decided_at) -> dict:
+    return {"match_id": str(match_id), "status": status, "decided_at": _iso(decided_at)}
+
+
+def report_status_event(report_id, status: str) -> dict:
+    return {"report_id": str(report_id), "status": status}
+
+
+class Subscription:
+    def __init__(self, types: FrozenSet[str]):
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def wants(self, event_type: str) -> bool:
+        return event_type == RESYNC or not self.types or event_type in self.types
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        """The next event, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Fans published events out to subscribers' bounded queues"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._last_id = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def is_full(self) -> bool:
+        return len(self._subscribers) >= EVENT_MAX_SUBSCRIBERS
+
+    def subscribe(self, types: FrozenSet[str] = frozenset()) -> Subscription:
+        subscription = Subscription(types)
+        self._subscribers.add(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def make_event(self, event_type: str, data: dict) -> Event:
+        self._last_id += 1
+        return Event(self._last_id, event_type, data)
+
+    def publish(self, event_type: str, data: dict):
+        event = self.make_event(event_type, data)
+        EVENTS_PUBLISHED.inc(event=event_type)
+        for subscription in self._subscribers:
+            if not subscription.wants(event_type):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client this far behind has lost events anyway; one resync replaces its backlog
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(self.make_event(RESYNC, {"reason": "overflow"}))
+                EVENT_OVERFLOWS.inc()
+
+
+async def stream_events(broker: EventBroker, types: FrozenSet[str], resumed: bool) -> AsyncIterator[str]:
+    """SSE body for one client: events as they're published, with comment heartbeats to keep proxies from timing out"""
+    subscription = broker.subscribe(types)
+    try:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        if resumed:
+            yield format_sse(broker.make_event(RESYNC, {"reason": "reconnected"}))
+        while True:
+            event = await subscription.next(EVENT_HEARTBEAT_SECONDS)
+            yield ": keepalive\n\n" if event is None else format_sse(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class ChangeWatcher:
+    """Background task that turns database changes into broker events"""
+
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+        self.mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        # Nothing may end the watcher quietly: a failure is logged and it starts over
+        while True:
+            try:
+                await self._follow()
+            except Exception as e:
+                logger.error(f"❌ Event watcher failed, restarting: {str(e)}", exc_info=True)
+                await asyncio.sleep(WATCH_RESTART_SECONDS)
+                # Changes made while it was down won't be replayed
+                self.broker.publish(RESYNC, {"reason": "watcher_restarted"})
+
+    async def _follow(self):
+        if EVENT_WATCH_MODE != "poll":
+            try:
+                await self._watch()
+                return
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAMS_UNSUPPORTED or EVENT_WATCH_MODE == "change_stream":
+                    raise
+                logger.info("ℹ️ MongoDB change streams unavailable (standalone server), polling for events instead")
+        await self._poll()
+
+    def _handle_change(self, change: dict):
+        collection = change["ns"]["coll"]
+        document_id = change["documentKey"]["_id"]
+        if change["operationType"] == "insert":
+            self.broker.publish("new_match", new_match_event(change["fullDocument"]))
+            return
+        fields = change["updateDescription"]["updatedFields"]
+        if collection == PetMatch.Settings.name:
+            decided_at = fields.get("decision_made_at") or fields.get("updated_at")
+            self.broker.publish("match_decision", match_decision_event(document_id, fields["status"], decided_at))
+        else:
+            self.broker.publish("report_status", report_status_event(document_id, fields["status"]))
+
+    async def _watch(self):
+        database = PetMatch.get_motor_collection().database
+        matches, reports = PetMatch.Settings.name, PetReport.Settings.name
+        # Only match inserts and status changes; everything else is filtered out on the server
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": matches, "operationType": "insert"},
+            {
+                "ns.coll": {"$in": [matches, reports]},
+                "operationType": "update",
+                "updateDescription.updatedFields.status": {"$exists": True},
+            },
+        ]}}]
+        resume_token = None
+        failures = 0
+        while True:
+            try:
+                async with database.watch(pipeline, resume_after=resume_token) as stream:
+                    if self.mode != "change_stream":
+                        self.mode = "change_stream"
+                        logger.info("✅ Watching MongoDB change streams for events")
+                    failures = 0
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        try:
+                            self._handle_change(change)
+                        except Exception as e:
+                            # One malformed change shouldn't stop the stream; it is skipped
+                            logger.error(f"❌ Could not publish change event: {str(e)}", exc_info=True)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    raise
+                if e.code in CHANGE_STREAM_HISTORY_LOST:
+                    # Changes were missed; start over from now and have clients refetch
+                    resume_token = None
+                    self.broker.publish(RESYNC, {"reason": "history_lost"})
+                failures += 1
+                logger.warning(f"⚠️ Change stream error, reopening: {str(e)}")
+            except PyMongoError as e:
+                failures += 1
+                logger.warning(f"⚠️ Change stream interrupted, resuming: {str(e)}")
+            await asyncio.sleep(min(WATCH_RETRY_MAX_SECONDS, 0.5 * 2 ** min(failures, 6)))
+
+    def _publish_polled_match(self, doc: dict, seen: dict, since: datetime):
+        key = ("match", doc["_id"])
+        previous = seen.get(key)
+        status = doc.get("status")
+        seen[key] = (doc["updated_at"], status)
+        if previous is None and doc.get("created_at") and doc["created_at"] > since:
+            self.broker.publish("new_match", new_match_event(doc))
+            return
+        # Seen before: only a status change counts. First seen but older: it changed at some
+        # point in the window, which is a decision only if it is no longer pending.
+        changed = previous[1] != status if previous is not None else status != "pending"
+        if changed:
+            decided_at = doc.get("decision_made_at") or doc.get("updated_at")
+            self.broker.publish("match_decision", match_decision_event(doc["_id"], status, decided_at))
+
+    def _publish_polled_report(self, doc: dict, seen: dict, since: datetime):
+        key = ("report", doc["_id"])
+        previous = seen.get(key)
+        status = doc.get("status")
+        seen[key] = (doc["updated_at"], status)
+        if previous is None and doc.get("created_at") and doc["created_at"] > since:
+            return  # Just created, not changed
+        changed = previous[1] != status if previous is not None else status != "active"
+        if changed:
+            self.broker.publish("report_status", report_status_event(doc["_id"], status))
+
+    async def _poll(self):
+        self.mode = "poll"
+        matches = PetMatch.get_motor_collection()
+        reports = PetReport.get_motor_collection()
+        cursor = datetime.utcnow()
+        # (collection, _id) -> (updated_at, status) for documents seen inside the lookback window
+        seen = {}
+        while True:
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            now = datetime.utcnow()
+            if not self.broker.subscriber_count:
+                cursor = now
+                seen.clear()
+                continue
+            since = cursor - POLL_LOOKBACK
+            try:
+                match_docs = await matches.find(
+                    {"updated_at": {"$gt": since}}, MATCH_EVENT_PROJECTION
+                ).sort("updated_at", 1).to_list(length=POLL_BATCH_LIMIT)
+                report_docs = await reports.find(
+                    {"updated_at": {"$gt": since}}, REPORT_EVENT_PROJECTION
+                ).sort("updated_at", 1).to_list(length=POLL_BATCH_LIMIT)
+            except PyMongoError as e:
+                logger.warning(f"⚠️ Event poll failed: {str(e)}")
+                continue
+
+            for doc in match_docs:
+                try:
+                    self._publish_polled_match(doc, seen, since)
+                except Exception as e:
+                    logger.error(f"❌ Could not publish match event: {str(e)}", exc_info=True)
+            for doc in report_docs:
+                try:
+                    self._publish_polled_report(doc, seen, since)
+                except Exception as e:
+                    logger.error(f"❌ Could not publish report event: {str(e)}", exc_info=True)
+
+            if len(match_docs) >= POLL_BATCH_LIMIT or len(report_docs) >= POLL_BATCH_LIMIT:
+                # Too many changes to replay one by one; skip ahead and have clients refetch
+                self.broker.publish(RESYNC, {"reason": "backlog"})
+                seen.clear()
+                cursor = now
+                continue
+            cursor = now
+            seen = {key: value for key, value in seen.items() if value[0] > cursor - POLL_LOOKBACK}
+
+
+event_broker = EventBroker()
+change_watcher = ChangeWatcher(event_broker)
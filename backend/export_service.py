@@ -0,0 +1,210 @@
+"""
+Streaming bulk export of pet reports and matches as NDJSON or CSV.
+
+Documents are read from a Motor cursor in batches and written out as they
+arrive, so memory use stays constant regardless of collection size.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, List, Optional
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+REPORT_EXPORT_PROJECTION = {
+    "user_id": 1,
+    "report_type": 1,
+    "pet_name": 1,
+    "pet_type": 1,
+    "user_info": 1,
+    "image_urls": 1,
+    "tags": 1,
+    "description": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+REPORT_CSV_COLUMNS = [
+    "report_id", "report_type", "pet_name", "pet_type",
+    "species", "breed", "primary_color", "age_group", "size", "marks",
+    "contact_name", "contact_email", "contact_phone", "location",
+    "description", "status", "image_urls", "created_at", "updated_at",
+]
+
+MATCH_EXPORT_PROJECTION = {
+    "lost_report_id": 1,
+    "found_report_id": 1,
+    "match_score": 1,
+    "matched_tags": 1,
+    "status": 1,
+    "decision_made_by": 1,
+    "decision_made_at": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+MATCH_CSV_COLUMNS = [
+    "match_id", "lost_report_id", "found_report_id", "match_score", "matched_tags",
+    "status", "decision_made_by", "decision_made_at", "created_at", "updated_at",
+]
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def build_export_query(filters: dict, updated_since: Optional[datetime] = None, after_id=None) -> dict:
+    """
+    Build the Mongo filter for an export. Stored timestamps are naive UTC.
+
+    updated_since is inclusive, since several documents can share one timestamp.
+    To resume after the last row received, pass its updated_at and _id (after_id);
+    rows at that exact timestamp are then continued in _id order, matching export_sort.
+    """
+    query = {name: value for name, value in filters.items() if value}
+    if updated_since:
+        if updated_since.tzinfo is not None:
+            updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+        if after_id is None:
+            query["updated_at"] = {"$gte": updated_since}
+        else:
+            query["$or"] = [
+                {"updated_at": {"$gt": updated_since}},
+                {"updated_at": updated_since, "_id": {"$gt": after_id}},
+            ]
+    return query
+
+
+def export_sort(incremental: bool) -> list:
+    """Incremental exports are ordered by updated_at so a sync can resume from the last row it saw"""
+    if incremental:
+        return [("updated_at", 1), ("_id", 1)]
+    return [("_id", 1)]
+
+
+def report_record(doc: dict) -> dict:
+    """Convert a raw pet_reports document into an export record"""
+    tags = doc.get("tags") or {}
+    user_info = doc.get("user_info") or {}
+    return {
+        "report_id": str(doc["_id"]),
+        "report_type": doc.get("report_type"),
+        "pet_name": doc.get("pet_name"),
+        "pet_type": doc.get("pet_type"),
+        "tags": {
+            "species": tags.get("species"),
+            "breed": tags.get("breed"),
+            "primary_color": tags.get("primary_color"),
+            "age_group": tags.get("age_group"),
+            "size": tags.get("size"),
+            "marks": tags.get("marks") or []
+        },
+        "user_info": {
+            "name": user_info.get("name"),
+            "email": user_info.get("email"),
+            "phone": user_info.get("phone"),
+            "location": user_info.get("location")
+        },
+        "image_urls": doc.get("image_urls") or [],
+        "description": doc.get("description"),
+        "status": doc.get("status"),
+        "created_at": _isoformat(doc.get("created_at")),
+        "updated_at": _isoformat(doc.get("updated_at"))
+    }
+
+
+def report_csv_row(record: dict) -> dict:
+    """Flatten an export record into a CSV row"""
+    tags = record["tags"]
+    user_info = record["user_info"]
+    return {
+        "report_id": record["report_id"],
+        "report_type": record["report_type"],
+        "pet_name": record["pet_name"],
+        "pet_type": record["pet_type"],
+        "species": tags["species"],
+        "breed": tags["breed"],
+        "primary_color": tags["primary_color"],
+        "age_group": tags["age_group"],
+        "size": tags["size"],
+        "marks": ";".join(tags["marks"]),
+        "contact_name": user_info["name"],
+        "contact_email": user_info["email"],
+        "contact_phone": user_info["phone"],
+        "location": user_info["location"],
+        "description": record["description"],
+        "status": record["status"],
+        "image_urls": " ".join(record["image_urls"]),
+        "created_at": record["created_at"],
+        "updated_at": record["updated_at"]
+    }
+
+
+def match_record(doc: dict) -> dict:
+    """Convert a raw pet_matches document into an export record"""
+    return {
+        "match_id": str(doc["_id"]),
+        "lost_report_id": str(doc.get("lost_report_id")),
+        "found_report_id": str(doc.get("found_report_id")),
+        "match_score": doc.get("match_score"),
+        "matched_tags": doc.get("matched_tags") or [],
+        "status": doc.get("status"),
+        "decision_made_by": doc.get("decision_made_by"),
+        "decision_made_at": _isoformat(doc.get("decision_made_at")),
+        "created_at": _isoformat(doc.get("created_at")),
+        "updated_at": _isoformat(doc.get("updated_at"))
+    }
+
+
+def match_csv_row(record: dict) -> dict:
+    """Flatten an export record into a CSV row"""
+    return {**record, "matched_tags": ";".join(record["matched_tags"])}
+
+
+async def stream_export(
+    collection,
+    query: dict,
+    projection: dict,
+    sort: list,
+    batch_size: int,
+    fmt: str,
+    to_record: Callable[[dict], dict],
+    to_csv_row: Callable[[dict], dict],
+    csv_columns: List[str]
+) -> AsyncIterator[str]:
+    """
+    Stream documents matching query as NDJSON lines or CSV rows.
+    Output is flushed once per cursor batch, so at most one batch is held in memory.
+    """
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=csv_columns, extrasaction="ignore")
+        writer.writeheader()
+
+    pending = 0
+    cursor = collection.find(query, projection, sort=sort, batch_size=batch_size)
+    async for doc in cursor:
+        record = to_record(doc)
+        if writer:
+            writer.writerow(to_csv_row(record))
+        else:
+            buffer.write(json.dumps(record))
+            buffer.write("\n")
+        pending += 1
+
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining
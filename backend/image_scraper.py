@@ -1,17 +1,24 @@
 #!/usr/bin/env python3
 """
-Web scraper to download pet images and upload them directly to S3.
-Scrapes 10 pet images from Unsplash (free stock photos).
+Web scraper to download pet images and upload them directly to image storage (S3, or local disk).
+Scrapes pet images from a list of URLs (by default a handful of free Unsplash stock photos).
+
+All downloads share one pooled HTTP client, run with bounded concurrency, and stream
+straight into storage without buffering whole bodies. Duplicate source URLs are fetched
+once, and images whose content matches one already uploaded in this run are removed
+(local storage is content-addressed, so there they share one file to begin with).
+
+Usage:
+    python image_scraper.py --urls-file pet_urls.txt --concurrency 8
+    python image_scraper.py --url https://example.com/dog.jpg --url https://example.com/cat.jpg
 """
 
-import os
 import asyncio
+import argparse
 import httpx
-from dotenv import load_dotenv
 from uuid import uuid4
-from s3_config import upload_to_s3
+from storage import get_storage
 
-load_dotenv()
 
 # Unsplash API endpoint for pet images (using their source API)
 UNSPLASH_PET_IMAGES = [
@@ -27,74 +34,94 @@ UNSPLASH_PET_IMAGES = [
     "https://images.unsplash.com/photo-1517849845537-4d58f9986e42?w=800&h=800&fit=crop",  # Cat
 ]
 
-async def download_image(url: str, index: int) -> tuple[bytes, str]:
-    """Download an image from URL and return bytes and filename"""
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            
-            # Determine file extension from content type or default to jpg
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            ext = 'jpg'
-            if 'png' in content_type:
-                ext = 'png'
-            elif 'webp' in content_type:
-                ext = 'webp'
-            
-            filename = f"scraped_pet_{index + 1}.{ext}"
-            return response.content, filename
-    except Exception as e:
-        print(f"❌ Error downloading image {index + 1}: {str(e)}")
-        raise
+def load_source_urls(urls_file: str = None, urls: list[str] = None) -> list[str]:
+    """
+    Collect source URLs from a file (one per line, '#' comments allowed) and/or a list,
+    falling back to the built-in Unsplash list. Duplicates are dropped, keeping order.
+    """
+    sources = []
+    if urls_file:
+        with open(urls_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    sources.append(line)
+    if urls:
+        sources.extend(urls)
+    if not sources:
+        sources = UNSPLASH_PET_IMAGES
+    return list(dict.fromkeys(sources))
 
-async def scrape_and_upload_images(num_images: int = 10):
-    """Scrape pet images and upload them directly to S3"""
-    bucket_name = os.getenv("S3_BUCKET_NAME")
+def _extension_for(content_type: str) -> str:
+    """Determine file extension from content type or default to jpg"""
+    if 'png' in content_type:
+        return 'png'
+    if 'webp' in content_type:
+        return 'webp'
+    return 'jpg'
+
+async def scrape_image(
+    client: httpx.AsyncClient,
+    url: str,
+    index: int,
+    storage,
+    seen_hashes: dict
+) -> str:
+    """
+    Stream one image from its source into storage. Returns its URL, or the URL of the
+    earlier upload if this image's content is a duplicate.
+    """
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        content_type = response.headers.get('content-type', 'image/jpeg')
+        filename = f"scraped_pet_{index + 1}.{_extension_for(content_type)}"
+        object_key = f"scraped-images/{uuid4()}/{filename}"
+        stored = await storage.put_stream(response.aiter_bytes(), object_key, content_type)
     
-    if not bucket_name:
-        print("❌ S3_BUCKET_NAME not set in environment variables")
-        return
+    # Same bytes already uploaded from another URL: keep only the first copy
+    earlier = seen_hashes.get(stored.sha256)
+    if earlier is not None:
+        if earlier.key != stored.key:
+            await storage.delete(stored.key)
+        print(f"   ♻️  Image {index + 1}: duplicate content of {earlier.url}")
+        return earlier.url
     
-    print(f"🕷️  Starting web scraper to download {num_images} pet images...")
-    print(f"📦 Target S3 bucket: {bucket_name}\n")
+    seen_hashes[stored.sha256] = stored
+    print(f"   ✅ Image {index + 1}: {filename} ({stored.size} bytes) → {stored.url}")
+    return stored.url
+
+async def scrape_and_upload_images(num_images: int = 10, source_urls: list[str] = None, concurrency: int = 8):
+    """Scrape pet images and upload them directly to storage"""
+    try:
+        storage = get_storage()
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return
     
-    uploaded_urls = []
+    source_urls = (source_urls or load_source_urls())[:num_images]
     
-    # Process images concurrently
-    tasks = []
-    for i in range(min(num_images, len(UNSPLASH_PET_IMAGES))):
-        tasks.append(download_image(UNSPLASH_PET_IMAGES[i], i))
+    print(f"🕷️  Starting web scraper to download {len(source_urls)} pet images...")
+    print(f"📦 Target: {storage.name} storage\n")
     
-    # Download all images
-    print("📥 Downloading images...")
-    download_results = await asyncio.gather(*tasks, return_exceptions=True)
+    seen_hashes = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
     
-    # Upload each image to S3
-    print("\n☁️  Uploading images to S3...")
-    for i, result in enumerate(download_results):
-        if isinstance(result, Exception):
-            print(f"   ❌ Image {i + 1}: Failed to download - {str(result)}")
-            continue
+    async with httpx.AsyncClient(timeout=30.0, limits=limits, follow_redirects=True) as client:
+        async def scrape_bounded(index: int, url: str):
+            async with semaphore:
+                try:
+                    return await scrape_image(client, url, index, storage, seen_hashes)
+                except Exception as e:
+                    print(f"   ❌ Image {index + 1}: Failed - {str(e)}")
+                    return None
         
-        image_bytes, filename = result
-        try:
-            # Create S3 object key
-            object_key = f"scraped-images/{uuid4()}/{filename}"
-            
-            # Upload to S3
-            image_url = await upload_to_s3(
-                image_bytes,
-                bucket_name,
-                object_key
-            )
-            
-            uploaded_urls.append(image_url)
-            print(f"   ✅ Image {i + 1}: {filename} → {image_url}")
-        except Exception as e:
-            print(f"   ❌ Image {i + 1}: Failed to upload - {str(e)}")
+        print("📥 Downloading and uploading images...")
+        results = await asyncio.gather(*[scrape_bounded(i, url) for i, url in enumerate(source_urls)])
+    
+    uploaded_urls = list(dict.fromkeys(url for url in results if url))
     
-    print(f"\n✨ Completed! Successfully uploaded {len(uploaded_urls)}/{num_images} images to S3")
+    print(f"\n✨ Completed! Successfully uploaded {len(uploaded_urls)}/{len(source_urls)} unique images to {storage.name} storage")
     print("\n📋 Uploaded URLs:")
     for i, url in enumerate(uploaded_urls, 1):
         print(f"   {i}. {url}")
@@ -102,4 +129,14 @@ async def scrape_and_upload_images(num_images: int = 10):
     return uploaded_urls
 
 if __name__ == "__main__":
-    asyncio.run(scrape_and_upload_images(10))
+    parser = argparse.ArgumentParser(description="Download pet images and upload them to image storage")
+    parser.add_argument("--urls-file", help="File with one image URL per line")
+    parser.add_argument("--url", action="append", dest="urls", help="Image URL (repeatable)")
+    parser.add_argument("--num-images", type=int, default=10, help="Maximum number of images to scrape")
+    parser.add_argument("--concurrency", type=int, default=8, help="Images transferred at once")
+    args = parser.parse_args()
+    asyncio.run(scrape_and_upload_images(
+        num_images=args.num_images,
+        source_urls=load_source_urls(args.urls_file, args.urls),
+        concurrency=args.concurrency
+    ))
@@ -0,0 +1,158 @@
+"""
+Serving locally stored images (/api/images/{key}).
+
+Local keys are content-addressed, so a key's bytes never change: responses
+carry the sha256 as a strong ETag and an immutable one-year Cache-Control, and
+a matching If-None-Match gets a bodyless 304.
+
+Bodies go out through the ASGI zero-copy extension (os.sendfile on the server
+side) when the server offers it, through pathsend for whole files, and
+otherwise as 64 KiB chunks read in a worker thread. A single byte range
+(Range: bytes=...) is honored with 206, honoring If-Range; multi-range requests
+get the whole image.
+
+With ?w=<width>, the narrowest stored variant at least that wide is served,
+falling back to the original. Variants aren't generated here.
+"""
+
+import os
+import re
+import asyncio
+import mimetypes
+from typing import Optional, Tuple
+from starlette.responses import Response
+
+from cache import etag_matches
+from storage import IMMUTABLE_CACHE_CONTROL, LocalStorage
+
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single-range Range header, end inclusive. None when the whole
+    body should be sent (no header, an unsupported unit or several ranges).
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def pick_variant(storage: LocalStorage, key: str, width: Optional[int]) -> str:
+    """The narrowest stored variant at least width wide, or the original when there is none"""
+    if not width:
+        return key
+    for variant_width, variant_key in storage.variants(key):
+        if variant_width >= width:
+            return variant_key
+    return key
+
+
+class ImageFileResponse(Response):
+    """File response for a byte range of a stored image, sent zero-copy when the server supports it"""
+
+    def __init__(self, path: str, status_code: int, headers: dict, media_type: str, offset: int, length: int, full: bool):
+        self.path = path
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.offset = offset
+        self.length = length
+        self.full = full
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and self.full:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        f = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.length,
+                })
+                return
+            await asyncio.to_thread(f.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank under us; end the body rather than leave the client waiting
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await asyncio.to_thread(f.close)
+
+
+async def image_response(storage: LocalStorage, key: str, headers, width: Optional[int] = None) -> Response:
+    """Response for a stored image: 200, 206, 304, 404 or 416"""
+    if storage.path(key) is None:
+        return Response(status_code=404)
+    served_key = await asyncio.to_thread(pick_variant, storage, key, width)
+    path = storage.path(served_key)
+    try:
+        size = (await asyncio.to_thread(os.stat, path)).st_size
+    except FileNotFoundError:
+        return Response(status_code=404)
+
+    # The file name (sha256, plus the width for variants) identifies the bytes exactly
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    common = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if etag_matches(headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=common)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if_range = headers.get("if-range")
+    try:
+        requested = parse_range(headers.get("range"), size) if not if_range or if_range == etag else None
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**common, "Content-Range": f"bytes */{size}"})
+
+    if requested is None:
+        return ImageFileResponse(path, 200, {**common, "Content-Length": str(size)}, media_type, 0, size, full=True)
+    start, end = requested
+    length = end - start + 1
+    return ImageFileResponse(
+        path, 206,
+        {**common, "Content-Length": str(length), "Content-Range": f"bytes {start}-{end}/{size}"},
+        media_type, start, length, full=(length == size)
+    )
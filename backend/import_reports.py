@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Bulk import of pet reports from a local directory or a CSV/JSONL manifest.
+
+Each image is hashed, and the sha256 becomes the report's import_key and its
+storage key (imports/<sha256><ext>), so rerunning an import skips everything that
+already made it in. Upload and AI tagging run concurrently in a pool of
+workers, reports are upserted with batched bulk_write calls, and matching runs
+once over all new reports at the end. Imported reports are stored with
+import_matched=false until that pass succeeds, so reports left unmatched by a
+failed or interrupted run are matched by the next one.
+
+Manifest columns (CSV header or JSONL keys):
+    image_path, report_type, pet_name, pet_type,
+    user_name, user_email, user_phone, user_location, description
+image_path is relative to the manifest. Missing fields fall back to the CLI
+defaults. In directory mode, an optional <image>.json sidecar supplies the
+same fields for each image.
+
+Usage:
+    python import_reports.py --dir ./shelter_photos --report-type Found \\
+        --user-name "Santa Cruz Shelter" --user-email intake@shelter.org \\
+        --user-phone 555-0100 --user-location "Santa Cruz, CA"
+    python import_reports.py --manifest intake.csv --concurrency 8 --ai-rate 2
+"""
+
+import os
+import csv
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import mimetypes
+from typing import AsyncIterator, Iterator, List
+from motor.motor_asyncio import AsyncIOMotorClient
+from beanie import init_beanie
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config import settings
+from models import PetReport, PetTags, UserInfo, PetMatch, EmailOutbox
+from ai_service import analyze_pet_image
+from storage import get_storage
+from cache import bump_reports_version, cache_is_shared, STALE_CACHE_WARNING
+from matching import find_matches_bulk, CANDIDATE_PROJECTION
+from rate_limit import TokenBucket
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MANIFEST_FIELDS = [
+    "image_path", "report_type", "pet_name", "pet_type",
+    "user_name", "user_email", "user_phone", "user_location", "description"
+]
+CONTACT_FIELDS = ["user_name", "user_email", "user_phone", "user_location"]
+STAGES = ["read", "upload", "ai", "write"]
+MATCHED_MARK_CHUNK = 1000
+
+
+class StageStats:
+    """Items handled and time spent in one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0  # Summed over concurrent workers
+        self.first_started = None
+        self.last_finished = None
+
+    def record(self, started: float, ok: bool = True, items: int = 1):
+        finished = time.monotonic()
+        if self.first_started is None:
+            self.first_started = started
+        self.last_finished = finished
+        self.busy += finished - started
+        if ok:
+            self.items += items
+        else:
+            self.failed += items
+
+    def summary(self) -> str:
+        active = (self.last_finished - self.first_started) if self.first_started is not None else 0.0
+        rate = self.items / active if active > 0 else 0.0
+        avg_ms = self.busy / (self.items + self.failed) * 1000 if (self.items + self.failed) else 0.0
+        return (f"{self.name:>6}: {self.items} ok, {self.failed} failed, "
+                f"{rate:.2f} items/sec, {avg_ms:.0f} ms/item")
+
+
+class ImportStats:
+    """Counters for one import run"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {name: StageStats(name) for name in STAGES}
+        self.skipped = 0
+        self.invalid = 0
+        self.created = 0
+        self.existing = 0
+        self.matches = 0
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        print(f"   📈 {self.created} created, {self.existing} already present, "
+              f"{self.invalid} invalid, {self.created / elapsed if elapsed > 0 else 0.0:.2f} reports/sec")
+
+
+def _load_sidecar(image_path: str) -> dict:
+    """The image's <image>.json metadata, {} if it has none. Raises ValueError if the file is unreadable or malformed."""
+    sidecar = os.path.splitext(image_path)[0] + ".json"
+    if not os.path.exists(sidecar):
+        return {}
+    try:
+        with open(sidecar) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"invalid sidecar {os.path.basename(sidecar)}: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError(f"invalid sidecar {os.path.basename(sidecar)}: expected a JSON object")
+    return data
+
+
+def iter_directory_entries(directory: str) -> Iterator[dict]:
+    """One entry per image file in directory (sorted, non-recursive), merged with its sidecar"""
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS):
+            try:
+                sidecar = _load_sidecar(path)
+            except ValueError as e:
+                # Reported and counted as invalid by validate_entry, like any other bad entry
+                yield {"image_path": path, "error": str(e)}
+                continue
+            yield {**sidecar, "image_path": path}
+
+
+def iter_manifest_entries(manifest: str) -> Iterator[dict]:
+    """Entries from a CSV or JSONL manifest; image paths are resolved against the manifest's directory"""
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="") as f:
+        if manifest.lower().endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            entry = {name: row.get(name) for name in MANIFEST_FIELDS if row.get(name) not in (None, "")}
+            if "image_path" in entry:
+                entry["image_path"] = os.path.join(base_dir, entry["image_path"])
+            yield entry
+
+
+def validate_entry(entry: dict, defaults: dict) -> dict:
+    """Apply CLI defaults and check the metadata. Raises ValueError when the entry can't be imported."""
+    if entry.get("error"):
+        raise ValueError(entry["error"])
+    entry = {**defaults, **{name: value for name, value in entry.items() if value is not None}}
+    if not entry.get("image_path"):
+        raise ValueError("missing image_path")
+    if entry.get("report_type") not in ("Lost", "Found"):
+        raise ValueError(f"report_type must be Lost or Found, got {entry.get('report_type')!r}")
+    missing = [name for name in CONTACT_FIELDS if not entry.get(name)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return entry
+
+
+def read_image(path: str) -> tuple[bytes, str, str]:
+    """Read an image and return (bytes, sha256 hex, mime type)"""
+    with open(path, "rb") as f:
+        image_bytes = f.read()
+    if not image_bytes:
+        raise ValueError("empty file")
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        raise ValueError(f"{len(image_bytes)} bytes exceeds the {MAX_IMAGE_BYTES} byte limit")
+    mime_type, _ = mimetypes.guess_type(path)
+    if not mime_type or not mime_type.startswith("image/"):
+        raise ValueError(f"not an image ({mime_type})")
+    return image_bytes, hashlib.sha256(image_bytes).hexdigest(), mime_type
+
+
+def _pet_type_from_species(species: str) -> str:
+    species = (species or "").lower()
+    if species in ['dog', 'puppy']:
+        return 'Dog'
+    if species in ['cat', 'kitten']:
+        return 'Cat'
+    return 'Other'
+
+
+def build_report(job: dict, image_url: str, tags_data: dict, user_id: str) -> PetReport:
+    """Validate AI tags and entry metadata into an unsaved report"""
+    entry = job["entry"]
+    tags_data = {"marks": [], "size": "Unknown", **tags_data}
+    return PetReport(
+        user_id=user_id,
+        report_type=entry["report_type"],
+        pet_name=entry.get("pet_name"),
+        pet_type=entry.get("pet_type") or _pet_type_from_species(tags_data.get("species")),
+        user_info=UserInfo(
+            name=entry["user_name"],
+            email=entry["user_email"],
+            phone=entry["user_phone"],
+            location=entry["user_location"]
+        ),
+        image_urls=[image_url],
+        tags=PetTags(**tags_data),
+        description=entry.get("description"),
+        status="active",
+        import_key=job["import_key"],
+        import_matched=False
+    )
+
+
+async def iter_jobs(entries: Iterator[dict], defaults: dict, stats: ImportStats) -> AsyncIterator[dict]:
+    """Validate entries and read their images, dropping duplicates within the run"""
+    seen = set()
+    for entry in entries:
+        started = time.monotonic()
+        try:
+            entry = validate_entry(entry, defaults)
+            image_bytes, import_key, mime_type = await asyncio.to_thread(read_image, entry["image_path"])
+        except (ValueError, OSError) as e:
+            print(f"   ⚠️  Skipping {entry.get('image_path', entry)}: {str(e)}")
+            stats.invalid += 1
+            stats.stages["read"].record(started, ok=False)
+            continue
+        stats.stages["read"].record(started)
+        if import_key in seen:
+            stats.skipped += 1
+            continue
+        seen.add(import_key)
+        yield {"entry": entry, "bytes": image_bytes, "import_key": import_key, "mime_type": mime_type}
+
+
+async def iter_not_imported(jobs: AsyncIterator[dict], stats: ImportStats, batch_size: int = 500) -> AsyncIterator[dict]:
+    """
+    Drop images whose import_key already has a report. Reports are the ledger,
+    so a rerun only does the work an earlier run didn't finish.
+    """
+    collection = PetReport.get_motor_collection()
+
+    async def pending_in(chunk):
+        done = set(await collection.distinct("import_key", {"import_key": {"$in": [job["import_key"] for job in chunk]}}))
+        stats.skipped += sum(1 for job in chunk if job["import_key"] in done)
+        return [job for job in chunk if job["import_key"] not in done]
+
+    chunk = []
+    async for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= batch_size:
+            for pending_job in await pending_in(chunk):
+                yield pending_job
+            chunk = []
+    if chunk:
+        for pending_job in await pending_in(chunk):
+            yield pending_job
+
+
+async def load_unmatched_reports() -> List[dict]:
+    """Imported reports no matching pass has covered yet, from this run or an earlier one"""
+    cursor = PetReport.get_motor_collection().find({"import_matched": False}, CANDIDATE_PROJECTION)
+    return await cursor.to_list(length=None)
+
+
+async def mark_matched(report_ids: list):
+    collection = PetReport.get_motor_collection()
+    for start in range(0, len(report_ids), MATCHED_MARK_CHUNK):
+        chunk = report_ids[start:start + MATCHED_MARK_CHUNK]
+        await collection.update_many({"_id": {"$in": chunk}}, {"$set": {"import_matched": True}})
+
+
+async def _timed(stage: StageStats, coro):
+    started = time.monotonic()
+    try:
+        result = await coro
+    except Exception:
+        stage.record(started, ok=False)
+        raise
+    stage.record(started)
+    return result
+
+
+async def _tag_image(ai_bucket: TokenBucket, job: dict) -> dict:
+    await ai_bucket.acquire()
+    return await analyze_pet_image(job["bytes"], job["mime_type"])
+
+
+async def _import_worker(queue, results, storage, ai_bucket, user_id, stats):
+    while True:
+        job = await queue.get()
+        if job is None:
+            return
+        path = job["entry"]["image_path"]
+        ext = os.path.splitext(path)[1].lower()
+        object_key = f"imports/{job['import_key']}{ext}"
+        # Upload and AI tagging only need the bytes, so they run side by side
+        upload, tagging = await asyncio.gather(
+            _timed(stats.stages["upload"], storage.put(job["bytes"], object_key, job["mime_type"])),
+            _timed(stats.stages["ai"], _tag_image(ai_bucket, job)),
+            return_exceptions=True
+        )
+        if isinstance(upload, Exception) or isinstance(tagging, Exception):
+            error = upload if isinstance(upload, Exception) else tagging
+            print(f"   ❌ Failed to process {path}: {str(error)}")
+            stats.invalid += 1
+            continue
+        try:
+            report = build_report(job, upload.url, tagging, user_id)
+        except ValidationError as e:
+            print(f"   ⚠️  Invalid report for {path}: {e.error_count()} validation error(s)")
+            stats.invalid += 1
+            continue
+        await results.put(report)
+
+
+async def _report_writer(results, batch_size, stats):
+    collection = PetReport.get_motor_collection()
+    batch = []
+
+    async def flush():
+        if not batch:
+            return
+        docs = [report.model_dump(exclude={"id", "revision_id"}) for report in batch]
+        # Upsert on import_key so a concurrent or repeated import can't create a duplicate
+        operations = [
+            UpdateOne({"import_key": doc["import_key"]}, {"$setOnInsert": doc}, upsert=True)
+            for doc in docs
+        ]
+        started = time.monotonic()
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            # A racing upsert on the same key surfaces as a duplicate key error; that report exists already
+            print(f"   ⚠️  {len(e.details.get('writeErrors', []))} write error(s) in batch of {len(batch)}")
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+        except Exception as e:
+            print(f"   ❌ Failed to save {len(batch)} reports: {str(e)}")
+            stats.stages["write"].record(started, ok=False, items=len(batch))
+            batch.clear()
+            return
+        stats.stages["write"].record(started, items=len(batch))
+        stats.created += len(upserted)
+        stats.existing += len(batch) - len(upserted)
+        batch.clear()
+        stats.progress()
+
+    while True:
+        report = await results.get()
+        if report is None:
+            await flush()
+            return
+        batch.append(report)
+        if len(batch) >= batch_size:
+            await flush()
+
+
+async def import_reports(
+    entries: Iterator[dict],
+    defaults: dict,
+    user_id: str = "bulk_import",
+    concurrency: int = 8,
+    ai_rate: float = 2.0,
+    batch_size: int = 100,
+    run_matching: bool = True
+):
+    """Import reports for entries, then run one matching pass over every imported report not yet matched"""
+    print("🚀 Starting bulk import...")
+    print(f"⚙️  Workers: {concurrency}, AI rate: {ai_rate}/sec, write batch: {batch_size}\n")
+
+    try:
+        client = AsyncIOMotorClient(settings.mongo_uri)
+        await init_beanie(database=client[settings.mongo_db], document_models=[PetReport, PetMatch, EmailOutbox])
+        print("✅ Connected to MongoDB\n")
+    except Exception as e:
+        print(f"❌ MongoDB connection error: {str(e)}")
+        return
+
+    # No fallback here: an image that fails to upload fails its entry, and a rerun retries it
+    try:
+        storage = get_storage()
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return
+    print(f"📦 Storing images in {storage.name} storage\n")
+
+    # read + hash -> skip imported -> upload || AI -> validate -> bulk upsert -> one matching pass
+    stats = ImportStats()
+    ai_bucket = TokenBucket(ai_rate)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    results = asyncio.Queue(maxsize=batch_size * 2)
+
+    workers = [
+        asyncio.create_task(_import_worker(queue, results, storage, ai_bucket, user_id, stats))
+        for _ in range(concurrency)
+    ]
+    writer = asyncio.create_task(_report_writer(results, batch_size, stats))
+
+    try:
+        async for job in iter_not_imported(iter_jobs(entries, defaults, stats), stats):
+            await queue.put(job)
+    except Exception as e:
+        print(f"❌ Error reading import entries: {str(e)}")
+
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    await results.put(None)
+    await writer
+
+    if run_matching:
+        try:
+            # Includes reports an earlier run created but never matched (it failed or was interrupted)
+            pending = await load_unmatched_reports()
+        except Exception as e:
+            print(f"⚠️ Error loading unmatched reports: {str(e)}")
+            pending = []
+        if pending:
+            leftover = len(pending) - stats.created
+            print(f"\n🔍 Matching {len(pending)} report(s)" + (f", {leftover} from earlier runs" if leftover > 0 else "") + "...")
+            started = time.monotonic()
+            try:
+                # Matching skips pairs that already have a PetMatch, so repeating it is harmless
+                stats.matches = await find_matches_bulk(pending)
+                await mark_matched([report["_id"] for report in pending])
+                print(f"   ✅ {stats.matches} match(es) created in {time.monotonic() - started:.2f}s")
+            except Exception as e:
+                print(f"⚠️ Error finding matches: {str(e)}")
+                print("   The reports stay marked unmatched; rerun the import to match them")
+
+    if stats.created or stats.matches:
+        if cache_is_shared():
+            await bump_reports_version()
+        else:
+            print(STALE_CACHE_WARNING)
+
+    # Summary
+    elapsed = time.monotonic() - stats.started
+    print("\n" + "=" * 60)
+    print("✨ IMPORT COMPLETE!")
+    print("=" * 60)
+    print(f"✅ Created: {stats.created} pet reports")
+    print(f"⏭️  Skipped (already imported): {stats.skipped + stats.existing} images")
+    print(f"❌ Invalid or failed: {stats.invalid} entries")
+    print(f"🎯 Matches: {stats.matches}")
+    print(f"📊 Finished in {elapsed:.1f}s")
+    for name in STAGES:
+        print(f"   {stats.stages[name].summary()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import pet reports from a directory of images or a CSV/JSONL manifest")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Directory of images, with optional <image>.json sidecars")
+    source.add_argument("--manifest", help="CSV or JSONL manifest with one report per row")
+    parser.add_argument("--report-type", choices=["Found", "Lost"], help="Default report type")
+    parser.add_argument("--pet-type", help="Default pet type (derived from the AI species when omitted)")
+    parser.add_argument("--user-name", help="Default contact name")
+    parser.add_argument("--user-email", help="Default contact email")
+    parser.add_argument("--user-phone", help="Default contact phone")
+    parser.add_argument("--user-location", help="Default location")
+    parser.add_argument("--user-id", default="bulk_import", help="Owner recorded on the imported reports")
+    parser.add_argument("--concurrency", type=int, default=8, help="Images processed at once")
+    parser.add_argument("--ai-rate", type=float, default=2.0, help="Gemini calls per second")
+    parser.add_argument("--batch-size", type=int, default=100, help="Reports per bulk_write")
+    parser.add_argument("--skip-matching", action="store_true", help="Don't run the matching pass (a later run without this flag matches the reports)")
+    args = parser.parse_args()
+
+    defaults = {
+        "report_type": args.report_type,
+        "pet_type": args.pet_type,
+        "user_name": args.user_name,
+        "user_email": args.user_email,
+        "user_phone": args.user_phone,
+        "user_location": args.user_location,
+    }
+    defaults = {name: value for name, value in defaults.items() if value}
+    entries = iter_directory_entries(args.dir) if args.dir else iter_manifest_entries(args.manifest)
+    asyncio.run(import_reports(
+        entries,
+        defaults,
+        user_id=args.user_id,
+        concurrency=args.concurrency,
+        ai_rate=args.ai_rate,
+        batch_size=args.batch_size,
+        run_matching=not args.skip_matching
+    ))
@@ -1,48 +1,41 @@
-import os
-import time
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import asyncio
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
-from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from uuid import uuid4
-import json
 
 from models import PetReport, PetTags, UserInfo, PetMatch
-from ai_service import analyze_pet_image
-from s3_config import upload_to_s3
-from email_service import send_match_notification
-from typing import Optional, List
+from database import init_database, close_database
+from ai_service import analyze_pet_image, ai_configured, warm_ai_client, close_http_client
+from storage import store_image, warm_storage, get_local_storage
+from image_service import image_response
+from email_service import outbox_sender
+from matching import find_matches
+from cache import (
+    get_cached_report, cache_report, invalidate_reports, etag_matches,
+    get_reports_version, bump_reports_version, listing_cache_key, get_cached_listing, cache_listing
+)
+from export_service import (
+    EXPORT_MEDIA_TYPES, REPORT_EXPORT_PROJECTION, REPORT_CSV_COLUMNS, MATCH_EXPORT_PROJECTION, MATCH_CSV_COLUMNS,
+    build_export_query, export_sort, stream_export, report_record, report_csv_row, match_record, match_csv_row
+)
+from structured_log import get_logger, shutdown_logging
+from metrics import MetricsMiddleware, REPORT_STAGE_SECONDS, PROMETHEUS_CONTENT_TYPE, render_metrics
+from profiling import ProfilingMiddleware, list_profiles, find_profile
+from admin import require_admin
+from readiness import get_readiness
+from admission import AdmissionMiddleware, LimitsUpdate, admission
+from events import EVENT_TYPES, EVENT_MAX_SUBSCRIBERS, event_broker, change_watcher, stream_events
+from typing import Optional
 from datetime import datetime
 
-load_dotenv()
 app = FastAPI(title="Pet Finder API", version="1.0.0")
+logger = get_logger("main")
 
-# #region agent log
-_DEBUG_LOG_PATH = "/home/necharkc/cruzhack/.cursor/debug.log"
-def _log_debug(payload):
-    try:
-        os.makedirs(os.path.dirname(_DEBUG_LOG_PATH), exist_ok=True)
-        with open(_DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload) + "\n")
-    except Exception as e:
-        # Fallback visibility if file write fails
-        print(f"DEBUG_LOG_WRITE_FAILED path={_DEBUG_LOG_PATH} error={type(e).__name__}:{str(e)[:120]}")
-# #endregion agent log
-
-@app.on_event("startup")
-async def _log_startup():
-    # #region agent log
-    _log_debug({
-        "sessionId": "debug-session",
-        "runId": "pre-fix",
-        "hypothesisId": "H5",
-        "location": "main.py:startup",
-        "message": "FastAPI startup",
-        "data": {"cwd": os.getcwd()},
-        "timestamp": int(time.time() * 1000)
-    })
-    # #endregion agent log
+# Innermost, so uploads turned away still get CORS headers and show up in request metrics
+app.add_middleware(AdmissionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -53,6 +46,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so request latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Mock AI response for testing (when Gemini API is unavailable)
 def get_mock_ai_response(filename: str) -> dict:
     """Return mock AI analysis for testing S3 upload flow"""
@@ -68,195 +65,32 @@ def get_mock_ai_response(filename: str) -> dict:
 async def get_ai_tags(image_bytes: bytes, mime_type: str = "image/jpeg"):
     """Analyze image with Gemini AI. Only uses mock if API key is completely missing."""
     # Check if API key exists before trying
-    api_key = os.getenv("GEMINI_API_KEY")
-    # #region agent log
-    _log_debug({
-        "sessionId": "debug-session",
-        "runId": "pre-fix",
-        "hypothesisId": "H1",
-        "location": "main.py:get_ai_tags:entry",
-        "message": "get_ai_tags called",
-        "data": {"image_bytes_len": len(image_bytes) if image_bytes else 0, "mime_type": mime_type, "api_key_present": bool(api_key), "api_key_len": len(api_key) if api_key else 0},
-        "timestamp": int(time.time() * 1000)
-    })
-    # #endregion agent log
-    if not api_key or api_key == "your_gemini_api_key_here" or len(api_key) < 10:
-        print("⚠️ GEMINI_API_KEY not configured properly. Using mock response.")
-        # #region agent log
-        _log_debug({
-            "sessionId": "debug-session",
-            "runId": "pre-fix",
-            "hypothesisId": "H1",
-            "location": "main.py:get_ai_tags:mock_branch",
-            "message": "Using mock response due to API key check",
-            "data": {"api_key_present": bool(api_key), "api_key_len": len(api_key) if api_key else 0},
-            "timestamp": int(time.time() * 1000)
-        })
-        # #endregion agent log
+    if not ai_configured():
+        logger.warning("⚠️ GEMINI_API_KEY not configured properly. Using mock response.")
         return get_mock_ai_response("")
     
     # Try real AI analysis - don't catch errors, let them propagate
-    print(f"🤖 Attempting Gemini AI analysis with {len(image_bytes)} bytes...")
-    # #region agent log
-    _log_debug({
-        "sessionId": "debug-session",
-        "runId": "pre-fix",
-        "hypothesisId": "H2",
-        "location": "main.py:get_ai_tags:before_analyze",
-        "message": "Calling analyze_pet_image",
-        "data": {"image_bytes_len": len(image_bytes) if image_bytes else 0, "mime_type": mime_type},
-        "timestamp": int(time.time() * 1000)
-    })
-    # #endregion agent log
+    logger.debug("Calling analyze_pet_image", extra={"fields": {"image_bytes_len": len(image_bytes), "mime_type": mime_type}})
     result = await analyze_pet_image(image_bytes, mime_type)
-    print(f"✅ AI analysis successful: {result.get('species')} - {result.get('breed')}")
-    # #region agent log
-    _log_debug({
-        "sessionId": "debug-session",
-        "runId": "pre-fix",
-        "hypothesisId": "H3",
-        "location": "main.py:get_ai_tags:after_analyze",
-        "message": "analyze_pet_image returned",
-        "data": {"species": result.get("species"), "breed": result.get("breed")},
-        "timestamp": int(time.time() * 1000)
-    })
-    # #endregion agent log
+    logger.info("✅ AI analysis successful", extra={"fields": {"species": result.get("species"), "breed": result.get("breed")}})
     return result
 
 
-def calculate_match_score(tags1: PetTags, tags2: PetTags) -> tuple[int, List[str]]:
-    """
-    Calculate match score between two pet tags.
-    Returns (score, matched_tags) where score is 0-3 and matched_tags are the matching tag names.
-    """
-    matched_tags = []
-    score = 0
-    
-    # Compare species
-    if tags1.species.lower() == tags2.species.lower():
-        score += 1
-        matched_tags.append("species")
-    
-    # Compare breed
-    if tags1.breed.lower() == tags2.breed.lower():
-        score += 1
-        matched_tags.append("breed")
-    
-    # Compare primary color
-    if tags1.primary_color.lower() == tags2.primary_color.lower():
-        score += 1
-        matched_tags.append("primary_color")
-    
-    return score, matched_tags
-
-
-async def find_matches(new_report: PetReport):
-    """
-    Find matching reports when a new report is created.
-    If new report is 'Found', match with 'Lost' reports.
-    If new report is 'Lost', match with 'Found' reports.
-    Create PetMatch records for matches with score >= 3 (perfect matches).
-    """
-    try:
-        # Determine which type of reports to search
-        search_type = "Lost" if new_report.report_type == "Found" else "Found"
-        
-        # Find reports of opposite type
-        candidate_reports = await PetReport.find({
-            "report_type": search_type,
-            "status": "active",
-            "pet_type": new_report.pet_type  # Same pet type only
-        }).to_list()
-        
-        print(f"🔍 Searching for matches: {len(candidate_reports)} {search_type} reports to check")
-        
-        matches_created = 0
-        for candidate in candidate_reports:
-            # Skip if it's the same report
-            if str(candidate.id) == str(new_report.id):
-                continue
-            
-            # Calculate match score
-            if new_report.report_type == "Found":
-                match_score, matched_tags = calculate_match_score(candidate.tags, new_report.tags)
-                lost_id = str(candidate.id)
-                found_id = str(new_report.id)
-            else:
-                match_score, matched_tags = calculate_match_score(new_report.tags, candidate.tags)
-                lost_id = str(new_report.id)
-                found_id = str(candidate.id)
-            
-            # Create match if score is 3/3 (perfect match)
-            if match_score == 3:
-                # Check if match already exists
-                existing_match = await PetMatch.find_one({
-                    "lost_report_id": lost_id,
-                    "found_report_id": found_id
-                })
-                
-                if not existing_match:
-                    match = PetMatch(
-                        lost_report_id=lost_id,
-                        found_report_id=found_id,
-                        match_score=match_score,
-                        matched_tags=matched_tags,
-                        status="pending"
-                    )
-                    await match.insert()
-                    matches_created += 1
-                    print(f"   ✅ Match created! Score: {match_score}/3, Tags: {', '.join(matched_tags)}")
-                    
-                    # Send email notification to the person who reported the lost pet
-                    try:
-                        from bson import ObjectId
-                        lost_report = await PetReport.get(ObjectId(lost_id))
-                        found_report = await PetReport.get(ObjectId(found_id))
-                        
-                        if lost_report and found_report:
-                            # Get found pet image URL (first image)
-                            found_image_url = found_report.image_urls[0] if found_report.image_urls else None
-                            
-                            # Prepare match details
-                            match_details = {
-                                'matched_tags': matched_tags,
-                                'location': found_report.user_info.location
-                            }
-                            
-                            # Send email to lost pet owner
-                            email_sent = await send_match_notification(
-                                recipient_email=lost_report.user_info.email,
-                                recipient_name=lost_report.user_info.name,
-                                pet_name=lost_report.pet_name or "your pet",
-                                found_pet_image_url=found_image_url,
-                                match_details=match_details
-                            )
-                            
-                            if email_sent:
-                                print(f"   📧 Email notification sent to {lost_report.user_info.email}")
-                            else:
-                                print(f"   ⚠️ Email notification could not be sent (check email configuration)")
-                    except Exception as email_err:
-                        print(f"   ⚠️ Error sending email notification: {str(email_err)}")
-                        # Don't fail the match creation if email fails
-        
-        if matches_created > 0:
-            print(f"🎉 Created {matches_created} new match(es)!")
-        else:
-            print("   ℹ️  No perfect matches found (need 3/3 tags to match)")
-            
-    except Exception as e:
-        print(f"⚠️ Error finding matches: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
 @app.on_event("startup")
 async def startup_event():
-    try:
-        client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
-        await init_beanie(database=client["SlugHacks"], document_models=[PetReport, PetMatch])
-        print("✅ SUCCESS: Connected to MongoDB Atlas")
-    except Exception as e:
-        print(f"❌ DATABASE ERROR: {e}")
+    # Independent round trips, so connect to everything at once. The warm-ups log and swallow
+    # their own errors; init_database raises after its retries, which aborts startup.
+    await asyncio.gather(init_database(), warm_storage(), warm_ai_client(), outbox_sender.warm())
+    outbox_sender.start()
+    change_watcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await change_watcher.stop()
+    await outbox_sender.stop()
+    await close_http_client()
+    close_database()
+    shutdown_logging()
 
 @app.post("/api/reports")
 async def create_report(
@@ -274,52 +108,44 @@ async def create_report(
     Create a new pet report with image upload, AI tagging, S3 storage, and MongoDB save.
     Pipeline: Images -> S3 Upload -> AI Analysis -> MongoDB Save
     """
-    print(f"--- Processing New {report_type} Report ---")
+    logger.info(f"--- Processing New {report_type} Report ---", extra={"fields": {"file_count": len(files) if files else 0}})
     
     if not files or len(files) == 0:
         raise HTTPException(status_code=400, detail="At least one image is required")
     
     try:
         # 1. Read all file bytes into memory (needed for both S3 and AI)
-        print("1. Reading uploaded images...")
         file_data = []
-        for file in files:
-            file_bytes = await file.read()
-            file_data.append({
-                "bytes": file_bytes,
-                "filename": file.filename or f"image_{uuid4()}.jpg",
-                "content_type": file.content_type or "image/jpeg"
-            })
-            print(f"   ✅ Read {len(file_bytes)} bytes from {file.filename}")
+        with REPORT_STAGE_SECONDS.time(stage="read"):
+            for file in files:
+                file_bytes = await file.read()
+                file_data.append({
+                    "bytes": file_bytes,
+                    "filename": file.filename or f"image_{uuid4()}.jpg",
+                    "content_type": file.content_type or "image/jpeg"
+                })
+                logger.debug("Read upload", extra={"fields": {"filename": file.filename, "bytes": len(file_bytes)}})
         
-        # 2. Upload all images to S3
-        print("2. Uploading images to S3...")
+        # 2. Upload all images to storage (S3, or local disk)
         image_urls = []
         report_uuid = str(uuid4())
         
-        for file_info in file_data:
-            object_key = f"pet-reports/{report_uuid}/{file_info['filename']}"
-            image_url = await upload_to_s3(
-                file_info["bytes"], 
-                os.getenv("S3_BUCKET_NAME"), 
-                object_key
-            )
-            image_urls.append(image_url)
-            print(f"   ✅ Uploaded to S3: {image_url}")
+        with REPORT_STAGE_SECONDS.time(stage="upload"):
+            for file_info in file_data:
+                object_key = f"pet-reports/{report_uuid}/{file_info['filename']}"
+                stored = await store_image(file_info["bytes"], object_key, file_info["content_type"])
+                image_url = stored.url
+                image_urls.append(image_url)
+                logger.debug("Uploaded image", extra={"fields": {"image_url": image_url}})
         
         # 3. Run AI analysis on first image for tags
-        print("3. Analyzing first image with AI...")
         first_image = file_data[0]
-        print(f"   📸 Image: {len(first_image['bytes'])} bytes, MIME: {first_image['content_type']}")
         
         try:
-            tags_data = await get_ai_tags(first_image["bytes"], first_image["content_type"])
-            print(f"   ✅ AI Results: Species={tags_data.get('species')}, Breed={tags_data.get('breed')}, Color={tags_data.get('primary_color')}")
+            with REPORT_STAGE_SECONDS.time(stage="ai"):
+                tags_data = await get_ai_tags(first_image["bytes"], first_image["content_type"])
         except Exception as ai_err:
-            error_msg = f"AI analysis failed: {str(ai_err)}"
-            print(f"   ❌ {error_msg}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ AI analysis failed: {str(ai_err)}", exc_info=True)
             # Don't use mock - raise the error so user knows there's a problem
             raise HTTPException(
                 status_code=500, 
@@ -335,7 +161,6 @@ async def create_report(
         )
 
         # 5. Create Report document with all data
-        print("4. Creating MongoDB document...")
         new_report = PetReport(
             user_id="slug_hacker_1",  # TODO: Get from auth token
             report_type=report_type,
@@ -349,15 +174,24 @@ async def create_report(
         )
         
         # 6. Save to MongoDB
-        await new_report.insert()
-        print(f"   ✅ Saved to MongoDB with ID: {new_report.id}")
+        with REPORT_STAGE_SECONDS.time(stage="insert"):
+            await new_report.insert()
+            await bump_reports_version()
+        logger.info("✅ Saved report", extra={"fields": {
+            "report_id": str(new_report.id),
+            "image_count": len(image_urls),
+            "species": tags_data.get("species"),
+            "breed": tags_data.get("breed"),
+            "primary_color": tags_data.get("primary_color")
+        }})
         
         # 7. Find matches with existing reports (skip for scraper_bot to prevent auto-matching)
+        match_count = 0
         if new_report.user_id != "scraper_bot":
-            print("5. Searching for matches...")
-            await find_matches(new_report)
+            with REPORT_STAGE_SECONDS.time(stage="match"):
+                match_count = await find_matches(new_report)
         else:
-            print("5. Skipping match search for scraper_bot reports")
+            logger.debug("Skipping match search for scraper_bot report")
         
         # 8. Return success response with all data
         return {
@@ -367,6 +201,7 @@ async def create_report(
             "detected_pet": tags_data,
             "image_urls": image_urls,  # For carousel display
             "image_count": len(image_urls),
+            "match_count": match_count,
             "pet_details": {
                 "name": pet_name,
                 "type": pet_type,
@@ -378,14 +213,23 @@ async def create_report(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ CRITICAL ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ CRITICAL ERROR: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _conditional_response(request: Request, response: Response, cached: dict):
+    """Return a cached response body, or 304 if the client already has this ETag"""
+    headers = {"ETag": cached["etag"], "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached["etag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return cached["body"]
+
+
 @app.get("/api/reports")
 async def get_reports(
+    request: Request,
+    response: Response,
     report_type: Optional[str] = None,
     pet_type: Optional[str] = None,
     status: Optional[str] = "active",
@@ -397,8 +241,22 @@ async def get_reports(
     Get pet reports with optional filters and search.
     Search queries across: pet_name, breed, location, description, and tags.
     Returns reports with image URLs ready for carousel display.
+    Listings are cached per normalized query until the next write to reports or
+    matches, and carry an ETag so polling clients get 304 when nothing changed.
     """
     try:
+        cache_key = listing_cache_key(await get_reports_version(), {
+            "report_type": report_type,
+            "pet_type": pet_type,
+            "status": status,
+            "search": search,
+            "limit": limit,
+            "skip": skip
+        })
+        cached = await get_cached_listing(cache_key)
+        if cached is not None:
+            return _conditional_response(request, response, cached)
+        
         # Build query
         query = {}
         if report_type:
@@ -435,8 +293,8 @@ async def get_reports(
             report_id_str = str(report.id)
             has_accepted_match = await PetMatch.find_one({
                 "$or": [
-                    {"lost_report_id": report_id_str},
-                    {"found_report_id": report_id_str}
+                    {"lost_report_id": report.id},
+                    {"found_report_id": report.id}
                 ],
                 "status": "accepted"
             }) is not None
@@ -463,69 +321,129 @@ async def get_reports(
                 "created_at": report.created_at.isoformat()
             })
         
-        return {
+        cached = await cache_listing(cache_key, {
             "status": "success",
             "count": len(result),
             "reports": result
-        }
+        })
+        return _conditional_response(request, response, cached)
     except Exception as e:
-        print(f"❌ Error fetching reports: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Error fetching reports: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/reports/{report_id}")
-async def get_report(report_id: str):
-    """Get a specific pet report by ID with all details including image carousel URLs."""
+async def get_report(report_id: str, request: Request, response: Response):
+    """
+    Get a specific pet report by ID with all details including image carousel URLs.
+    Responses are served from the report cache and carry an ETag; a matching
+    If-None-Match returns 304 without a body.
+    """
     try:
         from bson import ObjectId
         from bson.errors import InvalidId
         
         try:
-            report = await PetReport.get(ObjectId(report_id))
+            report_oid = ObjectId(report_id)
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid report ID format")
         
-        if not report:
-            raise HTTPException(status_code=404, detail="Report not found")
+        cached = await get_cached_report(str(report_oid))
+        if cached is None:
+            report = await PetReport.get(report_oid)
+            
+            if not report:
+                raise HTTPException(status_code=404, detail="Report not found")
+            
+            cached = await cache_report(str(report.id), {
+                "status": "success",
+                "report": {
+                    "report_id": str(report.id),
+                    "report_type": report.report_type,
+                    "pet_name": report.pet_name,
+                    "pet_type": report.pet_type,
+                    "image_urls": report.image_urls,  # Full list for carousel
+                    "image_count": len(report.image_urls),
+                    "tags": {
+                        "species": report.tags.species,
+                        "breed": report.tags.breed,
+                        "primary_color": report.tags.primary_color,
+                        "age_group": report.tags.age_group,
+                        "size": report.tags.size,
+                        "marks": report.tags.marks
+                    },
+                    "user_info": {
+                        "name": report.user_info.name,
+                        "email": report.user_info.email,
+                        "phone": report.user_info.phone,
+                        "location": report.user_info.location
+                    },
+                    "description": report.description,
+                    "status": report.status,
+                    "created_at": report.created_at.isoformat(),
+                    "updated_at": report.updated_at.isoformat()
+                }
+            })
         
-        return {
-            "status": "success",
-            "report": {
-                "report_id": str(report.id),
-                "report_type": report.report_type,
-                "pet_name": report.pet_name,
-                "pet_type": report.pet_type,
-                "image_urls": report.image_urls,  # Full list for carousel
-                "image_count": len(report.image_urls),
-                "tags": {
-                    "species": report.tags.species,
-                    "breed": report.tags.breed,
-                    "primary_color": report.tags.primary_color,
-                    "age_group": report.tags.age_group,
-                    "size": report.tags.size,
-                    "marks": report.tags.marks
-                },
-                "user_info": {
-                    "name": report.user_info.name,
-                    "email": report.user_info.email,
-                    "phone": report.user_info.phone,
-                    "location": report.user_info.location
-                },
-                "description": report.description,
-                "status": report.status,
-                "created_at": report.created_at.isoformat(),
-                "updated_at": report.updated_at.isoformat()
-            }
-        }
+        return _conditional_response(request, response, cached)
+    except HTTPException:
+        raise
     except Exception as e:
         if "not found" in str(e).lower():
             raise HTTPException(status_code=404, detail="Report not found")
-        print(f"❌ Error fetching report: {str(e)}")
+        logger.error(f"❌ Error fetching report: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Fields of a report that the match views need; keeps the $lookup payload small
+MATCH_REPORT_PROJECTION = {
+    "pet_name": 1,
+    "pet_type": 1,
+    "image_urls": 1,
+    "tags": 1,
+    "user_info.location": 1,
+    "description": 1,
+    "created_at": 1,
+}
+
+
+def _match_report_lookup(id_field: str, as_field: str) -> dict:
+    """Build a $lookup stage joining a match's report reference to pet_reports."""
+    return {
+        "$lookup": {
+            "from": PetReport.Settings.name,
+            "localField": id_field,
+            "foreignField": "_id",
+            "pipeline": [
+                {"$project": MATCH_REPORT_PROJECTION},
+            ],
+            "as": as_field,
+        }
+    }
+
+
+def _serialize_match_report(report: dict) -> dict:
+    """Convert a raw report document from the match pipeline into the API response format."""
+    tags = report.get("tags") or {}
+    return {
+        "report_id": str(report["_id"]),
+        "pet_name": report.get("pet_name"),
+        "pet_type": report.get("pet_type"),
+        "image_urls": report.get("image_urls") or [],
+        "tags": {
+            "species": tags.get("species"),
+            "breed": tags.get("breed"),
+            "primary_color": tags.get("primary_color"),
+            "age_group": tags.get("age_group"),
+            "size": tags.get("size"),
+            "marks": tags.get("marks")
+        },
+        "location": (report.get("user_info") or {}).get("location"),
+        "description": report.get("description"),
+        "created_at": report["created_at"].isoformat()
+    }
+
+
 @app.get("/api/matches")
 async def get_matches(
     report_id: Optional[str] = None,
@@ -535,71 +453,52 @@ async def get_matches(
     """
     Get pet matches. If report_id is provided, get matches for that specific report.
     Otherwise, get all pending matches.
+    Matches and both of their reports are fetched with a single aggregation.
     """
     try:
         query = {"status": status}
         
         if report_id:
+            from bson import ObjectId
+            from bson.errors import InvalidId
+            
+            try:
+                report_oid = ObjectId(report_id)
+            except InvalidId:
+                raise HTTPException(status_code=400, detail="Invalid report ID format")
+            
             # Get matches where this report is either lost or found
             query["$or"] = [
-                {"lost_report_id": report_id},
-                {"found_report_id": report_id}
+                {"lost_report_id": report_oid},
+                {"found_report_id": report_oid}
             ]
         
-        matches = await PetMatch.find(query).limit(limit).sort(-PetMatch.created_at).to_list()
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"created_at": -1}},
+            {"$limit": limit},
+            _match_report_lookup("lost_report_id", "lost_report"),
+            _match_report_lookup("found_report_id", "found_report"),
+            # Drop matches whose lost or found report no longer exists
+            {"$unwind": "$lost_report"},
+            {"$unwind": "$found_report"},
+        ]
+        matches = await PetMatch.aggregate(pipeline).to_list()
         
-        # Fetch full report details for each match
         result = []
         for match in matches:
             try:
-                from bson import ObjectId
-                lost_report = await PetReport.get(ObjectId(match.lost_report_id))
-                found_report = await PetReport.get(ObjectId(match.found_report_id))
-                
-                if lost_report and found_report:
-                    result.append({
-                        "match_id": str(match.id),
-                        "lost_report": {
-                            "report_id": str(lost_report.id),
-                            "pet_name": lost_report.pet_name,
-                            "pet_type": lost_report.pet_type,
-                            "image_urls": lost_report.image_urls,
-                            "tags": {
-                                "species": lost_report.tags.species,
-                                "breed": lost_report.tags.breed,
-                                "primary_color": lost_report.tags.primary_color,
-                                "age_group": lost_report.tags.age_group,
-                                "size": lost_report.tags.size,
-                                "marks": lost_report.tags.marks
-                            },
-                            "location": lost_report.user_info.location,
-                            "description": lost_report.description,
-                            "created_at": lost_report.created_at.isoformat()
-                        },
-                        "found_report": {
-                            "report_id": str(found_report.id),
-                            "pet_name": found_report.pet_name,
-                            "pet_type": found_report.pet_type,
-                            "image_urls": found_report.image_urls,
-                            "tags": {
-                                "species": found_report.tags.species,
-                                "breed": found_report.tags.breed,
-                                "primary_color": found_report.tags.primary_color,
-                                "age_group": found_report.tags.age_group,
-                                "size": found_report.tags.size,
-                                "marks": found_report.tags.marks
-                            },
-                            "location": found_report.user_info.location,
-                            "description": found_report.description,
-                            "created_at": found_report.created_at.isoformat()
-                        },
-                        "match_score": match.match_score,
-                        "matched_tags": match.matched_tags,
-                        "status": match.status,
-                        "created_at": match.created_at.isoformat()
-                    })
+                result.append({
+                    "match_id": str(match["_id"]),
+                    "lost_report": _serialize_match_report(match["lost_report"]),
+                    "found_report": _serialize_match_report(match["found_report"]),
+                    "match_score": match["match_score"],
+                    "matched_tags": match["matched_tags"],
+                    "status": match["status"],
+                    "created_at": match["created_at"].isoformat()
+                })
             except Exception as e:
-                print(f"⚠️ Error fetching match details: {str(e)}")
+                logger.warning(f"⚠️ Error fetching match details: {str(e)}")
                 continue
         
         return {
@@ -607,11 +506,81 @@ async def get_matches(
             "count": len(result),
             "matches": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error fetching matches: {str(e)}")
+        logger.error(f"❌ Error fetching matches: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# None until the first decision tells us whether the server supports transactions
+_transactions_supported: Optional[bool] = None
+
+
+async def _apply_match_decision(match_oid, new_status: str, decided_at: datetime, session=None) -> Optional[dict]:
+    """
+    Record a decision on a still-pending match. On accept, mark the Lost report as found and
+    supersede every other pending match for the same lost or found report.
+    Returns the updated match document, or None if the match is missing or already decided.
+    """
+    matches = PetMatch.get_motor_collection()
+    match = await matches.find_one_and_update(
+        {"_id": match_oid, "status": "pending"},
+        {"$set": {
+            "status": new_status,
+            "decision_made_by": "current_user",  # TODO: Get from auth token
+            "decision_made_at": decided_at,
+            "updated_at": decided_at
+        }},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if match is None or new_status != "accepted":
+        return match
+    
+    await PetReport.get_motor_collection().update_one(
+        {"_id": match["lost_report_id"]},
+        {"$set": {"status": "found", "updated_at": decided_at}},
+        session=session
+    )
+    superseded = await matches.update_many(
+        {
+            "_id": {"$ne": match_oid},
+            "status": "pending",
+            "$or": [
+                {"lost_report_id": match["lost_report_id"]},
+                {"found_report_id": match["found_report_id"]}
+            ]
+        },
+        {"$set": {"status": "superseded", "updated_at": decided_at}},
+        session=session
+    )
+    match["superseded_count"] = superseded.modified_count
+    return match
+
+
+async def _run_match_decision(match_oid, new_status: str, decided_at: datetime) -> Optional[dict]:
+    """Apply a match decision inside a transaction, or without one on a standalone server"""
+    global _transactions_supported
+    if _transactions_supported is not False:
+        client = PetMatch.get_motor_collection().database.client
+        try:
+            async with await client.start_session() as session:
+                # with_transaction retries transient errors such as write conflicts from concurrent swipes
+                result = await session.with_transaction(
+                    lambda s: _apply_match_decision(match_oid, new_status, decided_at, session=s)
+                )
+            _transactions_supported = True
+            return result
+        except OperationFailure as e:
+            # IllegalOperation: transactions need a replica set or mongos
+            if e.code != 20:
+                raise
+            _transactions_supported = False
+            logger.info("ℹ️ MongoDB transactions unavailable, applying match decisions without them")
+    return await _apply_match_decision(match_oid, new_status, decided_at)
+
+
 @app.post("/api/matches/{match_id}/decision")
 async def handle_match_decision(
     match_id: str,
@@ -620,74 +589,236 @@ async def handle_match_decision(
     """
     Handle match decision - accept or reject a match.
     Accepts decision as query parameter: ?decision=accept or ?decision=reject
-    When accepted, updates the Lost pet report status to "found".
+    When accepted, updates the Lost pet report status to "found" and supersedes
+    the other pending matches for the same lost or found report.
+    The decision only applies if the match is still pending, so concurrent swipes
+    cannot both accept it.
     """
     try:
         from bson import ObjectId
         from bson.errors import InvalidId
         
         try:
-            match = await PetMatch.get(ObjectId(match_id))
+            match_oid = ObjectId(match_id)
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid match ID")
         
-        if not match:
-            raise HTTPException(status_code=404, detail="Match not found")
-        
-        if match.status != "pending":
-            raise HTTPException(status_code=400, detail=f"Match already {match.status}")
-        
-        # Update match status
         decision_lower = decision.lower() if decision else "reject"
         if decision_lower == "accept":
-            match.status = "accepted"
-            
-            # Update the Lost pet report status to "found"
-            try:
-                lost_report = await PetReport.get(ObjectId(match.lost_report_id))
-                if lost_report:
-                    lost_report.status = "found"
-                    lost_report.updated_at = datetime.utcnow()
-                    await lost_report.save()
-                    print(f"✅ Updated Lost report {match.lost_report_id} status to 'found'")
-            except Exception as e:
-                print(f"⚠️ Error updating report status: {str(e)}")
-                
+            new_status = "accepted"
         elif decision_lower == "reject":
-            match.status = "rejected"
+            new_status = "rejected"
         else:
             raise HTTPException(status_code=400, detail="Decision must be 'accept' or 'reject'")
         
-        match.decision_made_by = "current_user"  # TODO: Get from auth token
-        match.decision_made_at = datetime.utcnow()
-        match.updated_at = datetime.utcnow()
+        match = await _run_match_decision(match_oid, new_status, datetime.utcnow())
         
-        await match.save()
+        if match is None:
+            # Tell apart a missing match from one that was already decided
+            existing = await PetMatch.get_motor_collection().find_one({"_id": match_oid}, {"status": 1})
+            if not existing:
+                raise HTTPException(status_code=404, detail="Match not found")
+            raise HTTPException(status_code=400, detail=f"Match already {existing.get('status')}")
+        
+        if new_status == "accepted":
+            logger.info(f"✅ Updated Lost report {match['lost_report_id']} status to 'found', superseded {match['superseded_count']} pending match(es)")
+        
+        # Report detail responses include status, so drop any cached copies
+        await invalidate_reports(match["lost_report_id"], match["found_report_id"])
+        await bump_reports_version()
         
         return {
             "status": "success",
             "message": f"Match {decision_lower}ed successfully",
             "match": {
-                "match_id": str(match.id),
-                "status": match.status,
-                "decision_made_at": match.decision_made_at.isoformat()
+                "match_id": str(match["_id"]),
+                "status": match["status"],
+                "decision_made_at": match["decision_made_at"].isoformat()
             }
         }
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error handling match decision: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Error handling match decision: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+MAX_EXPORT_BATCH_SIZE = 5000
+
+
+def _validate_export_params(format: str, batch_size: int):
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_MEDIA_TYPES)}")
+    if batch_size < 1 or batch_size > MAX_EXPORT_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"batch_size must be between 1 and {MAX_EXPORT_BATCH_SIZE}")
+
+
+def _parse_after_id(after_id: Optional[str], updated_since: Optional[datetime]):
+    """The resume cursor's ObjectId, or None. Only meaningful together with updated_since."""
+    if after_id is None:
+        return None
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    if updated_since is None:
+        raise HTTPException(status_code=400, detail="after_id requires updated_since")
+    try:
+        return ObjectId(after_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid after_id")
+
+
+def _export_response(body, format: str, name: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/export/reports", dependencies=[Depends(require_admin)])
+async def export_reports(
+    format: str = "ndjson",
+    report_type: Optional[str] = None,
+    pet_type: Optional[str] = None,
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    batch_size: int = 500
+):
+    """
+    Stream a full dump of pet reports as NDJSON or CSV (admin only; includes contact details).
+    With updated_since, only reports changed at or after that time are exported, ordered by
+    updated_at then _id. To resume, pass the last row's updated_at and report_id as after_id.
+    """
+    _validate_export_params(format, batch_size)
+    after_oid = _parse_after_id(after_id, updated_since)
+    query = build_export_query({
+        "report_type": report_type,
+        "pet_type": pet_type,
+        "status": status,
+        "user_id": user_id
+    }, updated_since, after_oid)
+    body = stream_export(
+        PetReport.get_motor_collection(), query, REPORT_EXPORT_PROJECTION,
+        export_sort(updated_since is not None), batch_size, format,
+        report_record, report_csv_row, REPORT_CSV_COLUMNS
+    )
+    return _export_response(body, format, "pet-reports")
+
+
+@app.get("/api/export/matches", dependencies=[Depends(require_admin)])
+async def export_matches(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    batch_size: int = 500
+):
+    """
+    Stream a full dump of pet matches as NDJSON or CSV (admin only).
+    With updated_since, only matches changed at or after that time are exported, ordered by
+    updated_at then _id. To resume, pass the last row's updated_at and match_id as after_id.
+    """
+    _validate_export_params(format, batch_size)
+    after_oid = _parse_after_id(after_id, updated_since)
+    query = build_export_query({"status": status}, updated_since, after_oid)
+    body = stream_export(
+        PetMatch.get_motor_collection(), query, MATCH_EXPORT_PROJECTION,
+        export_sort(updated_since is not None), batch_size, format,
+        match_record, match_csv_row, MATCH_CSV_COLUMNS
+    )
+    return _export_response(body, format, "pet-matches")
+
+
+@app.api_route("/api/images/{key:path}", methods=["GET", "HEAD"])
+async def get_image(key: str, request: Request, w: Optional[int] = None):
+    """
+    Serve a locally stored image. Supports Range, ETag/If-None-Match and
+    ?w=<width> to pick the closest stored variant. Keys are content-addressed,
+    so responses are cacheable forever.
+    """
+    storage = get_local_storage()
+    if storage is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if w is not None and w <= 0:
+        raise HTTPException(status_code=400, detail="w must be a positive width")
+    return await image_response(storage, key, request.headers, w)
+
+@app.get("/api/stream")
+async def event_stream(request: Request, events: Optional[str] = None):
+    """
+    Server-sent events for new matches, match decisions and report status changes.
+    ?events=new_match,match_decision limits the stream to those types. A resync
+    event means events were missed and the client should refetch.
+    """
+    types = frozenset(name.strip() for name in events.split(",") if name.strip()) if events else frozenset()
+    unknown = types - set(EVENT_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(sorted(unknown))}")
+    if event_broker.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Too many event subscribers (limit {EVENT_MAX_SUBSCRIBERS})",
+            headers={"Retry-After": "30"}
+        )
+    return StreamingResponse(
+        stream_events(event_broker, types, resumed="last-event-id" in request.headers),
+        media_type="text/event-stream",
+        # No caching, and no buffering by nginx-style proxies, which would hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Process metrics in the Prometheus text format"""
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """Saved request profiles, newest first"""
+    return {"profiles": list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Download a saved profile (HTML from pyinstrument, or collapsed stacks)"""
+    found = find_profile(profile_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path, media_type = found
+    return FileResponse(path, media_type=media_type)
+
+@app.get("/api/admin/limits", dependencies=[Depends(require_admin)])
+async def get_limits():
+    """Upload admission limits and current load on this worker"""
+    return admission.status()
+
+@app.put("/api/admin/limits", dependencies=[Depends(require_admin)])
+async def update_limits(update: LimitsUpdate):
+    """Change upload admission limits on this worker; omitted fields are left as they are"""
+    try:
+        admission.update(**update.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return admission.status()
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness probe: live round trips to MongoDB, storage and Gemini, cached briefly.
+    503 only when a required check fails; optional failures report "degraded" with 200.
+    """
+    result = await get_readiness()
+    return JSONResponse(result, status_code=503 if result["status"] == "not_ready" else 200)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,227 @@
+"""
+Matching between Lost and Found reports.
+
+A Lost and a Found report match when species, breed and primary color all agree,
+ignoring case. Candidate retrieval pushes that filter into MongoDB (a
+case-insensitive collation backed by the match_candidates index), and pairing is
+a hash join on the normalized tag triple, so one pass can match any number of
+new reports with one query per (report type, pet type) group.
+"""
+
+from typing import List, Tuple, Iterable
+from pymongo.collation import Collation
+
+from models import PetReport, PetTags, PetMatch
+from email_service import send_match_notification
+from structured_log import get_logger
+from metrics import MATCHES_CREATED
+
+logger = get_logger("matching")
+
+MATCH_TAGS = ["species", "breed", "primary_color"]
+
+# Strength 2 compares case-insensitively, matching the str.lower() comparison in calculate_match_score
+MATCH_COLLATION = Collation(locale="en", strength=2)
+
+# Fields needed to pair reports and notify owners
+CANDIDATE_PROJECTION = {
+    "report_type": 1,
+    "pet_type": 1,
+    "pet_name": 1,
+    "image_urls": 1,
+    "tags": 1,
+    "user_info": 1,
+}
+
+EXISTING_MATCH_CHUNK = 1000
+
+
+def calculate_match_score(tags1: PetTags, tags2: PetTags) -> tuple[int, List[str]]:
+    """
+    Calculate match score between two pet tags.
+    Returns (score, matched_tags) where score is 0-3 and matched_tags are the matching tag names.
+    """
+    matched_tags = []
+    score = 0
+
+    # Compare species
+    if tags1.species.lower() == tags2.species.lower():
+        score += 1
+        matched_tags.append("species")
+
+    # Compare breed
+    if tags1.breed.lower() == tags2.breed.lower():
+        score += 1
+        matched_tags.append("breed")
+
+    # Compare primary color
+    if tags1.primary_color.lower() == tags2.primary_color.lower():
+        score += 1
+        matched_tags.append("primary_color")
+
+    return score, matched_tags
+
+
+def match_key(tags: dict) -> tuple:
+    """Normalized (species, breed, primary_color); two reports match when their keys are equal"""
+    return tuple(str(tags.get(name) or "").lower() for name in MATCH_TAGS)
+
+
+def report_to_doc(report: PetReport) -> dict:
+    """Raw-document view of a report with the fields matching uses"""
+    return {
+        "_id": report.id,
+        "report_type": report.report_type,
+        "pet_type": report.pet_type,
+        "pet_name": report.pet_name,
+        "image_urls": report.image_urls,
+        "tags": report.tags.model_dump(),
+        "user_info": report.user_info.model_dump(),
+    }
+
+
+async def fetch_candidates(report_type: str, pet_type: str, keys: Iterable[tuple]) -> List[dict]:
+    """
+    Active reports of report_type and pet_type whose tags could equal one of keys.
+    The per-field $in is a superset of the exact triples; pair_matches does the exact check.
+    """
+    keys = list(keys)
+    query = {
+        "report_type": report_type,
+        "status": "active",
+        "pet_type": pet_type,
+    }
+    for position, name in enumerate(MATCH_TAGS):
+        query[f"tags.{name}"] = {"$in": sorted({key[position] for key in keys})}
+    cursor = PetReport.get_motor_collection().find(query, CANDIDATE_PROJECTION, collation=MATCH_COLLATION)
+    return await cursor.to_list(length=None)
+
+
+def pair_matches(new_reports: List[dict], candidates: List[dict]) -> List[Tuple[dict, dict]]:
+    """Hash-join new reports against candidates of the opposite type. Returns (lost, found) pairs."""
+    by_key = {}
+    for candidate in candidates:
+        by_key.setdefault(match_key(candidate["tags"]), []).append(candidate)
+
+    pairs = []
+    for report in new_reports:
+        for candidate in by_key.get(match_key(report["tags"]), []):
+            # Skip if it's the same report
+            if candidate["_id"] == report["_id"]:
+                continue
+            if report["report_type"] == "Found":
+                pairs.append((candidate, report))
+            else:
+                pairs.append((report, candidate))
+    return pairs
+
+
+async def persist_matches(pairs: List[Tuple[dict, dict]]) -> List[Tuple[dict, dict]]:
+    """Insert PetMatch records for pairs that don't have one yet. Returns the pairs that were created."""
+    unique = {}
+    for lost, found in pairs:
+        unique.setdefault((lost["_id"], found["_id"]), (lost, found))
+    if not unique:
+        return []
+
+    # Look up existing matches in chunks; $in on both fields is a superset, filtered exactly below
+    existing = set()
+    keys = list(unique)
+    collection = PetMatch.get_motor_collection()
+    for start in range(0, len(keys), EXISTING_MATCH_CHUNK):
+        chunk = keys[start:start + EXISTING_MATCH_CHUNK]
+        cursor = collection.find(
+            {
+                "lost_report_id": {"$in": list({lost_id for lost_id, _ in chunk})},
+                "found_report_id": {"$in": list({found_id for _, found_id in chunk})}
+            },
+            {"lost_report_id": 1, "found_report_id": 1}
+        )
+        async for doc in cursor:
+            existing.add((doc["lost_report_id"], doc["found_report_id"]))
+
+    created = [pair for key, pair in unique.items() if key not in existing]
+    if created:
+        await PetMatch.insert_many([
+            PetMatch(
+                lost_report_id=lost["_id"],
+                found_report_id=found["_id"],
+                match_score=len(MATCH_TAGS),
+                matched_tags=list(MATCH_TAGS),
+                status="pending"
+            )
+            for lost, found in created
+        ])
+    return created
+
+
+async def notify_matches(created: List[Tuple[dict, dict]]):
+    """Queue an email to each lost pet's owner; the outbox coalesces several matches into a digest"""
+    for lost, found in created:
+        try:
+            lost_user = lost.get("user_info") or {}
+            found_image_url = found["image_urls"][0] if found.get("image_urls") else None
+            email_queued = await send_match_notification(
+                recipient_email=lost_user.get("email"),
+                recipient_name=lost_user.get("name"),
+                pet_name=lost.get("pet_name") or "your pet",
+                found_pet_image_url=found_image_url,
+                match_details={
+                    'matched_tags': list(MATCH_TAGS),
+                    'location': (found.get("user_info") or {}).get("location")
+                }
+            )
+            if email_queued:
+                logger.debug("📧 Email notification queued", extra={"fields": {"recipient": lost_user.get("email")}})
+            else:
+                logger.warning("⚠️ Email notification could not be queued (check email configuration)")
+        except Exception as email_err:
+            # Don't fail the match creation if email fails
+            logger.warning(f"⚠️ Error queueing email notification: {str(email_err)}")
+
+
+async def find_matches_bulk(new_reports: List[dict]) -> int:
+    """
+    Match a set of new reports (raw documents) against active reports of the opposite type,
+    create PetMatch records for perfect 3/3 matches and queue notifications.
+    Returns the number of matches created.
+    """
+    groups = {}
+    for report in new_reports:
+        search_type = "Lost" if report["report_type"] == "Found" else "Found"
+        groups.setdefault((search_type, report["pet_type"]), []).append(report)
+
+    pairs = []
+    for (search_type, pet_type), reports in groups.items():
+        candidates = await fetch_candidates(search_type, pet_type, {match_key(r["tags"]) for r in reports})
+        logger.debug("🔍 Searching for matches", extra={"fields": {
+            "search_type": search_type, "pet_type": pet_type, "candidates": len(candidates), "reports": len(reports)
+        }})
+        pairs.extend(pair_matches(reports, candidates))
+
+    created = await persist_matches(pairs)
+    MATCHES_CREATED.inc(len(created))
+    for lost, found in created:
+        logger.info("✅ Match created", extra={"fields": {"lost_report_id": str(lost["_id"]), "found_report_id": str(found["_id"])}})
+    await notify_matches(created)
+    return len(created)
+
+
+async def find_matches(new_report: PetReport) -> int:
+    """
+    Find matching reports when a new report is created.
+    If new report is 'Found', match with 'Lost' reports.
+    If new report is 'Lost', match with 'Found' reports.
+    Create PetMatch records for matches with score >= 3 (perfect matches).
+    Returns the number of matches created (0 if matching failed).
+    """
+    try:
+        matches_created = await find_matches_bulk([report_to_doc(new_report)])
+
+        if matches_created == 0:
+            logger.debug("ℹ️ No perfect matches found (need 3/3 tags to match)", extra={"fields": {"report_id": str(new_report.id)}})
+        return matches_created
+
+    except Exception as e:
+        logger.error(f"⚠️ Error finding matches: {str(e)}", exc_info=True)
+        return 0
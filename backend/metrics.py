@@ -0,0 +1,263 @@
+"""
+In-process metrics exposed at /api/metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in module-level dicts keyed by label
+values, so recording a sample is a dict lookup and an addition. Everything is
+updated from the event loop; nothing here is shared with worker threads.
+
+MetricsMiddleware times every HTTP request by route template (the path with
+{placeholders}, not the raw URL), which keeps label cardinality bounded.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from structured_log import log_queue_depth
+
+# Request latencies, from cache hits (~ms) up to slow Gemini calls (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down. With function=, it is read at scrape time instead."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                value = None
+            return [] if value is None else [f"{self.name} {_format_value(value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: dict):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Context manager that observes the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+# Report ingestion pipeline (POST /api/reports)
+REPORT_STAGE_SECONDS = Histogram(
+    "report_stage_duration_seconds", "Time spent in each report creation stage", ["stage"]
+)
+
+# Gemini
+AI_REQUEST_SECONDS = Histogram("ai_request_duration_seconds", "Gemini generateContent latency per attempt", ["model"])
+AI_ATTEMPTS = Counter("ai_model_attempts_total", "Gemini model attempts by outcome", ["model", "outcome"])
+AI_FAILURES = Counter("ai_analysis_failures_total", "Image analyses that failed on every model")
+
+# Cache
+CACHE_REQUESTS = Counter("cache_requests_total", "Response cache lookups", ["kind", "result"])
+
+# Matching
+MATCHES_CREATED = Counter("matches_created_total", "PetMatch records created")
+
+# Email
+EMAIL_NOTIFICATIONS = Counter(
+    "email_notifications_total",
+    "Notification outbox events; 'saved' counts notifications folded into a digest",
+    ["event"]
+)
+EMAIL_SEND_SECONDS = Histogram("email_send_duration_seconds", "SMTP delivery time per message")
+EMAIL_BATCH_IN_FLIGHT = Gauge("email_outbox_in_flight", "Outbox messages claimed and being delivered")
+
+# Server-sent events (/api/stream)
+EVENT_SUBSCRIBERS = Gauge("event_stream_subscribers", "Open /api/stream connections")
+EVENTS_PUBLISHED = Counter("events_published_total", "Events fanned out to stream subscribers", ["event"])
+EVENT_OVERFLOWS = Counter("event_subscriber_overflows_total", "Times a slow subscriber's queue filled and was reset to a resync")
+
+# Admission control (POST /api/reports)
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Report uploads admitted and being processed")
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Report uploads waiting for a slot")
+ADMISSION_WAIT_SECONDS = Histogram("admission_wait_seconds", "Time an admitted upload waited for a slot and an AI token")
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Report uploads turned away", ["reason"])
+ADMISSION_LIMIT = Gauge("admission_limit", "Current admission limits", ["limit"])
+
+# Readiness probe (/api/ready)
+DEPENDENCY_CHECK_SECONDS = Histogram(
+    "dependency_check_duration_seconds", "Round-trip latency of readiness checks", ["check"]
+)
+DEPENDENCY_UP = Gauge("dependency_up", "1 if the last readiness check of a dependency passed, else 0", ["check"])
+
+# Logging
+LOG_QUEUE_DEPTH = Gauge("log_queue_depth", "Log records waiting for the writer thread", function=log_queue_depth)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and in-flight count for HTTP requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
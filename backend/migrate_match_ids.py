@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Migration script to convert PetMatch report references from strings to ObjectIds.
+
+Safe to run while the API is serving traffic: only documents that still hold
+string ids are touched, each update is conditional on the old value, and the
+script can be re-run until nothing is left to convert.
+"""
+
+import asyncio
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from config import settings
+
+
+BATCH_SIZE = 500
+
+def _to_object_id(value):
+    """Convert a stored report reference to an ObjectId, or None if it is not a valid id"""
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+async def migrate():
+    """Rewrite string lost_report_id/found_report_id values in pet_matches as ObjectIds"""
+    try:
+        client = AsyncIOMotorClient(settings.mongo_uri)
+        db = client[settings.mongo_db]
+        print("✅ Connected to MongoDB\n")
+        
+        query = {
+            "$or": [
+                {"lost_report_id": {"$type": "string"}},
+                {"found_report_id": {"$type": "string"}}
+            ]
+        }
+        remaining = await db.pet_matches.count_documents(query)
+        print(f"Found {remaining} matches with string report ids")
+        
+        converted = 0
+        invalid = 0
+        operations = []
+        cursor = db.pet_matches.find(query, {"lost_report_id": 1, "found_report_id": 1})
+        async for doc in cursor:
+            lost_id = _to_object_id(doc.get("lost_report_id"))
+            found_id = _to_object_id(doc.get("found_report_id"))
+            if lost_id is None or found_id is None:
+                invalid += 1
+                print(f"  ⚠️ Skipping match {doc['_id']}: invalid report id")
+                continue
+            
+            # Only update if the document still holds the values we read
+            operations.append(UpdateOne(
+                {
+                    "_id": doc["_id"],
+                    "lost_report_id": doc.get("lost_report_id"),
+                    "found_report_id": doc.get("found_report_id")
+                },
+                {"$set": {"lost_report_id": lost_id, "found_report_id": found_id}}
+            ))
+            if len(operations) >= BATCH_SIZE:
+                result = await db.pet_matches.bulk_write(operations, ordered=False)
+                converted += result.modified_count
+                operations = []
+                print(f"  Converted {converted} matches so far...")
+        
+        if operations:
+            result = await db.pet_matches.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        
+        print(f"\n✅ Migration complete!")
+        print(f"   Converted {converted} matches")
+        print(f"   Skipped {invalid} matches with invalid ids")
+        
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,5 +1,6 @@
-from beanie import Document
-from pydantic import BaseModel
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import IndexModel
 from typing import List, Optional
 from datetime import datetime
 
@@ -46,9 +47,14 @@ class PetReport(Document):
     # Status tracking
     status: str = "active"  # active, found, closed
     
+    # Idempotency key for bulk imports (sha256 of the image), None for reports created through the API
+    import_key: Optional[str] = None
+    # False until an import's matching pass has covered the report; None for API reports, matched on create
+    import_matched: Optional[bool] = None
+    
     # Timestamps
-    created_at: datetime = datetime.utcnow()
-    updated_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "pet_reports"
@@ -57,27 +63,51 @@ class PetReport(Document):
             "pet_type",
             "status",
             "created_at",
-            [("location", "2dsphere")]  # Geospatial index for location-based queries
+            "updated_at",  # Incremental exports
+            "image_urls",  # Lets ingestion scripts skip images that already have a report
+            [("location", "2dsphere")],  # Geospatial index for location-based queries
+            # Partial rather than sparse: API reports store import_key as null, which a sparse index still indexes
+            IndexModel(
+                [("import_key", 1)],
+                name="import_key",
+                unique=True,
+                partialFilterExpression={"import_key": {"$type": "string"}}
+            ),
+            # Imported reports still waiting for a matching pass
+            IndexModel(
+                [("import_matched", 1)],
+                name="import_unmatched",
+                partialFilterExpression={"import_matched": False}
+            ),
+            # Candidate lookup for matching; queries must use the same case-insensitive collation
+            IndexModel(
+                [
+                    ("report_type", 1), ("pet_type", 1), ("status", 1),
+                    ("tags.species", 1), ("tags.breed", 1), ("tags.primary_color", 1)
+                ],
+                name="match_candidates",
+                collation={"locale": "en", "strength": 2}
+            )
         ]
 
 
 # Match between Lost and Found reports
 class PetMatch(Document):
-    lost_report_id: str  # ID of the Lost pet report
-    found_report_id: str  # ID of the Found pet report
+    lost_report_id: PydanticObjectId  # _id of the Lost pet report
+    found_report_id: PydanticObjectId  # _id of the Found pet report
     
     # Match details
     match_score: int  # Number of matching tags (0-3)
     matched_tags: List[str]  # Which tags matched (e.g., ["species", "breed", "primary_color"])
     
     # Decision tracking
-    status: str = "pending"  # pending, accepted, rejected
+    status: str = "pending"  # pending, accepted, rejected, superseded (another match was accepted)
     decision_made_by: Optional[str] = None  # User who made the decision
     decision_made_at: Optional[datetime] = None
     
     # Timestamps
-    created_at: datetime = datetime.utcnow()
-    updated_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "pet_matches"
@@ -86,6 +116,41 @@ class PetMatch(Document):
             "found_report_id",
             "status",
             "match_score",
-            "created_at"
+            "created_at",
+            "updated_at"  # Incremental exports
         ]
 
+
+
+# Queued email notification, delivered by the background outbox sender
+class EmailOutbox(Document):
+    recipient_email: str
+    recipient_name: str
+    items: List[dict]  # One entry per match: pet_name, found_pet_image_url, match_details (several = digest)
+    
+    # Delivery tracking
+    status: str = "pending"  # pending, sending, sent, dead
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    locked_until: Optional[datetime] = None  # Lease held by the sender while status is 'sending'
+    last_error: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "email_outbox"
+        indexes = [
+            [("status", 1), ("next_attempt_at", 1)],
+            [("recipient_email", 1), ("status", 1), ("sent_at", 1)],  # Per-recipient rate cap
+            # At most one open (not yet attempted) message per recipient, which new matches are merged into
+            IndexModel(
+                [("recipient_email", 1)],
+                name="open_message_per_recipient",
+                unique=True,
+                partialFilterExpression={"status": "pending", "attempts": 0}
+            ),
+            "created_at"
+        ]
@@ -1,20 +1,40 @@
 #!/usr/bin/env python3
 """
 Automated script to populate the gallery with scraped images.
-Downloads images from S3, runs AI analysis, and creates pet reports in MongoDB.
+Reads images from storage (S3, or local disk), runs AI analysis, and creates pet reports in MongoDB.
+
+Keys are listed page by page and streamed into a bounded pool of workers, with
+Gemini calls paced by a token bucket, and reports are written with batched
+insert_many calls. Images that already have a report are skipped, so an
+interrupted run can simply be restarted.
+
+Throughput is bound by --ai-rate, not by the workers: every image costs one
+Gemini call. The default of 2 calls/sec stays inside a modest quota, but it
+makes 10k images take about 83 minutes. A run only finishes in minutes if the
+project's quota allows it. For example, --ai-rate 20 with --concurrency 32
+takes about 8 minutes, if Gemini sustains that rate.
+
+Set S3_ENDPOINT_URL to run against a local S3 stand-in, or STORAGE_BACKEND=local
+to ingest what image_scraper.py stored on local disk.
+
+Usage:
+    python populate_gallery.py --num-images 500 --concurrency 8 --ai-rate 2
 """
 
-import os
+import time
 import asyncio
-import httpx
-from dotenv import load_dotenv
+import argparse
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
+from config import settings
 from models import PetReport, PetTags, UserInfo
 from ai_service import analyze_pet_image
-from s3_config import s3_client
+from storage import get_storage, ListedObject
+from cache import bump_reports_version, cache_is_shared, STALE_CACHE_WARNING
+from rate_limit import TokenBucket
 
-load_dotenv()
 
 # Sample locations for variety
 SAMPLE_LOCATIONS = [
@@ -31,181 +51,287 @@ SAMPLE_USERS = [
     {"name": "Pet Finder", "email": "finder@petfinder.com", "phone": "555-0105"},
 ]
 
-async def download_image_from_url(url: str) -> tuple[bytes, str]:
-    """Download image from S3 URL and return bytes and content type"""
+async def read_stored_image(storage, image: ListedObject) -> tuple[bytes, str]:
+    """Read an image from storage and return bytes and content type"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            return response.content, content_type
+        return await storage.get(image.key)
     except Exception as e:
-        print(f"❌ Error downloading {url}: {str(e)}")
+        print(f"❌ Error reading {image.key}: {str(e)}")
         raise
 
-async def create_pet_report_from_image(image_url: str, report_type: str = "Found", index: int = 0):
-    """Download image, analyze with AI, and create a pet report"""
+async def build_pet_report_from_image(
+    storage,
+    ai_bucket: TokenBucket,
+    image: ListedObject,
+    report_type: str = "Found",
+    index: int = 0
+) -> PetReport:
+    """Read image, analyze with AI, and build an unsaved pet report"""
+    # 1. Read image from storage
+    image_bytes, mime_type = await read_stored_image(storage, image)
+    
+    # 2. Run AI analysis
+    await ai_bucket.acquire()
     try:
-        print(f"\n📸 Processing image {index + 1}: {image_url[:60]}...")
-        
-        # 1. Download image from S3
-        print("   1️⃣ Downloading image from S3...")
-        image_bytes, mime_type = await download_image_from_url(image_url)
-        print(f"      ✅ Downloaded {len(image_bytes)} bytes")
-        
-        # 2. Run AI analysis
-        print("   2️⃣ Analyzing image with AI...")
+        tags_data = await analyze_pet_image(image_bytes, mime_type)
+        # Ensure all required fields are present
+        if "size" not in tags_data:
+            tags_data["size"] = "Unknown"
+    except Exception as e:
+        print(f"   ⚠️  AI analysis failed for image {index + 1}: {str(e)}")
+        tags_data = {
+            "species": "Unknown", "breed": "Mixed", "primary_color": "Unknown",
+            "age_group": "Adult", "marks": [], "size": "Unknown"
+        }
+    
+    # 3. Determine pet type from species
+    pet_type = tags_data.get('species', 'Unknown')
+    if pet_type.lower() in ['dog', 'puppy']:
+        pet_type = 'Dog'
+    elif pet_type.lower() in ['cat', 'kitten']:
+        pet_type = 'Cat'
+    else:
+        pet_type = 'Other'
+    
+    # 4. Create user info
+    user_data = SAMPLE_USERS[index % len(SAMPLE_USERS)]
+    location = SAMPLE_LOCATIONS[index % len(SAMPLE_LOCATIONS)]
+    
+    user_info = UserInfo(
+        name=user_data["name"],
+        email=user_data["email"],
+        phone=user_data["phone"],
+        location=location
+    )
+    
+    # 5. Build pet report
+    return PetReport(
+        user_id="scraper_bot",
+        report_type=report_type,
+        pet_name=None,
+        pet_type=pet_type,
+        user_info=user_info,
+        image_urls=[image.url],
+        tags=PetTags(**tags_data),
+        description=f"Found pet - {tags_data.get('breed', 'Unknown breed')} {tags_data.get('primary_color', '')} {tags_data.get('species', 'pet')}"
+    )
+
+class IngestionStats:
+    """Progress and throughput counters for one populate run"""
+
+    def __init__(self, target: int):
+        self.target = target
+        self.started = time.monotonic()
+        self.skipped = 0
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def progress(self):
+        print(f"   📈 {self.processed}/{self.target} processed, {self.created} saved, "
+              f"{self.failed} failed, {self.rate():.2f} images/sec")
+
+async def iter_not_ingested(
+    images: AsyncIterator[ListedObject], stats: IngestionStats, batch_size: int = 500
+) -> AsyncIterator[ListedObject]:
+    """
+    Drop images that already have a report. Existing reports act as the ingestion
+    ledger, so reruns pick up where a previous run stopped. Image URLs are checked
+    in batches as they stream in.
+    """
+    collection = PetReport.get_motor_collection()
+    
+    async def pending_in(chunk):
+        urls = [image.url for image in chunk]
+        done = set(await collection.distinct("image_urls", {"image_urls": {"$in": urls}}))
+        stats.skipped += len(done.intersection(urls))
+        return [image for image in chunk if image.url not in done]
+    
+    chunk = []
+    async for image in images:
+        chunk.append(image)
+        if len(chunk) >= batch_size:
+            for pending_image in await pending_in(chunk):
+                yield pending_image
+            chunk = []
+    if chunk:
+        for pending_image in await pending_in(chunk):
+            yield pending_image
+
+async def _ingest_worker(queue, results, storage, ai_bucket, report_type, stats):
+    while True:
+        job = await queue.get()
+        if job is None:
+            return
+        index, image = job
         try:
-            tags_data = await analyze_pet_image(image_bytes, mime_type)
-            print(f"      ✅ AI Results: {tags_data.get('species')}, {tags_data.get('breed')}, {tags_data.get('primary_color')}")
-            # Ensure all required fields are present
-            if "size" not in tags_data:
-                tags_data["size"] = "Unknown"
+            report = await build_pet_report_from_image(storage, ai_bucket, image, report_type, index)
+            await results.put(report)
         except Exception as e:
-            print(f"      ⚠️  AI analysis failed: {str(e)}")
-            tags_data = {
-                "species": "Unknown", "breed": "Mixed", "primary_color": "Unknown",
-                "age_group": "Adult", "marks": [], "size": "Unknown"
-            }
-        
-        # 3. Determine pet type from species
-        pet_type = tags_data.get('species', 'Unknown')
-        if pet_type.lower() in ['dog', 'puppy']:
-            pet_type = 'Dog'
-        elif pet_type.lower() in ['cat', 'kitten']:
-            pet_type = 'Cat'
-        else:
-            pet_type = 'Other'
-        
-        # 4. Create user info
-        user_data = SAMPLE_USERS[index % len(SAMPLE_USERS)]
-        location = SAMPLE_LOCATIONS[index % len(SAMPLE_LOCATIONS)]
-        
-        user_info = UserInfo(
-            name=user_data["name"],
-            email=user_data["email"],
-            phone=user_data["phone"],
-            location=location
-        )
-        
-        # 5. Create pet report
-        report = PetReport(
-            user_id="scraper_bot",
-            report_type=report_type,
-            pet_name=None,
-            pet_type=pet_type,
-            user_info=user_info,
-            image_urls=[image_url],
-            tags=PetTags(**tags_data),
-            description=f"Found pet - {tags_data.get('breed', 'Unknown breed')} {tags_data.get('primary_color', '')} {tags_data.get('species', 'pet')}"
-        )
-        
-        # 6. Save to MongoDB
-        await report.insert()
-        print(f"   3️⃣ ✅ Saved to MongoDB with ID: {report.id}")
-        
-        return report
-        
-    except Exception as e:
-        print(f"   ❌ Error creating report: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
+            print(f"   ❌ Failed to create report for image {index + 1}: {str(e)}")
+            stats.failed += 1
+            stats.processed += 1
 
-def get_existing_s3_urls_from_bucket(bucket_name: str, prefix: str = "scraped-images/", limit: int = 10):
-    """Get existing S3 URLs from the scraped-images bucket"""
-    try:
-        print(f"📦 Listing objects from S3 bucket: {bucket_name} (prefix: {prefix})")
-        response = s3_client.list_objects_v2(
-            Bucket=bucket_name,
-            Prefix=prefix,
-            MaxKeys=limit * 2  # Get more to account for folders
-        )
-        
-        if 'Contents' not in response:
-            print("⚠️  No objects found in scraped-images bucket")
-            return []
-        
-        # Filter for image files and build URLs
-        s3_urls = []
-        region = os.getenv("AWS_REGION", "us-east-1")
-        
-        for obj in response['Contents']:
-            key = obj['Key']
-            # Skip map images - filter out any images that might be maps
-            if 'map' in key.lower():
-                continue
-            # Only include actual image files (not folders)
-            if any(key.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif']):
-                url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{key}"
-                s3_urls.append(url)
-                if len(s3_urls) >= limit:
-                    break
-        
-        print(f"✅ Found {len(s3_urls)} existing images in S3")
-        return s3_urls
-        
-    except Exception as e:
-        print(f"❌ Error listing S3 objects: {str(e)}")
-        return []
+async def _report_writer(results, batch_size, stats):
+    batch = []
+    
+    async def flush():
+        if not batch:
+            return
+        try:
+            await PetReport.insert_many(batch)
+            stats.created += len(batch)
+        except Exception as e:
+            print(f"   ❌ Failed to save {len(batch)} reports: {str(e)}")
+            stats.failed += len(batch)
+        stats.processed += len(batch)
+        batch.clear()
+        stats.progress()
+    
+    while True:
+        report = await results.get()
+        if report is None:
+            await flush()
+            return
+        batch.append(report)
+        if len(batch) >= batch_size:
+            await flush()
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+async def iter_stored_images(
+    storage,
+    prefix: str = "scraped-images/",
+    extensions: tuple = IMAGE_EXTENSIONS,
+    min_size: int = 1,
+    max_size: Optional[int] = None
+) -> AsyncIterator[ListedObject]:
+    """
+    Yield image objects under a prefix. The backend lists a page (or directory) at a
+    time, so memory stays constant however large the store is.
+    """
+    print(f"📦 Listing objects from {storage.name} storage (prefix: {prefix})")
+    async for obj in storage.list(prefix):
+        key = obj.key
+        lower_key = key.lower()
+        # Skip map images - filter out any images that might be maps
+        if 'map' in lower_key:
+            continue
+        # Only include actual image files (not folders)
+        if not lower_key.endswith(extensions):
+            continue
+        if obj.size < min_size or (max_size is not None and obj.size > max_size):
+            continue
+        yield obj
 
-async def populate_gallery(num_images: int = 10, report_type: str = "Found"):
-    """Main function to use existing S3 images, analyze them, and populate the gallery."""
+async def populate_gallery(
+    num_images: int = 10,
+    report_type: str = "Found",
+    concurrency: int = 8,
+    ai_rate: float = 2.0,
+    batch_size: int = 50,
+    prefix: str = "scraped-images/",
+    min_size: int = 1,
+    max_size: Optional[int] = None
+):
+    """Main function to use existing stored images, analyze them, and populate the gallery."""
     print(f"🚀 Starting gallery population process...")
     print(f"📊 Target: {num_images} pet reports")
-    print(f"📝 Report type: {report_type}\n")
+    print(f"📝 Report type: {report_type}")
+    print(f"⚙️  Workers: {concurrency}, AI rate: {ai_rate}/sec, insert batch: {batch_size}\n")
     
     # Initialize MongoDB
     try:
-        client = AsyncIOMotorClient(os.getenv("MONGO_URI"))
-        await init_beanie(database=client["SlugHacks"], document_models=[PetReport])
+        client = AsyncIOMotorClient(settings.mongo_uri)
+        await init_beanie(database=client[settings.mongo_db], document_models=[PetReport])
         print("✅ Connected to MongoDB\n")
     except Exception as e:
         print(f"❌ MongoDB connection error: {str(e)}")
         return
     
-    # Step 1: Get existing S3 URLs from scraped-images bucket
+    try:
+        storage = get_storage()
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return
+    
+    # Keys stream straight into the workers: list -> skip ingested -> read + AI -> batched insert
     print("=" * 60)
-    print("STEP 1: Getting existing images from S3 scraped-images bucket")
+    print(f"Streaming images from {storage.name} storage and creating up to {num_images} reports")
     print("=" * 60)
-    bucket_name = os.getenv("S3_BUCKET_NAME")
-    if not bucket_name:
-        print("❌ S3_BUCKET_NAME not set in environment variables")
-        return
     
-    s3_urls = get_existing_s3_urls_from_bucket(bucket_name, limit=num_images)
+    stats = IngestionStats(num_images)
+    ai_bucket = TokenBucket(ai_rate)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    results = asyncio.Queue(maxsize=batch_size * 2)
     
-    if not s3_urls or len(s3_urls) == 0:
-        print("❌ No images found in S3 scraped-images bucket. Cannot proceed.")
-        print("   Make sure you've run the scraper first to upload images to S3.")
-        return
+    workers = [
+        asyncio.create_task(_ingest_worker(queue, results, storage, ai_bucket, report_type, stats))
+        for _ in range(concurrency)
+    ]
+    writer = asyncio.create_task(_report_writer(results, batch_size, stats))
     
-    # Step 2: Process each image and create pet reports
-    print("\n" + "=" * 60)
-    print(f"STEP 2: Processing {len(s3_urls)} images with AI and creating reports")
-    print("=" * 60)
+    enqueued = 0
+    try:
+        stored_images = iter_stored_images(storage, prefix=prefix, min_size=min_size, max_size=max_size)
+        async with aclosing(iter_not_ingested(stored_images, stats)) as pending_images:
+            async for image in pending_images:
+                await queue.put((enqueued, image))
+                enqueued += 1
+                if enqueued >= num_images:
+                    break
+    except Exception as e:
+        print(f"❌ Error listing stored images: {str(e)}")
     
-    created_reports = []
-    failed_count = 0
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    await results.put(None)
+    await writer
     
-    for i, s3_url in enumerate(s3_urls):
-        try:
-            report = await create_pet_report_from_image(s3_url, report_type, i)
-            created_reports.append(report)
-            await asyncio.sleep(1)  # Rate limiting for AI calls
-        except Exception as e:
-            print(f"   ❌ Failed to create report for image {i + 1}: {str(e)}")
-            failed_count += 1
-            continue
+    if enqueued == 0 and stats.skipped == 0:
+        print(f"❌ No images found under {prefix} in {storage.name} storage.")
+        print("   Make sure you've run the scraper first to upload images.")
+    
+    if stats.created:
+        if cache_is_shared():
+            await bump_reports_version()
+        else:
+            print(STALE_CACHE_WARNING)
     
     # Summary
+    elapsed = time.monotonic() - stats.started
     print("\n" + "=" * 60)
     print("✨ GALLERY POPULATION COMPLETE!")
     print("=" * 60)
-    print(f"✅ Successfully created: {len(created_reports)} pet reports")
-    print(f"❌ Failed: {failed_count} reports")
-    print(f"📊 Total processed: {len(s3_urls)} images")
+    print(f"✅ Successfully created: {stats.created} pet reports")
+    print(f"❌ Failed: {stats.failed} reports")
+    print(f"⏭️  Skipped (already ingested): {stats.skipped} images")
+    print(f"📊 Total processed: {stats.processed} images in {elapsed:.1f}s ({stats.rate():.2f} images/sec)")
     print("\n🎉 Your gallery is now populated with pet reports!")
 
 if __name__ == "__main__":
-    asyncio.run(populate_gallery(num_images=10, report_type="Found"))
+    parser = argparse.ArgumentParser(description="Populate the gallery with reports for scraped images")
+    parser.add_argument("--num-images", type=int, default=10, help="Maximum number of new reports to create")
+    parser.add_argument("--report-type", default="Found", choices=["Found", "Lost"])
+    parser.add_argument("--concurrency", type=int, default=8, help="Images processed at once")
+    parser.add_argument("--ai-rate", type=float, default=2.0, help="Gemini calls per second; bounds throughput, so set it to what the API quota allows")
+    parser.add_argument("--batch-size", type=int, default=50, help="Reports per insert_many")
+    parser.add_argument("--prefix", default="scraped-images/", help="Storage key prefix to ingest")
+    parser.add_argument("--min-size", type=int, default=1, help="Skip objects smaller than this many bytes")
+    parser.add_argument("--max-size", type=int, default=None, help="Skip objects larger than this many bytes")
+    args = parser.parse_args()
+    asyncio.run(populate_gallery(
+        num_images=args.num_images,
+        report_type=args.report_type,
+        concurrency=args.concurrency,
+        ai_rate=args.ai_rate,
+        batch_size=args.batch_size,
+        prefix=args.prefix,
+        min_size=args.min_size,
+        max_size=args.max_size
+    ))
@@ -0,0 +1,243 @@
+"""
+Opt-in request profiling.
+
+A request is profiled when it carries X-Profile: 1 together with a valid
+X-Admin-Token, or when it falls into PROFILE_SAMPLE_RATE. The response then
+carries an X-Profile-Id header, and the profile can be fetched from
+/api/admin/profiles/{id}.
+
+With pyinstrument installed, profiles are async-aware HTML reports. Otherwise a
+built-in sampler records the event loop thread's stack every
+PROFILE_INTERVAL_MS and writes collapsed stacks (.folded, the input format of
+flamegraph.pl and speedscope). Because it samples the whole loop thread, other
+requests running at the same time show up in the profile too.
+
+Streaming responses (/api/stream, images, exports) are never profiled: they can
+stay open indefinitely and would keep the profiler running. Profiles are rendered
+and written in a worker thread, off the event loop.
+
+Only one request is profiled at a time, and PROFILE_DIR keeps at most
+PROFILE_MAX_FILES profiles, dropping the oldest. Requests that aren't
+profiled cost one header scan (only when ADMIN_TOKEN is set) and, with
+sampling on, one random draw.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+from uuid import uuid4
+from datetime import datetime
+from typing import List, Optional
+
+from config import settings
+from admin import ADMIN_TOKEN, ADMIN_TOKEN_HEADER, is_admin_token
+from structured_log import get_logger
+
+logger = get_logger("profiling")
+
+PROFILE_SAMPLE_RATE = settings.profile_sample_rate
+PROFILE_DIR = settings.profile_dir
+PROFILE_MAX_FILES = settings.profile_max_files
+PROFILE_INTERVAL_MS = settings.profile_interval_ms
+
+# Long-lived or file-streaming responses
+UNPROFILED_PATH_PREFIXES = ("/api/stream", "/api/images/", "/api/export/")
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+PROFILE_MEDIA_TYPES = {
+    "html": "text/html; charset=utf-8",
+    "folded": "text/plain; charset=utf-8",
+}
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def output(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+class _Session:
+    """One profiled request"""
+
+    def __init__(self):
+        # Imported on first use so the app never pays for it unless a request is profiled
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            self.extension = "html"
+            self._profiler = Profiler(interval=PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+        else:
+            self.extension = "folded"
+            self._profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+
+    def start(self):
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def render(self) -> str:
+        """The finished profile; can be slow for big profiles, so call it off the event loop"""
+        if self.extension == "html":
+            return self._profiler.output_html()
+        return self._profiler.output()
+
+
+def _save_profile(profile_id: str, session: "_Session", meta: dict):
+    _write_profile(profile_id, session.extension, session.render(), meta)
+
+
+def _write_profile(profile_id: str, extension: str, body: str, meta: dict):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(path + ".tmp", path)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "file": os.path.basename(path), "size": len(body)}, f)
+    _prune_profiles()
+
+
+def _prune_profiles():
+    metas = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    # Ids start with a millisecond timestamp, so name order is age order
+    for name in metas[:max(0, len(metas) - PROFILE_MAX_FILES)]:
+        profile_id = name[:-len(".json")]
+        for extension in ["json", *PROFILE_MEDIA_TYPES]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{profile_id}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    """Saved profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def find_profile(profile_id: str) -> Optional[tuple[str, str]]:
+    """(path, media type) of a saved profile, or None"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    for extension, media_type in PROFILE_MEDIA_TYPES.items():
+        path = os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+        if os.path.exists(path):
+            return path, media_type
+    return None
+
+
+def _wants_profile(scope) -> Optional[str]:
+    """Why this request should be profiled ("header" or "sample"), or None"""
+    if scope["path"].startswith(UNPROFILED_PATH_PREFIXES):
+        return None
+    if ADMIN_TOKEN:
+        requested = False
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value == b"1"
+            elif name == ADMIN_TOKEN_HEADER.encode():
+                token = value.decode("latin-1")
+        if requested and is_admin_token(token):
+            return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that runs selected requests under a profiler"""
+
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+        reason = _wants_profile(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{int(time.time() * 1000)}-{uuid4().hex[:8]}"
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        self._active = True
+        session = _Session()
+        started = time.perf_counter()
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.stop()
+            self._active = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            route = scope.get("route")
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status,
+                "reason": reason,
+                "duration_ms": round(duration_ms, 1),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            try:
+                await asyncio.to_thread(_save_profile, profile_id, session, meta)
+                logger.info("Saved request profile", extra={"fields": meta})
+            except OSError as e:
+                logger.warning(f"⚠️ Could not save profile {profile_id}: {str(e)}")
@@ -0,0 +1,56 @@
+"""
+Token-bucket rate limiting for outbound calls such as Gemini analysis.
+"""
+
+import time
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average, with bursts of up to `capacity`.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float, capacity: Optional[float] = None):
+        """Change the rate (and burst) from now on; tokens already earned are kept up to the new capacity"""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._refill()
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available right now"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def time_until_available(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` could be taken, ignoring other waiters"""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until tokens are available, then take them"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.time_until_available(tokens))
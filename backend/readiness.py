@@ -0,0 +1,113 @@
+"""
+Readiness probe for load balancers (/api/ready).
+
+Unlike /api/health, which only says the process is up, this makes one live
+round trip to each dependency (a MongoDB ping, a HEAD on the S3 bucket or a
+write check on local storage, a model listing from Gemini) and reports each
+latency. The response, which anyone who can reach the probe may read, carries
+only each check's status and latency; failure details go to the server log.
+Checks run concurrently, each bounded by READY_TIMEOUT. Without a
+Gemini API key the mock tags are in use, so the AI check is reported as skipped.
+
+The worker is ready when every check in READY_REQUIRED_CHECKS (by default just
+mongo) passed or was skipped. A failing optional check, such as a Gemini outage
+or quota error, makes it "degraded" but still ready (200), so the balancer keeps
+routing reads that never touch that dependency. Results are cached for READY_CACHE_SECONDS, and concurrent probes
+share one run, so frequent polling by several balancers costs one set of round
+trips per interval.
+"""
+
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from config import settings
+from database import ping_database
+from storage import get_storage
+from ai_service import ai_configured, ping_ai
+from metrics import DEPENDENCY_CHECK_SECONDS, DEPENDENCY_UP
+from structured_log import get_logger
+
+logger = get_logger("readiness")
+
+READY_CACHE_SECONDS = settings.ready_cache_seconds
+READY_TIMEOUT = settings.ready_timeout
+READY_REQUIRED_CHECKS = settings.ready_required_checks
+
+_cached: Optional[tuple[float, dict]] = None  # (monotonic time, result)
+_inflight: Optional[asyncio.Task] = None
+
+
+async def _check_mongo() -> str:
+    await ping_database()
+    return "ok"
+
+
+async def _check_storage() -> str:
+    await get_storage().ping()
+    return "ok"
+
+
+async def _check_ai() -> str:
+    if not ai_configured():
+        return "skipped"
+    await ping_ai()
+    return "ok"
+
+
+CHECKS = {
+    "mongo": _check_mongo,
+    "storage": _check_storage,
+    "ai": _check_ai,
+}
+
+
+async def _run_check(name: str, check) -> dict:
+    started = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(check(), READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        status = "fail"
+        logger.warning(f"⚠️ Readiness check {name} timed out after {READY_TIMEOUT:g}s")
+    except Exception as e:
+        status = "fail"
+        logger.warning(f"⚠️ Readiness check {name} failed: {type(e).__name__}: {str(e)}")
+    elapsed = time.perf_counter() - started
+
+    result = {"status": status, "latency_ms": round(elapsed * 1000, 1)}
+    if status != "skipped":
+        DEPENDENCY_CHECK_SECONDS.observe(elapsed, check=name)
+        DEPENDENCY_UP.set(1 if status == "ok" else 0, check=name)
+    return result
+
+
+async def _probe() -> dict:
+    global _cached
+    names = list(CHECKS)
+    results = await asyncio.gather(*(_run_check(name, CHECKS[name]) for name in names))
+    checks = dict(zip(names, results))
+    failed = [name for name in names if checks[name]["status"] == "fail"]
+    if any(name in READY_REQUIRED_CHECKS for name in failed):
+        status = "not_ready"
+    else:
+        status = "degraded" if failed else "ready"
+    result = {
+        "status": status,
+        "checks": checks,
+        "checked_at": datetime.utcnow().isoformat(),
+    }
+    _cached = (time.monotonic(), result)
+    return result
+
+
+async def get_readiness() -> dict:
+    """Latest readiness result, probing again when the cached one is older than READY_CACHE_SECONDS"""
+    global _inflight
+    if _cached is not None and time.monotonic() - _cached[0] < READY_CACHE_SECONDS:
+        return {**_cached[1], "cached": True}
+    if _inflight is None or _inflight.done():
+        _inflight = asyncio.create_task(_probe())
+    # Shielded so a probe whose caller disconnects still finishes for the others
+    result = await asyncio.shield(_inflight)
+    return {**result, "cached": False}
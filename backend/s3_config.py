@@ -1,25 +1,57 @@
-import boto3
-import os
-from dotenv import load_dotenv
-from uuid import uuid4
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, Optional
 import mimetypes
 
-load_dotenv()
+from config import settings
 
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION", "us-east-1")
-)
+# Optional custom endpoint, e.g. a local S3 stand-in such as moto_server or MinIO
+S3_ENDPOINT_URL = settings.s3_endpoint_url
 
-# Mock storage for testing when S3 is unavailable
-MOCK_STORAGE = {}
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    """
+    The shared boto3 S3 client, built on first use. boto3 is imported here too,
+    since importing it and building a client takes a noticeable part of startup.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.aws_access_key_id,
+                    aws_secret_access_key=settings.aws_secret_access_key,
+                    region_name=settings.aws_region,
+                    endpoint_url=S3_ENDPOINT_URL,
+                    # Local stand-ins generally don't resolve bucket subdomains
+                    config=Config(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None
+                )
+    return _s3_client
+
+async def ping_s3():
+    """One HEAD request for the configured bucket; raises if it fails"""
+    client = await asyncio.to_thread(get_s3_client)
+    await asyncio.to_thread(client.head_bucket, Bucket=settings.s3_bucket_name)
+
+# Parts are buffered up to this size; S3 requires at least 5 MiB for every part but the last
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+def s3_object_url(bucket_name: str, object_key: str) -> str:
+    """Public URL of an S3 object"""
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket_name}/{object_key}"
+    return f"https://{bucket_name}.s3.{settings.aws_region}.amazonaws.com/{object_key}"
 
 def get_s3_presigned_url(bucket_name: str, object_key: str, expiration: int = 3600) -> str:
     """Generate a pre-signed URL for direct S3 upload"""
     try:
-        url = s3_client.generate_presigned_url(
+        url = get_s3_client().generate_presigned_url(
             'put_object',
             Params={'Bucket': bucket_name, 'Key': object_key},
             ExpiresIn=expiration
@@ -28,31 +60,74 @@ def get_s3_presigned_url(bucket_name: str, object_key: str, expiration: int = 36
     except Exception as e:
         raise Exception(f"Error generating presigned URL: {str(e)}")
 
-async def upload_to_s3(file_bytes: bytes, bucket_name: str, object_key: str) -> str:
-    """Upload file to S3 and return the object URL, with fallback to mock storage"""
-    try:
-        # Determine content type from file extension
+async def upload_stream_to_s3(
+    chunks: AsyncIterator[bytes],
+    bucket_name: str,
+    object_key: str,
+    content_type: Optional[str] = None,
+    part_size: int = MULTIPART_PART_SIZE,
+    cache_control: Optional[str] = None
+) -> tuple[str, str, int]:
+    """
+    Upload a byte stream to S3 without buffering it whole. Bodies that fit in one part
+    go up with a single PUT; larger ones use a multipart upload, one part at a time.
+    Returns (object_url, sha256_hex, size).
+    """
+    if not content_type:
         content_type, _ = mimetypes.guess_type(object_key)
-        if not content_type:
-            content_type = 'image/jpeg'  # Default to JPEG for pet images
-        
-        # Upload with correct Content-Type
-        s3_client.put_object(
-            Bucket=bucket_name, 
-            Key=object_key, 
-            Body=file_bytes,
-            ContentType=content_type
+        content_type = content_type or 'image/jpeg'
+    
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    upload_id = None
+    parts = []
+    extra = {"CacheControl": cache_control} if cache_control else {}
+    s3_client = get_s3_client()
+    
+    async def upload_part(body: bytes):
+        part_number = len(parts) + 1
+        response = await asyncio.to_thread(
+            s3_client.upload_part,
+            Bucket=bucket_name, Key=object_key, UploadId=upload_id,
+            PartNumber=part_number, Body=body
         )
-        object_url = f"https://{bucket_name}.s3.{os.getenv('AWS_REGION', 'us-east-1')}.amazonaws.com/{object_key}"
-        print(f"✅ Uploaded to S3: {object_url}")
-        return object_url
-    except Exception as e:
-        print(f"⚠️ S3 Error: {str(e)}")
-        print("🔄 Using mock storage for testing...")
-        # Fallback: use mock storage
-        mock_id = str(uuid4())
-        MOCK_STORAGE[mock_id] = file_bytes
-        mock_url = f"mock://storage/{mock_id}/{object_key}"
-        print(f"✅ Stored in mock storage: {mock_url}")
-        return mock_url
-
+        parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+    
+    try:
+        async for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            buffer.extend(chunk)
+            if len(buffer) >= part_size:
+                if upload_id is None:
+                    response = await asyncio.to_thread(
+                        s3_client.create_multipart_upload,
+                        Bucket=bucket_name, Key=object_key, ContentType=content_type, **extra
+                    )
+                    upload_id = response["UploadId"]
+                await upload_part(bytes(buffer))
+                buffer = bytearray()
+        
+        if upload_id is None:
+            await asyncio.to_thread(
+                s3_client.put_object,
+                Bucket=bucket_name, Key=object_key, Body=bytes(buffer), ContentType=content_type, **extra
+            )
+        else:
+            if buffer:
+                await upload_part(bytes(buffer))
+            await asyncio.to_thread(
+                s3_client.complete_multipart_upload,
+                Bucket=bucket_name, Key=object_key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+    except Exception:
+        if upload_id is not None:
+            await asyncio.to_thread(
+                s3_client.abort_multipart_upload,
+                Bucket=bucket_name, Key=object_key, UploadId=upload_id
+            )
+        raise
+    
+    return s3_object_url(bucket_name, object_key), digest.hexdigest(), size
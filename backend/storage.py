@@ -0,0 +1,321 @@
+"""
+Image storage backends.
+
+- S3Storage: objects in S3_BUCKET_NAME under the key the caller picks
+- LocalStorage: content-addressed files under LOCAL_STORAGE_DIR, served by the
+  API at /api/images/{key}
+
+STORAGE_BACKEND picks one (auto uses S3 when a bucket is configured). With S3,
+store_image falls back to local storage when an upload fails, so a report still
+gets an image URL that can be served and survives restarts.
+
+Local keys are <namespace>/<aa>/<bb>/<sha256><ext>, where the namespace is the
+first segment of the key the caller asked for ("pet-reports", "scraped-images"),
+reduced to letters, digits, "-" and "_" and starting with a letter or digit,
+and aa/bb are the first hex pairs of the digest, so no directory grows past
+65536 entries. Identical bytes in a namespace share one file. Writes go to a
+temporary file that is renamed into place, so readers never see a partial image.
+Resized variants, when something has produced them, sit next to the original as
+<sha256>@<width>w<ext>.
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import mimetypes
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+from config import settings
+from s3_config import ping_s3, s3_object_url, get_s3_client, upload_stream_to_s3
+from structured_log import get_logger
+
+logger = get_logger("storage")
+
+LOCAL_KEY_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]*/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(@[0-9]{1,5}w)?(\.[a-z0-9]{1,5})?$")
+VARIANT_NAME_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})@(?P<width>[0-9]{1,5})w(?P<extension>\.[a-z0-9]{1,5})?$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CONTENT_TYPE = "image/jpeg"  # Default to JPEG for pet images
+
+
+class StoredObject(NamedTuple):
+    key: str
+    url: str
+    sha256: str
+    size: int
+
+
+class ListedObject(NamedTuple):
+    key: str
+    url: str
+    size: int
+
+
+def _content_type_for(key: str, content_type: Optional[str] = None) -> str:
+    if content_type:
+        return content_type
+    guessed, _ = mimetypes.guess_type(key)
+    return guessed or DEFAULT_CONTENT_TYPE
+
+
+class S3Storage:
+    """Objects in an S3 bucket (or an S3-compatible endpoint)"""
+    name = "s3"
+    content_addressed = False
+
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+
+    def url(self, key: str) -> str:
+        return s3_object_url(self.bucket_name, key)
+
+    def _put_blocking(self, data: bytes, key: str, content_type: str) -> str:
+        # Upload keys are never overwritten, so browsers and CDNs may cache them for good
+        get_s3_client().put_object(
+            Bucket=self.bucket_name, Key=key, Body=data, ContentType=content_type, CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+        return hashlib.sha256(data).hexdigest()
+
+    async def put(self, data: bytes, key: str, content_type: Optional[str] = None) -> StoredObject:
+        digest = await asyncio.to_thread(self._put_blocking, data, key, _content_type_for(key, content_type))
+        return StoredObject(key, self.url(key), digest, len(data))
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], key: str, content_type: Optional[str] = None) -> StoredObject:
+        url, digest, size = await upload_stream_to_s3(
+            chunks, self.bucket_name, key, _content_type_for(key, content_type), cache_control=IMMUTABLE_CACHE_CONTROL
+        )
+        return StoredObject(key, url, digest, size)
+
+    async def get(self, key: str) -> Tuple[bytes, str]:
+        def read():
+            response = get_s3_client().get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read(), response.get("ContentType") or _content_type_for(key)
+        return await asyncio.to_thread(read)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(get_s3_client().delete_object, Bucket=self.bucket_name, Key=key)
+
+    async def list(self, prefix: str = "", page_size: int = 1000) -> AsyncIterator[ListedObject]:
+        """Objects under prefix, one page of keys in memory at a time"""
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+        pages = iter(paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}))
+        while True:
+            # boto3 is blocking; fetch each page in a worker thread
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            for obj in page.get("Contents", []):
+                yield ListedObject(obj["Key"], self.url(obj["Key"]), obj.get("Size", 0))
+
+    async def ping(self):
+        await ping_s3()
+
+
+class LocalStorage:
+    """Content-addressed files on local disk"""
+    name = "local"
+    content_addressed = True
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._tmp_dir = os.path.join(self.root, ".tmp")
+
+    def url(self, key: str) -> str:
+        return f"{settings.public_base_url}/api/images/{key}"
+
+    def path(self, key: str) -> Optional[str]:
+        """Filesystem path of a key, or None if it isn't a valid local key"""
+        if not LOCAL_KEY_PATTERN.fullmatch(key):
+            return None
+        path = os.path.realpath(os.path.join(self.root, *key.split("/")))
+        # The pattern already rules out "." and ".."; this also catches a symlink pointing out of the root
+        if os.path.commonpath([path, os.path.realpath(self.root)]) != os.path.realpath(self.root):
+            return None
+        return path
+
+    def variants(self, key: str) -> List[Tuple[int, str]]:
+        """(width, key) of the stored resized variants of an original, narrowest first"""
+        path = self.path(key)
+        if path is None:
+            return []
+        directory, name = os.path.split(path)
+        digest = name[:64]
+        prefix = key.rsplit("/", 1)[0]
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        found = []
+        for candidate in names:
+            match = VARIANT_NAME_PATTERN.match(candidate)
+            if match and match["digest"] == digest:
+                found.append((int(match["width"]), f"{prefix}/{candidate}"))
+        return sorted(found)
+
+    @staticmethod
+    def key_for(requested_key: str, digest: str, content_type: Optional[str] = None) -> str:
+        namespace = requested_key.split("/", 1)[0].lower() if "/" in requested_key else "objects"
+        # Starts with a letter or digit, so it can't be "..", ".tmp" or any other dot entry
+        namespace = re.sub(r"[^a-z0-9_-]", "-", namespace).lstrip("_-") or "objects"
+        extension = os.path.splitext(requested_key)[1].lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,5}", extension):
+            extension = mimetypes.guess_extension(content_type or DEFAULT_CONTENT_TYPE) or ""
+        return f"{namespace}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def _temp_file(self):
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        name = os.path.join(self._tmp_dir, f"{os.getpid()}-{os.urandom(8).hex()}")
+        return name, open(name, "wb")
+
+    def _commit(self, temp_path: str, key: str) -> bool:
+        """Move a finished temp file into place. False if the content was already stored."""
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return True
+
+    def _put_blocking(self, data: bytes, requested_key: str, content_type: Optional[str]) -> StoredObject:
+        digest = hashlib.sha256(data).hexdigest()
+        key = self.key_for(requested_key, digest, content_type)
+        if not os.path.exists(self.path(key)):
+            temp_path, f = self._temp_file()
+            try:
+                with f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._commit(temp_path, key)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        return StoredObject(key, self.url(key), digest, len(data))
+
+    async def put(self, data: bytes, key: str, content_type: Optional[str] = None) -> StoredObject:
+        return await asyncio.to_thread(self._put_blocking, data, key, content_type)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], key: str, content_type: Optional[str] = None) -> StoredObject:
+        """Write a byte stream without buffering it whole; the key is known once the last chunk is hashed"""
+        digest = hashlib.sha256()
+        size = 0
+        temp_path, f = await asyncio.to_thread(self._temp_file)
+        try:
+            with f:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+                await asyncio.to_thread(f.flush)
+                await asyncio.to_thread(os.fsync, f.fileno())
+            stored_key = self.key_for(key, digest.hexdigest(), content_type)
+            await asyncio.to_thread(self._commit, temp_path, stored_key)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return StoredObject(stored_key, self.url(stored_key), digest.hexdigest(), size)
+
+    async def get(self, key: str) -> Tuple[bytes, str]:
+        path = self.path(key)
+        if path is None:
+            raise FileNotFoundError(key)
+
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+        return await asyncio.to_thread(read), _content_type_for(key)
+
+    async def delete(self, key: str):
+        path = self.path(key)
+        if path is not None:
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except FileNotFoundError:
+                pass
+
+    async def list(self, prefix: str = "", page_size: int = 1000) -> AsyncIterator[ListedObject]:
+        """Stored files whose key starts with prefix, one directory at a time"""
+        walker = os.walk(self.root)
+        while True:
+            entry = await asyncio.to_thread(next, walker, None)
+            if entry is None:
+                return
+            directory, subdirectories, files = entry
+            subdirectories[:] = sorted(name for name in subdirectories if name != ".tmp")
+            relative = os.path.relpath(directory, self.root).replace(os.sep, "/")
+            for name in sorted(files):
+                key = name if relative == "." else f"{relative}/{name}"
+                # Variants are derived from an original, not images in their own right
+                if key.startswith(prefix) and "@" not in name and LOCAL_KEY_PATTERN.fullmatch(key):
+                    size = await asyncio.to_thread(os.path.getsize, os.path.join(directory, name))
+                    yield ListedObject(key, self.url(key), size)
+
+    async def ping(self):
+        def check():
+            os.makedirs(self.root, exist_ok=True)
+            if not os.access(self.root, os.W_OK):
+                raise PermissionError(f"{self.root} is not writable")
+        await asyncio.to_thread(check)
+
+
+_storage = None
+_fallback = None
+
+
+def get_storage():
+    """The configured storage backend"""
+    global _storage
+    if _storage is None:
+        backend = settings.storage_backend
+        if backend == "s3" or (backend == "auto" and settings.s3_bucket_name):
+            if not settings.s3_bucket_name:
+                raise ValueError("STORAGE_BACKEND=s3 requires S3_BUCKET_NAME")
+            _storage = S3Storage(settings.s3_bucket_name)
+        else:
+            _storage = LocalStorage(settings.local_storage_dir)
+    return _storage
+
+
+def get_fallback_storage() -> Optional[LocalStorage]:
+    """Local storage to write to when S3 fails, or None when there is no fallback"""
+    global _fallback
+    if _fallback is None and settings.storage_fallback and isinstance(get_storage(), S3Storage):
+        _fallback = LocalStorage(settings.local_storage_dir)
+    return _fallback
+
+
+def get_local_storage() -> Optional[LocalStorage]:
+    """The local store images may have been written to (primary or fallback), if any"""
+    storage = get_storage()
+    return storage if isinstance(storage, LocalStorage) else get_fallback_storage()
+
+
+async def store_image(data: bytes, key: str, content_type: Optional[str] = None) -> StoredObject:
+    """Store an uploaded image, falling back to local storage if the primary backend fails"""
+    storage = get_storage()
+    try:
+        stored = await storage.put(data, key, content_type)
+        logger.info(f"✅ Uploaded to {storage.name} storage: {stored.url}")
+        return stored
+    except Exception as e:
+        fallback = get_fallback_storage()
+        if fallback is None:
+            raise
+        logger.warning(f"⚠️ {storage.name} storage error: {str(e)}")
+        logger.info("🔄 Using local storage instead...")
+        stored = await fallback.put(data, key, content_type)
+        logger.info(f"✅ Stored locally: {stored.url}")
+        return stored
+
+
+async def warm_storage():
+    """Open a connection to (or create the directory of) the storage backend ahead of the first upload"""
+    storage = get_storage()
+    try:
+        await storage.ping()
+        logger.info(f"✅ {storage.name} storage ready")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not reach {storage.name} storage: {str(e)}")
@@ -0,0 +1,196 @@
+"""
+Structured JSON logging that never blocks the event loop.
+
+Log calls only put the record on a bounded queue; a background thread drains
+it and writes JSON lines to the sink in batches. When the queue is full, records
+are dropped and counted rather than making the caller wait. Below LOG_LEVEL a
+call costs one level check, and LOG_LEVEL=OFF turns logging off entirely.
+
+Settings:
+    LOG_LEVEL            DEBUG, INFO, WARNING, ERROR or OFF (default INFO)
+    LOG_SINK             stdout, stderr or a file path (default stdout)
+    LOG_QUEUE_SIZE       records buffered before new ones are dropped (default 10000)
+    LOG_BATCH_SIZE       records written per batch (default 200)
+    LOG_FLUSH_INTERVAL   seconds a partial batch may wait (default 0.5)
+
+Usage:
+    from structured_log import get_logger
+    logger = get_logger(__name__)
+    logger.info("Report saved", extra={"fields": {"report_id": str(report.id)}})
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import settings
+
+LOG_LEVEL = settings.log_level
+LOG_SINK = settings.log_sink
+LOG_QUEUE_SIZE = settings.log_queue_size
+LOG_BATCH_SIZE = settings.log_batch_size
+LOG_FLUSH_INTERVAL = settings.log_flush_interval
+
+ROOT_LOGGER = "petfinder"
+_STOP = object()
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def format_record(record: logging.LogRecord) -> str:
+    """One JSON line for a record. Fields passed as extra={"fields": {...}} are merged in."""
+    entry = {
+        "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+        "level": record.levelname,
+        "logger": record.name,
+        "message": record.getMessage(),
+    }
+    fields = getattr(record, "fields", None)
+    if fields:
+        entry.update(fields)
+    if record.exc_text:
+        entry["exc"] = record.exc_text
+    return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class BatchingQueueHandler(logging.Handler):
+    """Queues records for a writer thread that formats and writes them in batches"""
+
+    def __init__(self, sink: str, queue_size: int, batch_size: int, flush_interval: float):
+        super().__init__()
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        # Like logging.handlers.QueueHandler: merge args and render the traceback now,
+        # so the writer thread never touches objects the caller may still mutate
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _open_sink(self):
+        if self.sink == "stdout":
+            return sys.stdout, False
+        if self.sink == "stderr":
+            return sys.stderr, False
+        directory = os.path.dirname(self.sink)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.sink, "a", encoding="utf-8"), True
+
+    def _write(self, stream, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(format_record(record))
+            except Exception as e:
+                lines.append(json.dumps({"level": "ERROR", "logger": ROOT_LOGGER, "message": f"Unformattable log record: {e}"}))
+        if self.dropped:
+            lines.append(json.dumps({"level": "WARNING", "logger": ROOT_LOGGER, "message": "Log records dropped", "dropped": self.dropped}))
+            self.dropped = 0
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+    def _run(self):
+        try:
+            stream, owned = self._open_sink()
+        except OSError as e:
+            print(f"⚠️ Log sink {self.sink} unavailable ({e}), logging to stderr")
+            stream, owned = sys.stderr, False
+
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(stream, batch)
+                except Exception:
+                    pass
+        if owned:
+            stream.close()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        if self._thread.is_alive():
+            # Blocking put: the stop marker must not be dropped
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+        super().close()
+
+
+def _resolve_level(name: str) -> int:
+    if name == "OFF":
+        return logging.CRITICAL + 1
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def configure_logging():
+    """Install the queue handler on the app's root logger. Later calls are no-ops."""
+    global _handler
+    with _configure_lock:
+        if _handler is not None:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(_resolve_level(LOG_LEVEL))
+        root.propagate = False
+        if LOG_LEVEL == "OFF":
+            # No thread, no queue: every call stops at the level check
+            _handler = logging.NullHandler()
+        else:
+            _handler = BatchingQueueHandler(LOG_SINK, LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+        root.addHandler(_handler)
+        atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the app's root, e.g. get_logger("main") -> petfinder.main"""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_queue_depth() -> Optional[int]:
+    """Records waiting for the writer thread, or None when logging is off"""
+    return _handler.queue_depth() if isinstance(_handler, BatchingQueueHandler) else None
+
+
+def shutdown_logging():
+    """Flush queued records. Safe to call more than once."""
+    if _handler is not None:
+        _handler.close()
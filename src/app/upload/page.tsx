@@ -117,28 +117,8 @@ export default function UploadPage() {
 
             const data = await response.json();
             
-            // Check if matches were created - wait a bit for backend to process
-            let hasMatches = false;
-            if (data.report_id) {
-                try {
-                    // Small delay to ensure backend has processed the match
-                    await new Promise(resolve => setTimeout(resolve, 500));
-                    const matchResponse = await fetch(`http://localhost:8000/api/matches?status=pending&limit=50`);
-                    if (matchResponse.ok) {
-                        const matchData = await matchResponse.json();
-                        if (matchData.status === 'success' && matchData.matches && matchData.matches.length > 0) {
-                            // Check if any match involves this report
-                            hasMatches = matchData.matches.some((m: any) => 
-                                m.lost_report?.report_id === data.report_id || 
-                                m.found_report?.report_id === data.report_id
-                            );
-                        }
-                    }
-                } catch (err) {
-                    console.error('Error checking for matches:', err);
-                    // Don't fail the upload if match check fails
-                }
-            }
+            // The backend matches synchronously and reports how many matches it created
+            const hasMatches = (data.match_count ?? 0) > 0;
             
             setUploadStatus('complete');
             setProgressMessage('Report created successfully!');
@@ -55,11 +55,28 @@ export function SwipeMatch() {
 
   useEffect(() => {
     fetchMatches();
+
+    // Live updates: new matches refetch the list; decisions made elsewhere drop the match
+    const source = new EventSource('http://localhost:8000/api/stream?events=new_match,match_decision');
+    source.addEventListener('new_match', () => fetchMatches(true));
+    source.addEventListener('resync', () => fetchMatches(true));
+    source.addEventListener('match_decision', (event) => {
+      const { match_id, status } = JSON.parse((event as MessageEvent).data);
+      if (status !== 'pending') {
+        setMatches(prev => prev.filter(m => m.match_id !== match_id));
+      }
+    });
+    return () => source.close();
   }, []);
 
-  const fetchMatches = async () => {
+  // Matches can disappear from under the current card (decided here or elsewhere); stay in range
+  useEffect(() => {
+    setCurrentIndex(index => Math.min(index, Math.max(0, matches.length - 1)));
+  }, [matches.length]);
+
+  const fetchMatches = async (silent = false) => {
     try {
-      setLoading(true);
+      if (!silent) setLoading(true);
       setError(null);
       const response = await fetch('http://localhost:8000/api/matches?status=pending');
       
@@ -76,8 +93,11 @@ export function SwipeMatch() {
       }
     } catch (err: any) {
       console.error("Failed to fetch matches:", err);
-      setError(err.message || 'Failed to load matches');
-      setMatches([]);
+      // A failed background refresh keeps the matches already on screen
+      if (!silent) {
+        setError(err.message || 'Failed to load matches');
+        setMatches([]);
+      }
     } finally {
       setLoading(false);
     }
@@ -105,21 +125,10 @@ export function SwipeMatch() {
 
       const result = await response.json();
       
-      // Remove the match from the list
-      const newMatches = matches.filter(m => m.match_id !== currentMatch.match_id);
-      setMatches(newMatches);
-      
-      // Adjust current index properly
-      if (newMatches.length === 0) {
-        setCurrentIndex(0);
-      } else {
-        // If we're at the last match, go to the previous one
-        // Otherwise stay at the same index (which now shows the next match)
-        if (currentIndex >= newMatches.length) {
-          setCurrentIndex(Math.max(0, newMatches.length - 1));
-        }
-        // If currentIndex is valid, it stays the same (next match slides in)
-      }
+      // Remove the match from the list. Filter the latest state: live events may have removed
+      // others (e.g. superseded matches) while the request was in flight. The next match
+      // slides in at the same index, which the effect above keeps in range.
+      setMatches(prev => prev.filter(m => m.match_id !== currentMatch.match_id));
 
       if (decision === 'accept') {
         console.log('✅ Match accepted! Pet status updated to "Found"');
@@ -162,7 +171,7 @@ export function SwipeMatch() {
           <h2 className="text-2xl font-bold mb-2">Error loading matches</h2>
           <p className="text-muted mb-4">{error}</p>
           <button
-            onClick={fetchMatches}
+            onClick={() => fetchMatches()}
             className="px-6 py-2 bg-primary text-white rounded-lg hover:opacity-90"
           >
             Try Again
@@ -185,7 +194,7 @@ export function SwipeMatch() {
           </p>
           <div className="space-y-3">
             <button
-              onClick={fetchMatches}
+              onClick={() => fetchMatches()}
               className="w-full px-6 py-3 bg-primary text-white rounded-xl font-semibold hover:opacity-90 transition-opacity shadow-lg"
             >
               Refresh Matches